@@ -1,65 +1,104 @@
-from collections import defaultdict
+import os
+import sys
+
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
 from infrahub_sdk.checks import InfrahubCheck
 
+# The checks are loaded from their file by Infrahub, where the project isn't installed
+REPOSITORY_ROOT = str(Path(__file__).resolve().parent.parent)
+if REPOSITORY_ROOT not in sys.path:
+    sys.path.append(REPOSITORY_ROOT)
+
+from lbvip.consistency import Issue, LocationEnvironmentIndex  # noqa: E402
+from lbvip.ipam import PrefixIndex  # noqa: E402
+
+# Number of Load Balancers fetched per page, 0 fetches everything with the lb_and_vip_env query
+PAGE_SIZE = int(os.environ.get("LB_VIP_CHECK_PAGE_SIZE", 0))
+
 
 class InfrahubCheckLBVIPBackendLocationEnvironment(InfrahubCheck):
     query = "lb_and_vip_env"
+    page_query = "lb_and_vip_env_page"
+    vips_query = "lb_and_vip_env_vips"
+    prefixes_query = "lb_and_vip_env_prefixes"
+    page_size = PAGE_SIZE
+    prefix_index: Optional[PrefixIndex] = None
 
     def validate(self, data):
-        location_issues = defaultdict(lambda: defaultdict(int))
-        location_id_by_name = {}
-
-        if data["ServerLoadBalancer"]["edges"]:
-            load_balancers = data["ServerLoadBalancer"]["edges"]
-
-            for lb_edge in load_balancers:
-                lb_node = lb_edge["node"]
-
-                lb_hostname = lb_node["hostname"]["value"]
-                lb_environment = lb_node["environment"]["value"]
-                tmp_loc = lb_node["ip_address"]["node"]["ip_prefix"]["node"]["location"]["node"]
-                if tmp_loc:
-                    lb_location = lb_node["ip_address"]["node"]["ip_prefix"]["node"]["location"]["node"]["name"]["value"]
-                    lb_location_id = lb_node["ip_address"]["node"]["ip_prefix"]["node"]["location"]["node"]["id"]
-                    location_id_by_name[lb_location] = lb_location_id
-
-                # Check VIPs
-                for vip_edge in lb_node["virtual_ips"]["edges"]:
-                    vip_node = vip_edge["node"]
-                    vip_hostname = vip_node["hostname"]["value"]
-                    vip_location = vip_node["ip_address"]["node"]["ip_prefix"]["node"]["location"]["node"]["name"]["value"]
-
-                    if vip_location != lb_location:
-                        location_issues[lb_location]["total"] += 1
-                        self.log_error(
-                            message=f"VIP {vip_hostname} is in location {vip_location}, which does not match LB {lb_hostname} (Location: {lb_location})",
-                            object_id=lb_node["id"],
-                            object_type="load_balancer",
-                        )
-                        continue
-
-                    # Check Frontend servers for each VIP
-                    for frontend_edge in vip_node["frontend_servers"]["edges"]:
-                        frontend_node = frontend_edge["node"]
-                        frontend_hostname = frontend_node["hostname"]["value"]
-                        frontend_environment = frontend_node["environment"]["value"]
-                        frontend_location = frontend_node["ip_address"]["node"]["ip_prefix"]["node"]["location"]["node"]["name"]["value"]
-
-                        if frontend_location != lb_location or frontend_environment != lb_environment:
-                            location_issues[lb_location]["total"] += 1
-                            self.log_error(
-                                message=f"Frontend {frontend_hostname} for VIP {vip_hostname} is in location {frontend_location} or environment {frontend_environment}, which does not match LB {lb_hostname} (Location: {lb_location}, Environment: {lb_environment})",
-                                object_id=lb_node["id"],
-                                object_type="load_balancer",
-                            )
-
-            # Check if there are location issues
-            for location_name, issues in location_issues.items():
-                if issues["total"] > 0:
-                    self.log_error(
-                        message=f"{location_name} has {issues['total']} VIPs or Frontends that do not match the Load Balancer location or environment.",
-                        object_id=location_id_by_name[location_name],
-                        object_type="location",
-                    )
-                else:
-                    return
+        index = LocationEnvironmentIndex(prefix_index=self.prefix_index)
+        index.add(data)
+        self.log_issues(index.issues())
+
+    def log_issues(self, issues: Iterable[Issue]) -> None:
+        for issue in issues:
+            self.log_error(message=issue.message, object_id=issue.object_id, object_type=issue.object_type)
+
+    async def query_page(self, name: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.client.query_gql_query(name=name, branch_name=self.branch_name, variables=variables)
+        return response.get("data") or response
+
+    async def load_prefix_index(self) -> PrefixIndex:
+        """The prefixes with their location, an object is in the location of the longest prefix containing its address."""
+        data = await self.query_page(name=self.prefixes_query, variables={})
+        prefixes = []
+        for prefix_edge in data["IpamIPPrefix"]["edges"]:
+            prefix_node = prefix_edge["node"]
+            location = (prefix_node.get("location") or {}).get("node")
+            vrf = (prefix_node.get("vrf") or {}).get("node")
+            prefixes.append(
+                {
+                    "prefix": prefix_node["prefix"]["value"],
+                    "location": location["name"]["value"] if location else None,
+                    "location_id": location["id"] if location else None,
+                    "role": prefix_node["role"]["value"] or "",
+                    "vrf": vrf["name"]["value"] if vrf else None,
+                }
+            )
+        return PrefixIndex(prefixes=prefixes)
+
+    async def pages(self) -> AsyncIterator[LocationEnvironmentIndex]:
+        """Fetch the Load Balancers one page at a time, then the VIPs and frontends of each page.
+
+        The records of a page are released once it has been validated, only the per location
+        totals are kept so that memory is bounded by the page size.
+        """
+        index = LocationEnvironmentIndex(prefix_index=self.prefix_index)
+        offset = 0
+        while True:
+            data = await self.query_page(name=self.page_query, variables={"offset": offset, "limit": self.page_size})
+            index.locate(lb_edge["node"] for lb_edge in data["ServerLoadBalancer"]["edges"])
+            for lb_edge in data["ServerLoadBalancer"]["edges"]:
+                index.add_load_balancer(lb_node=lb_edge["node"])
+
+            vip_ids = index.vip_ids()
+            for start in range(0, len(vip_ids), self.page_size):
+                vips = await self.query_page(name=self.vips_query, variables={"ids": vip_ids[start : start + self.page_size]})
+                for vip_edge in vips["InfraVIP"]["edges"]:
+                    index.add_vip(vip_node=vip_edge["node"])
+
+            yield index
+            index.release()
+
+            offset += self.page_size
+            if offset >= data["ServerLoadBalancer"]["count"]:
+                break
+
+    async def run(self, data: Optional[dict] = None) -> bool:
+        if self.prefix_index is None:
+            self.prefix_index = await self.load_prefix_index()
+        if data or not self.page_size:
+            return await super().run(data=data)
+
+        index = None
+        async for index in self.pages():
+            self.log_issues(index.object_issues())
+        if index:
+            self.log_issues(index.location_issues())
+
+        self.passed = not self.errors
+        if self.passed:
+            self.log_info("Check succesfully completed")
+
+        return self.passed
@@ -0,0 +1,182 @@
+import asyncio
+import sys
+import time
+
+from pathlib import Path
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable
+
+DOCUMENTATION = r"""
+    name: infrahub_cached
+    short_description: Infrahub inventory cached between runs
+    description:
+      - Builds the inventory from the nodes of Infrahub like the opsmill.infrahub.inventory plugin.
+      - The hosts, their variables and the memberships of the C(keyed_groups) and C(groups) are computed
+        once and stored in a sqlite database or a JSON file. They are reused while younger than
+        C(cache_ttl), while the repositories of the branch are still at the same commit and while the
+        hosts of each kind of C(nodes) have the same count and latest update time.
+      - A host added, removed or updated invalidates the inventory on the next run. A change limited
+        to a related node, like the name of a group or of a location included as a host variable,
+        is only picked up once the inventory is older than C(cache_ttl).
+      - C(ansible-playbook --flush-cache) or C(ansible-inventory --flush-cache) rebuild the inventory.
+    extends_documentation_fragment:
+      - constructed
+    options:
+      plugin:
+        description: Name of the plugin.
+        required: true
+        choices: ["infrahub_cached"]
+      api_endpoint:
+        description: Address of Infrahub.
+        type: string
+        default: http://localhost:8000
+        env:
+          - name: INFRAHUB_ADDRESS
+      token:
+        description: API token of Infrahub.
+        type: string
+        env:
+          - name: INFRAHUB_API_TOKEN
+      branch:
+        description: Branch to build the inventory from, the default branch when not set.
+        type: string
+      timeout:
+        description: Timeout of the requests to Infrahub, in seconds.
+        type: int
+        default: 30
+      validate_certs:
+        description: Verify the certificate of Infrahub.
+        type: bool
+        default: true
+      nodes:
+        description: Kinds of the hosts, with the attributes and relationships to include as host variables.
+        type: dict
+        required: true
+      cache_backend:
+        description: Storage of the cached inventory.
+        type: string
+        default: sqlite
+        choices: ["sqlite", "file"]
+      cache_path:
+        description:
+          - Sqlite database or directory of the cached inventory, relative to the inventory file.
+        type: string
+        default: cache/inventory.sqlite
+      cache_ttl:
+        description: Maximum age of the cached inventory, in seconds.
+        type: int
+        default: 3600
+"""
+
+# The shared helpers live at the root of the repository
+REPOSITORY_ROOT = str(Path(__file__).resolve().parents[1])
+if REPOSITORY_ROOT not in sys.path:
+    sys.path.append(REPOSITORY_ROOT)
+
+from lbvip.artifact_sync import pooled_client  # noqa: E402
+from lbvip.inventory import InventorySnapshot, cache_key, cached_snapshot, fetch_hosts, get_cache  # noqa: E402
+
+# Variables set by the inventory itself when a host is added
+IMPLICIT_VARS = ("inventory_file", "inventory_dir")
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable):
+    NAME = "infrahub_cached"
+
+    def verify_file(self, path):
+        return super().verify_file(path) and path.endswith((".yml", ".yaml"))
+
+    def parse(self, inventory, loader, path, cache=True):
+        super().parse(inventory, loader, path, cache=cache)
+        self._read_config_data(path)
+
+        cache_path = Path(self.get_option("cache_path"))
+        if not cache_path.is_absolute():
+            cache_path = Path(path).resolve().parent / cache_path
+        store = get_cache(backend=self.get_option("cache_backend"), path=cache_path)
+        key = cache_key(
+            api_endpoint=self.get_option("api_endpoint"),
+            branch=self.get_option("branch"),
+            nodes=self.get_option("nodes"),
+            compose=self.get_option("compose"),
+            keyed_groups=self.get_option("keyed_groups"),
+            groups=self.get_option("groups"),
+            leading_separator=self.get_option("leading_separator"),
+        )
+
+        try:
+            snapshot = asyncio.run(self.load(store=store, key=key, refresh=not cache))
+        except AnsibleParserError:
+            raise
+        except Exception as exc:
+            raise AnsibleParserError(f"Unable to build the inventory from {self.get_option('api_endpoint')}: {exc}") from exc
+        self.populate(snapshot)
+
+    async def load(self, store, key: str, refresh: bool) -> InventorySnapshot:
+        config = {
+            "address": self.get_option("api_endpoint"),
+            "timeout": self.get_option("timeout"),
+            "tls_insecure": not self.get_option("validate_certs"),
+        }
+        if self.get_option("token"):
+            config["api_token"] = self.get_option("token")
+
+        async with pooled_client(**config) as client:
+            snapshot, commit, signal = await cached_snapshot(
+                client=client,
+                cache=store,
+                key=key,
+                kinds=self.get_option("nodes"),
+                branch=self.get_option("branch"),
+                ttl=self.get_option("cache_ttl"),
+            )
+            if snapshot and not refresh:
+                self.display.vvv(f"Using the inventory cached at {time.ctime(snapshot.created)} for commit {commit}")
+                return snapshot
+            hosts = await fetch_hosts(client=client, nodes=self.get_option("nodes"), branch=self.get_option("branch"))
+
+        snapshot = self.construct(hosts=hosts, commit=commit, signal=signal)
+        store.set(key, snapshot)
+        return snapshot
+
+    def construct(self, hosts: dict, commit: str, signal: str) -> InventorySnapshot:
+        """Evaluate compose, keyed_groups and groups once per host and record the result."""
+        strict = self.get_option("strict")
+        for name, host_vars in hosts.items():
+            self.inventory.add_host(name)
+            for var, value in host_vars.items():
+                self.inventory.set_variable(name, var, value)
+            self._set_composite_vars(self.get_option("compose"), host_vars, name, strict=strict)
+            all_vars = self.inventory.get_host(name).get_vars()
+            self._add_host_to_composed_groups(self.get_option("groups"), all_vars, name, strict=strict)
+            self._add_host_to_keyed_groups(self.get_option("keyed_groups"), all_vars, name, strict=strict)
+
+        snapshot = InventorySnapshot(commit=commit, created=time.time(), signal=signal)
+        for name in hosts:
+            host = self.inventory.get_host(name)
+            snapshot.hosts[name] = {var: value for var, value in host.vars.items() if var not in IMPLICIT_VARS}
+        for group in self.inventory.groups.values():
+            if group.name in ("all", "ungrouped"):
+                continue
+            members = [host.name for host in group.hosts if host.name in hosts]
+            if members:
+                snapshot.groups[group.name] = members
+            if group.child_groups:
+                snapshot.children[group.name] = [child.name for child in group.child_groups]
+        return snapshot
+
+    def populate(self, snapshot: InventorySnapshot) -> None:
+        for group in list(snapshot.groups) + list(snapshot.children):
+            self.inventory.add_group(group)
+        for group, children in snapshot.children.items():
+            for child in children:
+                self.inventory.add_group(child)
+                self.inventory.add_child(group, child)
+        for name, host_vars in snapshot.hosts.items():
+            self.inventory.add_host(name)
+            for var, value in host_vars.items():
+                self.inventory.set_variable(name, var, value)
+        for group, members in snapshot.groups.items():
+            for name in members:
+                self.inventory.add_child(group, name)
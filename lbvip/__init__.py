@@ -0,0 +1 @@
+"""Shared helpers for the Load Balancer & VIP demo (loader, checks and transforms)."""
@@ -0,0 +1,87 @@
+import asyncio
+import ipaddress
+import re
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from infrahub_sdk import InfrahubClient
+
+from lbvip.models import LoadBalancer, load_balancers
+
+CHANNELS = {4: "ipv4", 6: "ipv6"}
+
+
+def symbol(name: str) -> str:
+    """BIRD symbol derived from a hostname, the dots and dashes aren't allowed in symbol names."""
+    return re.sub(r"[^A-Za-z0-9_]", "_", name)
+
+
+def aggregate(addresses: Iterable[str]) -> Dict[int, List[str]]:
+    """Smallest set of prefixes covering exactly the addresses, by IP version.
+
+    Two blocks are only merged when together they form a prefix, so the result never covers an address
+    missing from the input.
+    """
+    networks: Dict[int, Set[Any]] = {version: set() for version in CHANNELS}
+    for address in addresses:
+        network = ipaddress.ip_network(address)
+        networks[network.version].add(network)
+    return {
+        version: [str(network) for network in ipaddress.collapse_addresses(sorted(items))]
+        for version, items in networks.items()
+    }
+
+
+@dataclass
+class Announcement:
+    """Routes a load balancer announces for its VIPs."""
+
+    hostname: str
+    vips: int = 0
+    prefixes: Dict[int, List[str]] = field(default_factory=dict)
+
+    @property
+    def symbol(self) -> str:
+        return symbol(self.hostname)
+
+    @property
+    def routes(self) -> int:
+        return sum(len(prefixes) for prefixes in self.prefixes.values())
+
+    @property
+    def channels(self) -> List[Tuple[str, List[str]]]:
+        """(channel, prefixes) of the IP versions with a VIP."""
+        return [(CHANNELS[version], prefixes) for version, prefixes in sorted(self.prefixes.items()) if prefixes]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "hostname": self.hostname,
+            "vips": self.vips,
+            "routes": self.routes,
+            **{channel: prefixes for channel, prefixes in self.channels},
+        }
+
+
+def announce(lb: LoadBalancer) -> Announcement:
+    addresses = {vip.ip for vip in lb.vips if vip.ip}
+    return Announcement(hostname=lb.hostname, vips=len(addresses), prefixes=aggregate(addresses))
+
+
+async def route_report(
+    client: InfrahubClient, branch: Optional[str] = None, hostnames: Optional[List[str]] = None, concurrency: int = 10
+) -> List[Announcement]:
+    """Announcement of each load balancer, from the lb_vip query like the bird_config artifact."""
+    if not hostnames:
+        nodes = await client.all(kind="ServerLoadBalancer", branch=branch, populate_store=False)
+        hostnames = sorted(node.hostname.value for node in nodes)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(hostname: str) -> List[Announcement]:
+        async with semaphore:
+            response = await client.query_gql_query(name="lb_vip", variables={"hostname": hostname}, branch_name=branch)
+        return [announce(lb) for lb in load_balancers(response.get("data") or response)]
+
+    results = await asyncio.gather(*(fetch(hostname) for hostname in hostnames))
+    return [announcement for announcements in results for announcement in announcements]
@@ -0,0 +1,122 @@
+import asyncio
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.exceptions import GraphQLError
+from infrahub_sdk.graphql import render_input_block, render_query_block
+from infrahub_sdk.node import InfrahubNode
+
+# The mutation InfrahubClient.allocate_next_ip_address sends
+ALLOCATION_MUTATION = "IPAddressPoolGetResource"
+DEFAULT_CHUNK_SIZE = 100
+
+
+@dataclass
+class AllocationRequest:
+    pool_id: str
+    identifier: str
+    data: Optional[Dict[str, Any]] = None
+    prefix_length: Optional[int] = None
+    address: Optional[InfrahubNode] = None
+
+
+class BulkIPAllocator:
+    """Collects the IP address allocations of each CoreIPAddressPool and resolves them in batched mutations.
+
+    Each chunk of requests for a pool is sent as a single GraphQL document containing one aliased
+    `IPAddressPoolGetResource` mutation per request, and the allocated addresses are then
+    retrieved with a single query. Allocations keep using the identifier of the requester so that a
+    re-run returns the same addresses.
+    """
+
+    def __init__(self, client: InfrahubClient, branch: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self.client = client
+        self.branch = branch or client.default_branch
+        self.chunk_size = chunk_size
+        self.pools: Dict[str, InfrahubNode] = {}
+        self.requests: Dict[str, Dict[str, AllocationRequest]] = defaultdict(dict)
+
+    def request(
+        self,
+        resource_pool: InfrahubNode,
+        identifier: str,
+        data: Optional[Dict[str, Any]] = None,
+        prefix_length: Optional[int] = None,
+    ) -> AllocationRequest:
+        """Registers an allocation, requesting the same identifier twice from a pool returns the same request."""
+        if resource_pool.get_kind() != "CoreIPAddressPool":
+            raise ValueError("resource_pool is not an IP address pool")
+
+        self.pools[resource_pool.id] = resource_pool
+        pool_requests = self.requests[resource_pool.id]
+        if identifier not in pool_requests:
+            pool_requests[identifier] = AllocationRequest(
+                pool_id=resource_pool.id,
+                identifier=identifier,
+                data=data,
+                prefix_length=prefix_length,
+            )
+        return pool_requests[identifier]
+
+    def get(self, resource_pool: InfrahubNode, identifier: str) -> Optional[InfrahubNode]:
+        request = self.requests.get(resource_pool.id, {}).get(identifier)
+        return request.address if request else None
+
+    def render_mutation(self, requests: List[AllocationRequest]) -> Tuple[str, Dict[str, AllocationRequest]]:
+        """Renders one aliased allocation mutation per request into a single GraphQL document."""
+        aliases = {}
+        lines = ["mutation BulkAllocateIPAddress {"]
+        for index, request in enumerate(requests):
+            alias = f"allocation{index}"
+            aliases[alias] = request
+
+            input_data: Dict[str, Any] = {"id": request.pool_id, "identifier": request.identifier}
+            if request.prefix_length:
+                input_data["prefix_length"] = request.prefix_length
+            if request.data:
+                input_data["data"] = request.data
+
+            lines.append(f"    {alias}: {ALLOCATION_MUTATION}(")
+            lines.extend(render_input_block(data={"data": input_data}, offset=8, indentation=4))
+            lines.append("    ){")
+            lines.extend(render_query_block(data={"ok": None, "node": {"id": None, "kind": None}}, offset=8, indentation=4))
+            lines.append("    }")
+        lines.append("}")
+
+        return "\n".join(lines), aliases
+
+    async def _allocate_chunk(self, requests: List[AllocationRequest]) -> None:
+        query, aliases = self.render_mutation(requests=requests)
+        response = await self.client.execute_graphql(query=query, branch_name=self.branch)
+
+        ids_by_kind: Dict[str, List[str]] = defaultdict(list)
+        request_by_id: Dict[str, AllocationRequest] = {}
+        for alias, request in aliases.items():
+            result = response.get(alias) or {}
+            if not result.get("ok") or not result.get("node"):
+                raise GraphQLError(
+                    errors=[{"message": f"Unable to allocate an IP address for {request.identifier}"}],
+                    query=query,
+                )
+            ids_by_kind[result["node"]["kind"]].append(result["node"]["id"])
+            request_by_id[result["node"]["id"]] = request
+
+        for kind, ids in ids_by_kind.items():
+            nodes = await self.client.filters(kind=kind, ids=ids, branch=self.branch, populate_store=False)
+            for node in nodes:
+                request_by_id[node.id].address = node
+
+    async def resolve_pool(self, resource_pool: InfrahubNode) -> List[AllocationRequest]:
+        """Resolves the pending requests of a pool, one mutation per chunk of requests."""
+        pending = [request for request in self.requests.get(resource_pool.id, {}).values() if request.address is None]
+        for start in range(0, len(pending), self.chunk_size):
+            await self._allocate_chunk(requests=pending[start : start + self.chunk_size])
+        return list(self.requests.get(resource_pool.id, {}).values())
+
+    async def resolve(self) -> List[AllocationRequest]:
+        """Resolves the pending requests of all pools, pools are processed concurrently."""
+        results = await asyncio.gather(*[self.resolve_pool(resource_pool=pool) for pool in self.pools.values()])
+        return [request for pool_requests in results for request in pool_requests]
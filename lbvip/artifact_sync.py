@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from infrahub_sdk import Config, InfrahubClient
+from infrahub_sdk.exceptions import Error, ServerNotReachableError, ServerNotResponsiveError
+from infrahub_sdk.node import InfrahubNode
+from infrahub_sdk.types import HTTPMethod
+
+DEFAULT_CONCURRENCY = 20
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+# Artifacts still pending or failed in Infrahub, they have no content yet
+MISSING = "missing"
+FAILED = "failed"
+
+
+def checksum(content: str) -> str:
+    """Checksum of a content computed the same way Infrahub does for the artifacts."""
+    return hashlib.md5(content.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+
+def file_checksum(path: Path) -> Optional[str]:
+    if not path.is_file():
+        return None
+    return checksum(path.read_text(encoding="utf-8"))
+
+
+class PooledRequester:
+    """Requester of the SDK reusing one HTTP connection pool for all the requests of a client.
+
+    The default requester of the SDK opens a new connection for every request, with many small
+    requests the TCP and TLS handshakes dominate.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, verify: Any = True) -> None:
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            verify=verify,
+        )
+
+    async def __call__(
+        self,
+        url: str,
+        method: HTTPMethod,
+        headers: Dict[str, Any],
+        timeout: int,
+        payload: Optional[dict] = None,
+    ) -> httpx.Response:
+        try:
+            return await self.http.request(
+                method=method.value, url=url, headers=headers, timeout=timeout, json=payload if payload else None
+            )
+        except httpx.NetworkError as exc:
+            raise ServerNotReachableError(address=url) from exc
+        except httpx.ReadTimeout as exc:
+            raise ServerNotResponsiveError(url=url, timeout=timeout) from exc
+
+    async def close(self) -> None:
+        await self.http.aclose()
+
+
+@asynccontextmanager
+async def pooled_client(concurrency: int = DEFAULT_CONCURRENCY, **config: Any) -> AsyncIterator[InfrahubClient]:
+    """InfrahubClient sharing one connection pool, `config` is passed to the SDK Config (address, api_token...)."""
+    requester = PooledRequester(concurrency=concurrency, verify=not config.get("tls_insecure", False))
+    client = InfrahubClient(config=Config(requester=requester, max_concurrent_execution=concurrency, **config))
+    try:
+        yield client
+    finally:
+        await requester.close()
+
+
+@dataclass
+class SyncedArtifact:
+    target: str
+    path: Path
+    checksum: Optional[str]
+    status: str
+    error: Optional[str] = None
+
+
+class ArtifactSync:
+    """Download the artifacts of a definition in bulk and write only the ones that changed locally.
+
+    All the artifacts of the definition are listed with one paginated query, their checksum is
+    compared with the checksum of the file already on disk and only the content of the artifacts
+    that differ is downloaded, concurrently. The artifacts without content yet are reported as
+    missing, and the ones that can't be downloaded as failed, without stopping the others.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        artifact_name: str,
+        destination: Path,
+        filename: str = "{target}",
+        branch: Optional[str] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> None:
+        self.client = client
+        self.artifact_name = artifact_name
+        self.destination = destination
+        self.filename = filename
+        self.branch = branch
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def artifacts(self, target_ids: Optional[List[str]] = None) -> List[InfrahubNode]:
+        definition = await self.client.get(
+            kind="CoreArtifactDefinition", name__value=self.artifact_name, branch=self.branch
+        )
+        filters: Dict[str, Any] = {"definition__ids": [definition.id]}
+        if target_ids:
+            filters["object__ids"] = target_ids
+        return await self.client.filters(kind="CoreArtifact", branch=self.branch, populate_store=False, **filters)
+
+    def path(self, artifact: InfrahubNode) -> Path:
+        target = artifact.object.display_label or artifact.object.id
+        return self.destination / self.filename.format(target=target, name=artifact.name.value)
+
+    async def sync_one(self, artifact: InfrahubNode, check_mode: bool = False) -> SyncedArtifact:
+        path = self.path(artifact)
+        remote_checksum = artifact.checksum.value
+        synced = SyncedArtifact(target=artifact.object.display_label, path=path, checksum=remote_checksum, status=UNCHANGED)
+        if not artifact.storage_id.value:
+            synced.status = MISSING
+            return synced
+        if remote_checksum and file_checksum(path) == remote_checksum:
+            return synced
+
+        synced.status = CHANGED
+        if check_mode:
+            return synced
+        # A failed download is reported with the artifact, the others are still written
+        try:
+            async with self.semaphore:
+                content = await self.client.object_store.get(identifier=artifact.storage_id.value)
+            if remote_checksum and checksum(content) != remote_checksum:
+                raise ValueError(f"the content of {artifact.storage_id.value} doesn't match the checksum {remote_checksum}")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+        except (Error, httpx.HTTPError, OSError, ValueError) as exc:
+            synced.status = FAILED
+            synced.error = str(exc) or type(exc).__name__
+        return synced
+
+    async def run(self, target_ids: Optional[List[str]] = None, check_mode: bool = False) -> List[SyncedArtifact]:
+        artifacts = await self.artifacts(target_ids=target_ids)
+        return await asyncio.gather(*[self.sync_one(artifact=artifact, check_mode=check_mode) for artifact in artifacts])
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import os
+import time
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from infrahub_sdk import InfrahubClient
+
+from lbvip.fingerprints import FingerprintStore, artifact_fingerprint
+from lbvip.queries import QueryCache
+from lbvip.rendering import BIRD_TEMPLATE, HAPROXY_TEMPLATE, NGINX_TEMPLATE, render_bird, render_haproxy, render_nginx
+
+DEFAULT_OUTPUT_DIRECTORY = Path("artifacts")
+DEFAULT_CONCURRENCY = 10
+
+
+@dataclass(frozen=True)
+class ArtifactDefinition:
+    """Mirror of an artifact definition of .infrahub.yml, rendered with its Python transform."""
+
+    name: str
+    query: str
+    targets: str
+    template: str
+    render: Callable[[Dict[str, Any]], str]
+
+
+ARTIFACT_DEFINITIONS = (
+    ArtifactDefinition(
+        name="haproxy_config", query="lb_vip", targets="load_balancers", template=HAPROXY_TEMPLATE, render=render_haproxy
+    ),
+    ArtifactDefinition(
+        name="bird_config", query="lb_vip", targets="load_balancers", template=BIRD_TEMPLATE, render=render_bird
+    ),
+    ArtifactDefinition(
+        name="ngninx_config", query="frontend_vip", targets="web_servers", template=NGINX_TEMPLATE, render=render_nginx
+    ),
+)
+
+
+@dataclass
+class RenderedArtifact:
+    definition: str
+    target: str
+    path: Path
+    fingerprint: str
+    content: Optional[str] = None
+
+    @property
+    def skipped(self) -> bool:
+        """The fingerprint matched the previous run, the artifact wasn't rendered again."""
+        return self.content is None
+
+
+class StageTimings:
+    """Durations per stage, the wall-clock time of each stage and the latency of each item."""
+
+    def __init__(self) -> None:
+        self.wall: Dict[str, float] = {}
+        self.items: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, stage: str, duration: float) -> None:
+        self.items[stage].append(duration)
+
+    @staticmethod
+    def percentile(durations: List[float], percent: float) -> float:
+        ordered = sorted(durations)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = {stage: {"wall": duration} for stage, duration in self.wall.items()}
+        for stage, durations in self.items.items():
+            result.setdefault(stage, {}).update(
+                {
+                    "count": len(durations),
+                    "mean": sum(durations) / len(durations),
+                    "p50": self.percentile(durations, 50),
+                    "p95": self.percentile(durations, 95),
+                    "max": max(durations),
+                }
+            )
+        return result
+
+
+def render_artifact(definition_name: str, data: Dict[str, Any]) -> Tuple[str, float]:
+    """Render one artifact in a worker process, returns the content and the rendering time."""
+    start = time.perf_counter()
+    definition = next(definition for definition in ARTIFACT_DEFINITIONS if definition.name == definition_name)
+    return definition.render(data), time.perf_counter() - start
+
+
+class FleetRenderer:
+    """Render the artifacts of every member of the target groups outside of the Infrahub task workers.
+
+    The members of the groups are enumerated, the query of each (definition, target) is fetched
+    concurrently through a QueryCache, so the transforms sharing a query fetch it once per host,
+    and the templates are rendered across a pool of processes while the next results are fetched.
+
+    Each (definition, target) is fingerprinted from its query result and template, the artifacts
+    whose fingerprint didn't change since the previous run are neither rendered nor written.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        log: logging.Logger,
+        output: Path = DEFAULT_OUTPUT_DIRECTORY,
+        branch: Optional[str] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        workers: Optional[int] = None,
+        definitions: Tuple[ArtifactDefinition, ...] = ARTIFACT_DEFINITIONS,
+        force: bool = False,
+    ) -> None:
+        self.client = client
+        self.log = log
+        self.output = output
+        self.branch = branch
+        self.concurrency = concurrency
+        self.workers = workers or os.cpu_count()
+        self.definitions = definitions
+        self.force = force
+        self.fingerprints = FingerprintStore(directory=output)
+        self.cache = QueryCache(client=client, branch=branch)
+        self.timings = StageTimings()
+        self.artifacts: List[RenderedArtifact] = []
+
+    async def group_members(self, group_name: str) -> List[str]:
+        """Hostnames of the members of a group."""
+        group = await self.client.get(
+            kind="CoreStandardGroup", name__value=group_name, branch=self.branch, include=["members"]
+        )
+        ids_by_kind: Dict[str, List[str]] = defaultdict(list)
+        for member in group.members.peers:
+            ids_by_kind[member.typename].append(member.id)
+
+        hostnames = []
+        for kind, ids in ids_by_kind.items():
+            nodes = await self.client.filters(kind=kind, ids=ids, branch=self.branch, populate_store=False)
+            hostnames.extend(node.hostname.value for node in nodes)
+        return sorted(hostnames)
+
+    async def enumerate_targets(self) -> List[Tuple[ArtifactDefinition, str]]:
+        groups = sorted({definition.targets for definition in self.definitions})
+        members = dict(zip(groups, await asyncio.gather(*[self.group_members(group) for group in groups])))
+        # Grouped per host so that the definitions sharing a query hit the cache right away
+        return [
+            (definition, target)
+            for group in groups
+            for target in members[group]
+            for definition in self.definitions
+            if definition.targets == group
+        ]
+
+    async def fetch(self, semaphore: asyncio.Semaphore, definition: ArtifactDefinition, target: str) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            data = await self.cache.query(name=definition.query, variables={"hostname": target})
+            self.timings.record("fetch", time.perf_counter() - start)
+            return data
+
+    async def render_one(
+        self,
+        pool: ProcessPoolExecutor,
+        semaphore: asyncio.Semaphore,
+        definition: ArtifactDefinition,
+        target: str,
+    ) -> RenderedArtifact:
+        data = await self.fetch(semaphore=semaphore, definition=definition, target=target)
+        artifact = RenderedArtifact(
+            definition=definition.name,
+            target=target,
+            path=self.output / target / f"{definition.name}.conf",
+            fingerprint=artifact_fingerprint(definition=definition.name, template=definition.template, data=data),
+        )
+        unchanged = self.fingerprints.matches(definition=definition.name, target=target, value=artifact.fingerprint)
+        if unchanged and artifact.path.exists() and not self.force:
+            return artifact
+
+        artifact.content, duration = await asyncio.get_running_loop().run_in_executor(
+            pool, render_artifact, definition.name, data
+        )
+        self.timings.record("render", duration)
+        return artifact
+
+    def write(self, artifact: RenderedArtifact) -> None:
+        start = time.perf_counter()
+        artifact.path.parent.mkdir(parents=True, exist_ok=True)
+        artifact.path.write_text(artifact.content)  # type: ignore[arg-type]
+        self.fingerprints.set(definition=artifact.definition, target=artifact.target, value=artifact.fingerprint)
+        self.timings.record("write", time.perf_counter() - start)
+
+    async def run(self) -> List[RenderedArtifact]:
+        start = time.perf_counter()
+        # The results are keyed by the repository commit, a new commit invalidates the cached queries
+        await self.cache.refresh()
+        targets = await self.enumerate_targets()
+        self.timings.wall["enumerate"] = time.perf_counter() - start
+        self.log.info(f"Processing {len(targets)} artifacts with {self.workers} processes")
+
+        render_start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            self.artifacts = await asyncio.gather(
+                *[
+                    self.render_one(pool=pool, semaphore=semaphore, definition=definition, target=target)
+                    for definition, target in targets
+                ]
+            )
+        self.timings.wall["fetch+render"] = time.perf_counter() - render_start
+
+        write_start = time.perf_counter()
+        for artifact in self.artifacts:
+            if not artifact.skipped:
+                self.write(artifact)
+        self.fingerprints.save()
+        self.timings.wall["write"] = time.perf_counter() - write_start
+        self.timings.wall["total"] = time.perf_counter() - start
+        return self.artifacts
+
+    def report(self) -> None:
+        total = self.timings.wall.get("total", 0.0)
+        throughput = len(self.artifacts) / total if total else 0.0
+        skipped = len([artifact for artifact in self.artifacts if artifact.skipped])
+        self.log.info(
+            f"Processed {len(self.artifacts)} artifacts in {total:.2f}s ({throughput:.1f} artifacts/s),"
+            f" {len(self.artifacts) - skipped} rendered and {skipped} unchanged"
+        )
+        for stage, stats in self.timings.summary().items():
+            details = []
+            if "wall" in stats:
+                details.append(f"{stats['wall']:.3f}s")
+            if "count" in stats:
+                details.append(
+                    f"{stats['count']} items, mean {stats['mean'] * 1000:.1f}ms, p50 {stats['p50'] * 1000:.1f}ms,"
+                    f" p95 {stats['p95'] * 1000:.1f}ms, max {stats['max'] * 1000:.1f}ms"
+                )
+            self.log.info(f"- {stage}: {', '.join(details)}")
+        cache = self.cache.stats()
+        self.log.info(f"- queries: {cache['misses']} fetched, {cache['hits']} served from the cache")
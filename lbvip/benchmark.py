@@ -0,0 +1,508 @@
+import ipaddress
+import json
+import platform
+import statistics
+import tempfile
+import time
+
+from dataclasses import asdict, dataclass, field
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import jinja2
+
+from lbvip.artifacts import StageTimings
+from lbvip.catalog import SchemaCatalog
+from lbvip.iparray import PrefixArray
+from lbvip.ipam import PrefixIndex, pool_name
+from lbvip.provisioning import ProvisioningGraph
+from lbvip.rendering import render_bird, render_haproxy, render_nginx
+from lbvip.topology import read_records
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+TRANSFORMS_DIRECTORY = REPOSITORY_ROOT / "transforms"
+
+INTERNAL_DOMAIN = "duff.ninja"
+EXTERNAL_DOMAIN = "duff.io"
+
+# Address space of the synthetic sites, one /24 of each per site and one /20 of private space
+TECHNICAL_SUPERNET = ipaddress.ip_network("100.64.0.0/10")
+PUBLIC_SUPERNET = ipaddress.ip_network("11.0.0.0/8")
+PRIVATE_SUPERNET = ipaddress.ip_network("10.0.0.0/8")
+MAX_SITES = 2 ** (20 - PRIVATE_SUPERNET.prefixlen)
+MAX_HOSTS = 250
+
+
+def environment_of(index: int, count: int) -> str:
+    """Three quarters of the objects of a site are in production, like the sites of init_data."""
+    return "production" if index <= max(1, count * 3 // 4) else "development"
+
+
+def address_of(prefix: ipaddress.IPv4Network, host: int, prefixlen: Optional[int] = None) -> str:
+    return f"{prefix[host]}/{prefixlen or prefix.prefixlen}"
+
+
+def ip_node(address: str) -> Dict[str, Any]:
+    return {"node": {"address": {"value": address, "ip": address.split("/")[0]}}}
+
+
+@dataclass(frozen=True)
+class SyntheticSite:
+    index: int
+    name: str
+    technical: ipaddress.IPv4Network
+    public: ipaddress.IPv4Network
+    private: ipaddress.IPv4Network
+
+    @property
+    def dmz(self) -> ipaddress.IPv4Network:
+        return next(self.private.subnets(new_prefix=24))
+
+    def server(self, environment: str) -> ipaddress.IPv4Network:
+        return list(self.private.subnets(new_prefix=24))[1 if environment == "production" else 2]
+
+
+@dataclass(frozen=True)
+class SyntheticTopology:
+    """Topology shaped like the SITES and PREFIXES of init_data, with `sites` sites of `frontends`
+    Frontend Servers, `vips` VIPs of `members` frontends each and one Load Balancer."""
+
+    sites: int = 3
+    frontends: int = 4
+    vips: int = 3
+    members: int = 3
+
+    def __post_init__(self) -> None:
+        if not 0 < self.sites <= MAX_SITES:
+            raise ValueError(f"The number of sites must be between 1 and {MAX_SITES}")
+        if not 0 < self.frontends <= MAX_HOSTS or not 0 < self.vips <= MAX_HOSTS:
+            raise ValueError(f"The number of frontends and VIPs per site must be between 1 and {MAX_HOSTS}")
+
+    @cached_property
+    def site_list(self) -> List[SyntheticSite]:
+        technical = TECHNICAL_SUPERNET.subnets(new_prefix=24)
+        public = PUBLIC_SUPERNET.subnets(new_prefix=24)
+        private = PRIVATE_SUPERNET.subnets(new_prefix=20)
+        return [
+            SyntheticSite(
+                index=index,
+                name=f"S{index:04d}.BEN.XX",
+                technical=next(technical),
+                public=next(public),
+                private=next(private),
+            )
+            for index in range(1, self.sites + 1)
+        ]
+
+    # Hostnames
+    def frontend_hostname(self, site: SyntheticSite, index: int) -> str:
+        environment = environment_of(index, self.frontends)
+        return f"frontend{index}.{environment}.{site.name.lower()}.{INTERNAL_DOMAIN}"
+
+    def vip_hostname(self, site: SyntheticSite, index: int) -> str:
+        return f"vip{index}.{environment_of(index, self.vips)}.{site.name.lower()}.{EXTERNAL_DOMAIN}"
+
+    def lb_hostname(self, site: SyntheticSite) -> str:
+        return f"lb.dmz.{site.name.lower()}.{INTERNAL_DOMAIN}"
+
+    def vip_members(self, site: SyntheticSite, index: int) -> List[int]:
+        """Frontends of the VIP, taken round-robin among the frontends of the same environment."""
+        environment = environment_of(index, self.vips)
+        candidates = [i for i in range(1, self.frontends + 1) if environment_of(i, self.frontends) == environment]
+        candidates = candidates or list(range(1, self.frontends + 1))
+        count = min(self.members, len(candidates))
+        return [candidates[(index + offset) % len(candidates)] for offset in range(count)]
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {
+            "sites": self.sites,
+            "frontends": self.sites * self.frontends,
+            "vips": self.sites * self.vips,
+            "load_balancers": self.sites,
+        }
+
+    # init_data
+    def prefixes(self) -> List[Dict[str, Any]]:
+        prefixes: List[Dict[str, Any]] = [
+            {"prefix": str(TECHNICAL_SUPERNET), "location": None, "role": "supernet", "vrf": "Internet"},
+            {"prefix": str(PUBLIC_SUPERNET), "location": None, "role": "supernet", "vrf": "Internet"},
+            {"prefix": str(PRIVATE_SUPERNET), "location": None, "role": "supernet", "vrf": None},
+        ]
+        for site in self.site_list:
+            prefixes.extend(
+                [
+                    {"prefix": str(site.technical), "location": site.name, "role": "technical", "vrf": "Internet"},
+                    {"prefix": str(site.public), "location": site.name, "role": "public", "vrf": "Internet"},
+                    {"prefix": str(site.private), "location": site.name, "role": "supernet", "vrf": None},
+                    {"prefix": str(site.dmz), "location": site.name, "role": "dmz", "vrf": "DMZ"},
+                    {"prefix": str(site.server("production")), "location": site.name, "role": "server", "vrf": "Production"},
+                    {"prefix": str(site.server("development")), "location": site.name, "role": "server", "vrf": "Development"},
+                ]
+            )
+        return prefixes
+
+    # Topology file of `load-data --source`
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for site in self.site_list:
+            for index in range(1, self.frontends + 1):
+                environment = environment_of(index, self.frontends)
+                server = site.server(environment)
+                yield {
+                    "kind": "ServerFrontend",
+                    "hostname": self.frontend_hostname(site, index),
+                    "environment": environment,
+                    "status": "active",
+                    "ip_address": {"pool": pool_name(str(server), site.name, "server", environment.title())},
+                    "member_of_groups": ["web_servers"],
+                }
+            for index in range(1, self.vips + 1):
+                yield {
+                    "kind": "InfraVIP",
+                    "hostname": self.vip_hostname(site, index),
+                    "mode": "http",
+                    "balance": "roundrobin",
+                    "status": "active",
+                    "ip_address": {"pool": pool_name(str(site.public), site.name, "public", "Internet")},
+                    "frontend_servers": [self.frontend_hostname(site, i) for i in self.vip_members(site, index)],
+                }
+            yield {
+                "kind": "ServerLoadBalancer",
+                "hostname": self.lb_hostname(site),
+                "environment": "production",
+                "status": "active",
+                "ip_address": {"pool": pool_name(str(site.dmz), site.name, "dmz", "DMZ")},
+                "public_ip_address": {"pool": pool_name(str(site.technical), site.name, "technical", "Internet")},
+                "virtual_ips": [self.vip_hostname(site, index) for index in range(1, self.vips + 1)],
+                "member_of_groups": ["load_balancers"],
+            }
+
+    def write_records(self, path: Path) -> Path:
+        with path.open("w") as handle:
+            for record in self.records():
+                handle.write(json.dumps(record) + "\n")
+        return path
+
+    # Query results
+    def vip_node(self, site: SyntheticSite, index: int, with_members: bool = True) -> Dict[str, Any]:
+        node: Dict[str, Any] = {
+            "hostname": {"value": self.vip_hostname(site, index)},
+            "status": {"value": "active"},
+            "balance": {"value": "roundrobin"},
+            "mode": {"value": "http"},
+            "ssl_certificate": {"value": None},
+            "ip_address": ip_node(address_of(site.public, index, prefixlen=32)),
+        }
+        if with_members:
+            node["frontend_servers"] = {
+                "edges": [
+                    {
+                        "node": {
+                            "hostname": {"value": self.frontend_hostname(site, member)},
+                            "status": {"value": "active"},
+                            "ip_address": ip_node(self.frontend_address(site, member)),
+                        }
+                    }
+                    for member in self.vip_members(site, index)
+                ]
+            }
+            node["health_checks"] = {
+                "edges": [
+                    {"node": {"check_type": {"value": "http"}, "rise": {"value": 2}, "fall": {"value": 3}, "timeout": {"value": 500}}}
+                ]
+            }
+        return node
+
+    def frontend_address(self, site: SyntheticSite, index: int) -> str:
+        return address_of(site.server(environment_of(index, self.frontends)), index)
+
+    def lb_vip_data(self, site: SyntheticSite) -> Dict[str, Any]:
+        """Result of the lb_vip query for the Load Balancer of a site."""
+        node = {
+            "id": f"lb-{site.index}",
+            "hostname": {"value": self.lb_hostname(site)},
+            "ip_address": ip_node(address_of(site.dmz, 1)),
+            "asn": {"node": {"asn": {"value": 65100 + site.index % 200}}},
+            "public_ip_address": {
+                "node": {
+                    "address": {"value": address_of(site.technical, 1)},
+                    "ip_prefix": {"node": {"gateway": {"node": {"address": {"ip": str(site.technical[-2])}}}}},
+                }
+            },
+            "virtual_ips": {"edges": [{"node": self.vip_node(site, index)} for index in range(1, self.vips + 1)]},
+        }
+        return {"ServerLoadBalancer": {"edges": [{"node": node}]}}
+
+    def frontend_vip_data(self, site: SyntheticSite, index: int) -> Dict[str, Any]:
+        """Result of the frontend_vip query for a Frontend Server."""
+        vips = [vip for vip in range(1, self.vips + 1) if index in self.vip_members(site, vip)]
+        node = {
+            "id": f"frontend-{site.index}-{index}",
+            "hostname": {"value": self.frontend_hostname(site, index)},
+            "ip_address": ip_node(self.frontend_address(site, index)),
+            "virtual_ips": {"edges": [{"node": self.vip_node(site, vip, with_members=False)} for vip in vips]},
+        }
+        return {"ServerFrontend": {"edges": [{"node": node}]}}
+
+    def check_data(self) -> Dict[str, Any]:
+        """Result of the lb_and_vip_env query for the whole topology."""
+        edges = []
+        for site in self.site_list:
+            vips = []
+            for index in range(1, self.vips + 1):
+                frontends = [
+                    {
+                        "node": {
+                            "id": f"frontend-{site.index}-{member}",
+                            "hostname": {"value": self.frontend_hostname(site, member)},
+                            "environment": {"value": environment_of(member, self.frontends)},
+                            "ip_address": ip_node(self.frontend_address(site, member)),
+                        }
+                    }
+                    for member in self.vip_members(site, index)
+                ]
+                vips.append(
+                    {
+                        "node": {
+                            "id": f"vip-{site.index}-{index}",
+                            "hostname": {"value": self.vip_hostname(site, index)},
+                            "ip_address": ip_node(address_of(site.public, index, prefixlen=32)),
+                            "frontend_servers": {"edges": frontends},
+                        }
+                    }
+                )
+            edges.append(
+                {
+                    "node": {
+                        "id": f"lb-{site.index}",
+                        "hostname": {"value": self.lb_hostname(site)},
+                        "environment": {"value": "production"},
+                        "ip_address": ip_node(address_of(site.dmz, 1)),
+                        "virtual_ips": {"edges": vips},
+                    }
+                }
+            )
+        return {"ServerLoadBalancer": {"edges": edges}}
+
+    def check_prefixes(self) -> List[Dict[str, Any]]:
+        """Prefixes of the lb_and_vip_env_prefixes query, with the id of their location."""
+        ids = {site.name: f"site-{site.index}" for site in self.site_list}
+        return [{**prefix, "location_id": ids.get(prefix["location"])} for prefix in self.prefixes()]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    items: int
+    durations: List[float] = field(default_factory=list)
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, Any]:
+        best = min(self.durations)
+        return {
+            "name": self.name,
+            "items": self.items,
+            "iterations": len(self.durations),
+            "min": best,
+            "mean": statistics.mean(self.durations),
+            "median": statistics.median(self.durations),
+            "p95": StageTimings.percentile(self.durations, 95),
+            "max": max(self.durations),
+            "items_per_second": self.items / best if best else None,
+            **self.details,
+        }
+
+
+def measure(name: str, func: Callable[[], Any], items: int, iterations: int) -> BenchmarkResult:
+    result = BenchmarkResult(name=name, items=items)
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        result.durations.append(time.perf_counter() - start)
+    return result
+
+
+@lru_cache(maxsize=None)
+def jinja2_transform(name: str) -> jinja2.Template:
+    """Template of a Jinja2 transform of .infrahub.yml, loaded like infrahubctl does."""
+    environment = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(TRANSFORMS_DIRECTORY)), trim_blocks=True, lstrip_blocks=True
+    )
+    return environment.get_template(name)
+
+
+class BenchmarkSuite:
+    """Time the check, the transforms and the offline phases of the loader on a synthetic topology."""
+
+    def __init__(self, topology: SyntheticTopology, iterations: int = 5) -> None:
+        self.topology = topology
+        self.iterations = iterations
+        self.catalog = SchemaCatalog.from_directory()
+        self.results: List[BenchmarkResult] = []
+
+    def benchmarks(self) -> Dict[str, Callable[[], BenchmarkResult]]:
+        return {
+            "check.validate": self.check_validate,
+            "render.jinja2.haproxy_config": lambda: self.render_jinja2("haproxy_config", "haproxy.conf.j2", self.lb_data),
+            "render.jinja2.bird_config": lambda: self.render_jinja2("bird_config", "bird.conf.j2", self.lb_data),
+            "render.jinja2.ngninx_config": lambda: self.render_jinja2("ngninx_config", "nginx.conf.j2", self.frontend_data),
+            "render.python.haproxy_config": lambda: self.render_python("haproxy_config", render_haproxy, self.lb_data),
+            "render.python.bird_config": lambda: self.render_python("bird_config", render_bird, self.lb_data),
+            "render.python.ngninx_config": lambda: self.render_python("ngninx_config", render_nginx, self.frontend_data),
+            "loader.prefix_index": self.loader_prefix_index,
+            "loader.prefix_array": self.loader_prefix_array,
+            "loader.parse_validate": self.loader_parse_validate,
+            "loader.plan": self.loader_plan,
+            "offline.demo": self.offline_demo,
+        }
+
+    @cached_property
+    def lb_data(self) -> List[Dict[str, Any]]:
+        return [self.topology.lb_vip_data(site) for site in self.topology.site_list]
+
+    @cached_property
+    def frontend_data(self) -> List[Dict[str, Any]]:
+        return [
+            self.topology.frontend_vip_data(site, index)
+            for site in self.topology.site_list
+            for index in range(1, self.topology.frontends + 1)
+        ]
+
+    def check_validate(self) -> BenchmarkResult:
+        from checks.validate_lb_and_vip import InfrahubCheckLBVIPBackendLocationEnvironment
+
+        data = self.topology.check_data()
+        prefixes = self.topology.check_prefixes()
+        errors: List[int] = []
+
+        def validate() -> None:
+            check = InfrahubCheckLBVIPBackendLocationEnvironment()
+            check.prefix_index = PrefixIndex(prefixes=prefixes)
+            check.validate(data)
+            errors.append(len(check.errors))
+
+        result = measure("check.validate", validate, items=self.topology.sites, iterations=self.iterations)
+        # The development VIPs of each site are attached to a production LB, each of their frontends is reported
+        result.details["errors"] = errors[-1]
+        return result
+
+    def render_jinja2(self, name: str, template: str, results: List[Dict[str, Any]]) -> BenchmarkResult:
+        compiled = jinja2_transform(template)
+        return measure(
+            f"render.jinja2.{name}",
+            lambda: [compiled.render(data=data) for data in results],
+            items=len(results),
+            iterations=self.iterations,
+        )
+
+    def render_python(self, name: str, render: Callable[[Dict[str, Any]], str], results: List[Dict[str, Any]]) -> BenchmarkResult:
+        return measure(
+            f"render.python.{name}",
+            lambda: [render(data) for data in results],
+            items=len(results),
+            iterations=self.iterations,
+        )
+
+    def loader_prefix_index(self) -> BenchmarkResult:
+        prefixes = self.topology.prefixes()
+        return measure(
+            "loader.prefix_index", lambda: PrefixIndex(prefixes=prefixes), items=len(prefixes), iterations=self.iterations
+        )
+
+    def loader_prefix_array(self) -> BenchmarkResult:
+        """Gateways, pool boundaries, nesting and duplicates of the whole prefix table, computed in bulk."""
+        prefixes = [prefix["prefix"] for prefix in self.topology.prefixes()]
+
+        def compute() -> None:
+            array = PrefixArray.from_strings(prefixes)
+            array.gateways()
+            array.host_range()
+            array.overlaps()
+            array.duplicates()
+
+        return measure("loader.prefix_array", compute, items=len(prefixes), iterations=self.iterations)
+
+    def loader_parse_validate(self) -> BenchmarkResult:
+        """Read the topology file and validate the records against the schemas, as load-data --source does."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.topology.write_records(Path(directory) / "topology.jsonl")
+
+            def parse_validate() -> None:
+                for record in read_records(path=path, catalog=self.catalog):
+                    errors = self.catalog.validate(kind=record.kind, data=record.data)
+                    if errors:
+                        raise ValueError(f"Invalid synthetic record at {record.location}: {errors}")
+
+            items = sum(self.topology.counts[kind] for kind in ("frontends", "vips", "load_balancers"))
+            return measure("loader.parse_validate", parse_validate, items=items, iterations=self.iterations)
+
+    def loader_plan(self) -> BenchmarkResult:
+        """Build the provisioning graph of the servers, VIPs and LBs and order it in levels."""
+        records = list(self.topology.records())
+
+        async def noop(**kwargs: Any) -> None:
+            return None
+
+        def plan() -> None:
+            graph = ProvisioningGraph()
+            pools = set()
+            for record in records:
+                depends_on = []
+                for name, value in record.items():
+                    if isinstance(value, dict):
+                        step_key = f"pool:{value['pool']}"
+                        if step_key not in pools:
+                            graph.add(key=step_key, phase="ip_allocation", task=noop)
+                            pools.add(step_key)
+                        depends_on.append(step_key)
+                    elif isinstance(value, list) and name != "member_of_groups":
+                        depends_on.extend(value)
+                graph.add(key=record["hostname"], phase=record["kind"], task=noop, depends_on=depends_on)
+            graph.levels()
+
+        return measure("loader.plan", plan, items=len(records), iterations=self.iterations)
+
+    def offline_demo(self) -> BenchmarkResult:
+        """Load the data of init_data, run the check and render the artifacts against the in-memory Infrahub."""
+        import asyncio
+        import logging
+
+        from lbvip.offline import OfflineInfrahub, OfflineSchema, offline_client, run_demo
+
+        schema = OfflineSchema.from_directory()
+        reports: List[Dict[str, Any]] = []
+        backends: List[OfflineInfrahub] = []
+
+        def demo() -> None:
+            backends.append(OfflineInfrahub(schema=schema))
+            client = offline_client(backend=backends[-1])
+            reports.append(asyncio.run(run_demo(client=client, log=logging.getLogger("benchmark"))))
+
+        result = measure("offline.demo", demo, items=1, iterations=self.iterations)
+        result.items = len(backends[-1].nodes)
+        result.details["artifacts"] = reports[-1]["artifacts"]
+        for step, duration in reports[-1]["timings"].items():
+            result.details[f"{step}_seconds"] = duration
+        return result
+
+    def run(self, selected: Optional[List[str]] = None) -> List[BenchmarkResult]:
+        benchmarks = self.benchmarks()
+        unknown = set(selected or []) - set(benchmarks)
+        if unknown:
+            raise ValueError(f"Unknown benchmarks {', '.join(sorted(unknown))}, expected {', '.join(benchmarks)}")
+        for name, benchmark in benchmarks.items():
+            if not selected or name in selected:
+                self.results.append(benchmark())
+        return self.results
+
+    def report(self) -> Dict[str, Any]:
+        """Machine-readable results, to compare across releases."""
+        return {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "topology": {**asdict(self.topology), **self.topology.counts},
+            "iterations": self.iterations,
+            "results": [result.summary() for result in self.results],
+        }
@@ -0,0 +1,192 @@
+import re
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import yaml
+
+MODELS_DIRECTORY = Path(__file__).resolve().parent.parent / "models"
+
+# Relationships available on every node, they are defined by Infrahub itself and not in models/
+CORE_RELATIONSHIPS = {
+    "member_of_groups": ("CoreGroup", "many"),
+    "subscriber_of_groups": ("CoreGroup", "many"),
+}
+
+
+@dataclass
+class AttributeDefinition:
+    name: str
+    kind: str
+    optional: bool = False
+    unique: bool = False
+    default_value: Any = None
+    choices: List[str] = field(default_factory=list)
+    regex: Optional[str] = None
+
+    @property
+    def mandatory(self) -> bool:
+        return not self.optional and self.default_value is None
+
+
+@dataclass
+class RelationshipDefinition:
+    name: str
+    peer: str
+    cardinality: str = "many"
+    optional: bool = True
+
+
+@dataclass
+class KindDefinition:
+    kind: str
+    is_generic: bool = False
+    inherit_from: List[str] = field(default_factory=list)
+    human_friendly_id: List[str] = field(default_factory=list)
+    default_filter: Optional[str] = None
+    attributes: Dict[str, AttributeDefinition] = field(default_factory=dict)
+    relationships: Dict[str, RelationshipDefinition] = field(default_factory=dict)
+
+    @property
+    def reference_attribute(self) -> str:
+        """Attribute used to reference a node of this kind by name in an input file."""
+        for value in (self.human_friendly_id[:1] or []) + ([self.default_filter] if self.default_filter else []):
+            return value.split("__")[0]
+        return "name"
+
+    @property
+    def extends_core(self) -> bool:
+        """True when the kind inherits its attributes from a Builtin generic, its full set of fields is then unknown."""
+        return any(generic.startswith("Builtin") for generic in self.inherit_from)
+
+
+class SchemaCatalog:
+    """Lightweight view of the schemas defined in models/, used to validate input records before loading them."""
+
+    def __init__(self) -> None:
+        self.kinds: Dict[str, KindDefinition] = {}
+
+    @classmethod
+    def from_directory(cls, directory: Path = MODELS_DIRECTORY) -> "SchemaCatalog":
+        return cls.from_documents(yaml.safe_load(path.read_text()) for path in sorted(directory.glob("**/*.yml")))
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "SchemaCatalog":
+        catalog = cls()
+        extensions = []
+        for document in documents:
+            for generic in document.get("generics") or []:
+                catalog._add(definition=generic, is_generic=True)
+            for node in document.get("nodes") or []:
+                catalog._add(definition=node)
+            extensions.extend((document.get("extensions") or {}).get("nodes") or [])
+
+        for extension in extensions:
+            if extension["kind"] in catalog.kinds:
+                catalog._add_fields(kind_definition=catalog.kinds[extension["kind"]], definition=extension)
+        catalog._inherit()
+        return catalog
+
+    def _add(self, definition: Dict[str, Any], is_generic: bool = False) -> None:
+        kind_definition = KindDefinition(
+            kind=f"{definition['namespace']}{definition['name']}",
+            is_generic=is_generic,
+            inherit_from=list(definition.get("inherit_from") or []),
+            human_friendly_id=list(definition.get("human_friendly_id") or []),
+            default_filter=definition.get("default_filter"),
+        )
+        if definition.get("parent"):
+            kind_definition.relationships["parent"] = RelationshipDefinition(
+                name="parent", peer=definition["parent"], cardinality="one"
+            )
+        if definition.get("children"):
+            kind_definition.relationships["children"] = RelationshipDefinition(name="children", peer=definition["children"])
+        self._add_fields(kind_definition=kind_definition, definition=definition)
+        self.kinds[kind_definition.kind] = kind_definition
+
+    @staticmethod
+    def _add_fields(kind_definition: KindDefinition, definition: Dict[str, Any]) -> None:
+        for attribute in definition.get("attributes") or []:
+            kind_definition.attributes[attribute["name"]] = AttributeDefinition(
+                name=attribute["name"],
+                kind=attribute["kind"],
+                optional=attribute.get("optional", False),
+                unique=attribute.get("unique", False),
+                default_value=attribute.get("default_value"),
+                choices=[choice["name"] for choice in attribute.get("choices") or []],
+                regex=attribute.get("regex"),
+            )
+        for relationship in definition.get("relationships") or []:
+            kind_definition.relationships[relationship["name"]] = RelationshipDefinition(
+                name=relationship["name"],
+                peer=relationship["peer"],
+                cardinality=relationship.get("cardinality", "many"),
+                optional=relationship.get("optional", True),
+            )
+
+    def _inherit(self) -> None:
+        for kind_definition in self.kinds.values():
+            for generic_name in kind_definition.inherit_from:
+                generic = self.kinds.get(generic_name)
+                if not generic:
+                    continue
+                for name, attribute in generic.attributes.items():
+                    kind_definition.attributes.setdefault(name, attribute)
+                for name, relationship in generic.relationships.items():
+                    kind_definition.relationships.setdefault(name, relationship)
+                if not kind_definition.human_friendly_id:
+                    kind_definition.human_friendly_id = list(generic.human_friendly_id)
+                kind_definition.default_filter = kind_definition.default_filter or generic.default_filter
+
+    def get(self, kind: str) -> KindDefinition:
+        if kind not in self.kinds:
+            raise KeyError(f"{kind} is not defined in models/")
+        return self.kinds[kind]
+
+    def validate(self, kind: str, data: Dict[str, Any]) -> List[str]:
+        """Return the list of errors found in the data of an object of the given kind."""
+        if kind not in self.kinds:
+            return [f"unknown kind {kind!r}"]
+        kind_definition = self.kinds[kind]
+        if kind_definition.is_generic:
+            return [f"{kind} is a generic and can't be instantiated"]
+
+        errors = []
+        for name, value in data.items():
+            if name in kind_definition.attributes:
+                errors.extend(self._validate_attribute(attribute=kind_definition.attributes[name], value=value))
+            elif name in kind_definition.relationships or name in CORE_RELATIONSHIPS:
+                cardinality = (
+                    kind_definition.relationships[name].cardinality
+                    if name in kind_definition.relationships
+                    else CORE_RELATIONSHIPS[name][1]
+                )
+                if cardinality == "many" and not isinstance(value, list):
+                    errors.append(f"{name} expects a list of references")
+                if cardinality == "one" and isinstance(value, list):
+                    errors.append(f"{name} expects a single reference")
+            elif not kind_definition.extends_core:
+                errors.append(f"unknown field {name!r}")
+
+        for name, attribute in kind_definition.attributes.items():
+            if attribute.mandatory and data.get(name) in (None, ""):
+                errors.append(f"missing mandatory attribute {name!r}")
+        for name, relationship in kind_definition.relationships.items():
+            if not relationship.optional and not data.get(name):
+                errors.append(f"missing mandatory relationship {name!r}")
+        return errors
+
+    @staticmethod
+    def _validate_attribute(attribute: AttributeDefinition, value: Any) -> List[str]:
+        if value is None:
+            return [] if attribute.optional else [f"{attribute.name} can't be empty"]
+        if attribute.kind == "Dropdown" and attribute.choices and value not in attribute.choices:
+            return [f"{attribute.name} must be one of {', '.join(attribute.choices)}, got {value!r}"]
+        if attribute.kind == "Number" and (isinstance(value, bool) or not isinstance(value, int)):
+            return [f"{attribute.name} must be a number, got {value!r}"]
+        if attribute.kind == "Boolean" and not isinstance(value, bool):
+            return [f"{attribute.name} must be a boolean, got {value!r}"]
+        if attribute.kind == "Text" and attribute.regex and not re.match(attribute.regex, str(value)):
+            return [f"{attribute.name} doesn't match {attribute.regex}"]
+        return []
@@ -0,0 +1,187 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from lbvip.ipam import PrefixIndex
+
+Location = Tuple[Optional[str], Optional[str]]
+
+LOCATION_PATH = ("ip_address", "node", "ip_prefix", "node", "location", "node")
+
+
+class EntityRecord(NamedTuple):
+    id: str
+    hostname: str
+    location_id: Optional[str]
+    location_name: Optional[str]
+    environment: Optional[str]
+
+
+class Issue(NamedTuple):
+    object_id: str
+    object_type: str
+    message: str
+
+
+def resolve_location(node: Dict[str, Any]) -> Location:
+    """(id, name) of the location of the prefix an object's IP address belongs to, (None, None) when unset."""
+    value: Any = node
+    for key in LOCATION_PATH:
+        value = value.get(key) if value else None
+    if not value:
+        return None, None
+    return value["id"], value["name"]["value"]
+
+
+def address_of(node: Dict[str, Any]) -> Optional[str]:
+    """IP address of an object, None when it has none."""
+    address = (node.get("ip_address") or {}).get("node") or {}
+    return address["address"]["value"] if address.get("address") else None
+
+
+def flatten(node: Dict[str, Any], location: Optional[Location] = None) -> EntityRecord:
+    """Record of an object, its location is read from the query data unless it's already resolved."""
+    location_id, location_name = location or resolve_location(node)
+    environment = node.get("environment")
+    return EntityRecord(
+        id=node["id"],
+        hostname=node["hostname"]["value"],
+        location_id=location_id,
+        location_name=location_name,
+        environment=environment["value"] if environment else None,
+    )
+
+
+class LocationEnvironmentIndex:
+    """Flattened view of the lb_and_vip_env query, every LB, VIP and frontend is stored once.
+
+    The nested GraphQL result is walked a single time into compact records and id based edges,
+    a VIP shared by several LBs or a frontend shared by several VIPs isn't duplicated. The
+    (location, environment) pairs of the frontends are grouped per VIP so that a VIP whose
+    frontends are all consistent with its LB is checked with one set comparison.
+
+    With a `prefix_index`, the location of an object is the location of the longest prefix containing
+    its IP address, the addresses of a batch of objects are resolved at once with `locate()`.
+    """
+
+    def __init__(self, prefix_index: Optional[PrefixIndex] = None) -> None:
+        self.prefix_index = prefix_index
+        self.totals: Counter = Counter()
+        self.location_names: Dict[str, str] = {}
+        self.release()
+
+    def release(self) -> None:
+        """Drop the records already validated, the per location totals are kept."""
+        self.load_balancers: Dict[str, EntityRecord] = {}
+        self.vips: Dict[str, EntityRecord] = {}
+        self.frontends: Dict[str, EntityRecord] = {}
+        self.lb_vips: Dict[str, List[str]] = {}
+        self.vip_frontends: Dict[str, List[str]] = {}
+        self._vip_frontend_keys: Dict[str, Set[Tuple[Optional[str], Optional[str]]]] = {}
+        self.locations: Dict[str, Location] = {}
+
+    def locate(self, nodes: Iterable[Dict[str, Any]]) -> None:
+        """Resolve the location of the IP addresses of some objects with one lookup in the prefix index."""
+        if not self.prefix_index:
+            return
+        addresses = [address for address in dict.fromkeys(map(address_of, nodes)) if address and address not in self.locations]
+        if not addresses:
+            return
+        for address, entry in zip(addresses, self.prefix_index.containing(addresses)):
+            self.locations[address] = (entry.location_id, entry.location) if entry else (None, None)
+
+    def flatten(self, node: Dict[str, Any]) -> EntityRecord:
+        if not self.prefix_index:
+            return flatten(node)
+        address = address_of(node)
+        if address and address not in self.locations:
+            self.locate([node])
+        return flatten(node, location=self.locations.get(address or "", (None, None)))
+
+    def add(self, data: Dict[str, Any]) -> None:
+        nodes = []
+        for lb_edge in data["ServerLoadBalancer"]["edges"]:
+            nodes.append(lb_edge["node"])
+            for vip_edge in lb_edge["node"]["virtual_ips"]["edges"]:
+                nodes.append(vip_edge["node"])
+                nodes.extend(frontend_edge["node"] for frontend_edge in vip_edge["node"]["frontend_servers"]["edges"])
+        self.locate(nodes)
+
+        for lb_edge in data["ServerLoadBalancer"]["edges"]:
+            lb_node = lb_edge["node"]
+            self.add_load_balancer(lb_node=lb_node)
+            for vip_edge in lb_node["virtual_ips"]["edges"]:
+                self.add_vip(vip_node=vip_edge["node"])
+
+    def add_load_balancer(self, lb_node: Dict[str, Any]) -> None:
+        """Record a load balancer and the ids of its VIPs, the VIPs can be added separately."""
+        self.load_balancers[lb_node["id"]] = self.flatten(lb_node)
+        self.lb_vips[lb_node["id"]] = [vip_edge["node"]["id"] for vip_edge in lb_node["virtual_ips"]["edges"]]
+
+    def add_vip(self, vip_node: Dict[str, Any]) -> None:
+        vip_id = vip_node["id"]
+        if vip_id in self.vips:
+            return
+        self.locate([vip_node, *(frontend_edge["node"] for frontend_edge in vip_node["frontend_servers"]["edges"])])
+        self.vips[vip_id] = self.flatten(vip_node)
+        frontend_ids = []
+        for frontend_edge in vip_node["frontend_servers"]["edges"]:
+            frontend_node = frontend_edge["node"]
+            if frontend_node["id"] not in self.frontends:
+                self.frontends[frontend_node["id"]] = self.flatten(frontend_node)
+            frontend_ids.append(frontend_node["id"])
+        self.vip_frontends[vip_id] = frontend_ids
+        self._vip_frontend_keys[vip_id] = {
+            (self.frontends[frontend_id].location_id, self.frontends[frontend_id].environment) for frontend_id in frontend_ids
+        }
+
+    def vip_ids(self) -> List[str]:
+        """Ids of the VIPs referenced by the load balancers but not added yet."""
+        return list(dict.fromkeys(vip_id for vip_ids in self.lb_vips.values() for vip_id in vip_ids if vip_id not in self.vips))
+
+    def object_issues(self) -> Iterator[Issue]:
+        """Yield the issues of the load balancers added so far and count them per location."""
+        for lb in self.load_balancers.values():
+            if lb.location_id:
+                self.location_names[lb.location_id] = lb.location_name  # type: ignore[assignment]
+            expected = {(lb.location_id, lb.environment)}
+            for vip_id in self.lb_vips.get(lb.id, []):
+                vip = self.vips.get(vip_id)
+                if not vip:
+                    continue
+                if vip.location_id != lb.location_id:
+                    self.totals[lb.location_id] += 1
+                    yield Issue(
+                        object_id=lb.id,
+                        object_type="load_balancer",
+                        message=f"VIP {vip.hostname} is in location {vip.location_name}, which does not match LB {lb.hostname} (Location: {lb.location_name})",
+                    )
+                    continue
+
+                if self._vip_frontend_keys[vip_id] <= expected:
+                    continue
+                for frontend_id in self.vip_frontends[vip_id]:
+                    frontend = self.frontends[frontend_id]
+                    if (frontend.location_id, frontend.environment) in expected:
+                        continue
+                    self.totals[lb.location_id] += 1
+                    yield Issue(
+                        object_id=lb.id,
+                        object_type="load_balancer",
+                        message=f"Frontend {frontend.hostname} for VIP {vip.hostname} is in location {frontend.location_name} or environment {frontend.environment}, which does not match LB {lb.hostname} (Location: {lb.location_name}, Environment: {lb.environment})",
+                    )
+
+    def location_issues(self) -> Iterator[Issue]:
+        """One issue per location with at least one mismatch."""
+        for location_id, total in self.totals.items():
+            # Load Balancers without a location can't be reported on a location
+            if not location_id:
+                continue
+            yield Issue(
+                object_id=location_id,
+                object_type="location",
+                message=f"{self.location_names[location_id]} has {total} VIPs or Frontends that do not match the Load Balancer location or environment.",
+            )
+
+    def issues(self) -> Iterator[Issue]:
+        yield from self.object_issues()
+        yield from self.location_issues()
@@ -0,0 +1,217 @@
+import asyncio
+import json
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.node import InfrahubNode, RelatedNode
+
+DEFAULT_INDEX_PATH = Path("artifacts") / ".dependencies.json"
+
+# Relationships tracked per kind
+RELATIONSHIPS: Dict[str, Tuple[str, ...]] = {
+    "ServerLoadBalancer": ("ip_address", "public_ip_address", "asn", "virtual_ips"),
+    "ServerFrontend": ("ip_address", "virtual_ips"),
+    "InfraVIP": ("ip_address", "frontend_servers", "load_balancers", "health_checks"),
+    "IpamIPAddress": ("ip_prefix",),
+    "IpamIPPrefix": ("gateway",),
+}
+
+# Attribute labelling the objects of each kind, the changes can be given by label
+LABELS: Dict[str, str] = {
+    "ServerLoadBalancer": "hostname",
+    "ServerFrontend": "hostname",
+    "InfraVIP": "hostname",
+    "IpamIPAddress": "address",
+    "IpamIPPrefix": "prefix",
+}
+
+# Both sides of the relationships sharing an identifier (vip__lb and vip__frontend)
+SYMMETRIC: Dict[Tuple[str, str], Tuple[str, str]] = {
+    ("ServerLoadBalancer", "virtual_ips"): ("InfraVIP", "load_balancers"),
+    ("InfraVIP", "load_balancers"): ("ServerLoadBalancer", "virtual_ips"),
+    ("ServerFrontend", "virtual_ips"): ("InfraVIP", "frontend_servers"),
+    ("InfraVIP", "frontend_servers"): ("ServerFrontend", "virtual_ips"),
+}
+
+# What the query of each artifact reaches from its target, mirrors lb_vip.gql and frontend_vip.gql
+Reach = Dict[str, Any]
+TARGET_REACH: Dict[str, Reach] = {
+    "ServerLoadBalancer": {
+        "ip_address": {},
+        "public_ip_address": {"ip_prefix": {"gateway": {}}},
+        "asn": {},
+        "virtual_ips": {"ip_address": {}, "health_checks": {}, "frontend_servers": {"ip_address": {}}},
+    },
+    "ServerFrontend": {"ip_address": {}, "virtual_ips": {"ip_address": {}}},
+}
+
+ARTIFACTS_BY_KIND: Dict[str, Tuple[str, ...]] = {
+    "ServerLoadBalancer": ("haproxy_config", "bird_config"),
+    "ServerFrontend": ("ngninx_config",),
+}
+
+
+class DependencyIndex:
+    """Reverse-dependency index from any object reached by an artifact query to the artifact targets.
+
+    The relationships of the LBs, VIPs and frontends are kept as a graph, the set of objects each
+    target depends on is derived from it by following TARGET_REACH and indexed in reverse, so
+    finding the artifacts affected by a change is a dictionary lookup. Updating the relationships
+    of one object only recomputes the targets that reached it before or after the update.
+    """
+
+    def __init__(self) -> None:
+        self.kinds: Dict[str, str] = {}
+        self.labels: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        self.edges: Dict[str, Dict[str, List[str]]] = defaultdict(dict)
+        self.dependencies: Dict[str, Set[str]] = {}
+        self.dependents: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.dependencies)
+
+    def register(self, node_id: str, kind: Optional[str] = None, label: Optional[str] = None) -> None:
+        if kind:
+            self.kinds[node_id] = kind
+        if label:
+            self.labels[node_id] = label
+            self.aliases[label] = node_id
+
+    def resolve(self, identifier: str) -> Optional[str]:
+        """Id of an object from its id, its hostname or its address."""
+        if identifier in self.kinds or identifier in self.dependents:
+            return identifier
+        return self.aliases.get(identifier)
+
+    def set_relationship(self, node_id: str, relationship: str, peer_ids: Iterable[str], symmetric: bool = True) -> Set[str]:
+        """Replace the peers of a relationship, returns the ids of the objects whose edges changed."""
+        peer_ids = list(dict.fromkeys(peer_ids))
+        previous = self.edges[node_id].get(relationship, [])
+        self.edges[node_id][relationship] = peer_ids
+        changed = {node_id}
+
+        other_side = SYMMETRIC.get((self.kinds.get(node_id, ""), relationship))
+        if symmetric and other_side:
+            _, peer_relationship = other_side
+            for peer_id in set(previous) - set(peer_ids):
+                self.edges[peer_id][peer_relationship] = [
+                    existing for existing in self.edges[peer_id].get(peer_relationship, []) if existing != node_id
+                ]
+                changed.add(peer_id)
+            for peer_id in set(peer_ids) - set(previous):
+                self.kinds.setdefault(peer_id, other_side[0])
+                self.edges[peer_id].setdefault(peer_relationship, []).append(node_id)
+                changed.add(peer_id)
+        return changed
+
+    def reach(self, node_id: str, reach: Reach) -> Set[str]:
+        reached = {node_id}
+        for relationship, nested in reach.items():
+            for peer_id in self.edges.get(node_id, {}).get(relationship, []):
+                reached |= self.reach(peer_id, nested) if nested else {peer_id}
+        return reached
+
+    def compute(self, target_id: str) -> None:
+        for dependency in self.dependencies.pop(target_id, set()):
+            self.dependents[dependency].discard(target_id)
+        kind = self.kinds.get(target_id)
+        if kind not in TARGET_REACH:
+            return
+        self.dependencies[target_id] = self.reach(target_id, TARGET_REACH[kind])
+        for dependency in self.dependencies[target_id]:
+            self.dependents[dependency].add(target_id)
+
+    def update(self, node_id: str, kind: str, relationships: Dict[str, List[str]], label: Optional[str] = None) -> Set[str]:
+        """Apply the current relationships of one object, returns the targets that were recomputed."""
+        self.register(node_id=node_id, kind=kind, label=label)
+        changed: Set[str] = set()
+        for relationship, peer_ids in relationships.items():
+            changed |= self.set_relationship(node_id=node_id, relationship=relationship, peer_ids=peer_ids)
+
+        targets = {target for node in changed for target in self.dependents.get(node, set())}
+        targets |= {node for node in changed if self.kinds.get(node) in TARGET_REACH}
+        # The new peers of an object can only be reached through targets already reaching it
+        for target in targets:
+            self.compute(target)
+        return targets
+
+    def affected_targets(self, identifiers: Iterable[str]) -> Set[str]:
+        targets: Set[str] = set()
+        for identifier in identifiers:
+            node_id = self.resolve(identifier)
+            if node_id:
+                targets |= self.dependents.get(node_id, set())
+        return targets
+
+    def affected(self, identifiers: Iterable[str]) -> Dict[str, List[str]]:
+        """Artifacts to render again, per artifact definition, when the given objects change."""
+        result: Dict[str, List[str]] = defaultdict(list)
+        for target in self.affected_targets(identifiers):
+            for artifact in ARTIFACTS_BY_KIND.get(self.kinds[target], ()):
+                result[artifact].append(self.labels.get(target, target))
+        return {artifact: sorted(targets) for artifact, targets in sorted(result.items())}
+
+    # Infrahub
+    def update_from_node(self, node: InfrahubNode) -> Set[str]:
+        kind = node.get_kind()
+        relationships = {}
+        for relationship in RELATIONSHIPS[kind]:
+            related = getattr(node, relationship)
+            peers: List[RelatedNode] = [related] if isinstance(related, RelatedNode) else list(related.peers)
+            relationships[relationship] = [peer.id for peer in peers if peer.id]
+            for peer in peers:
+                if peer.id:
+                    self.register(node_id=peer.id, kind=peer.typename, label=peer.display_label)
+        label = str(getattr(node, LABELS[kind]).value)
+        return self.update(node_id=node.id, kind=kind, relationships=relationships, label=label)
+
+    async def build(self, client: InfrahubClient, branch: Optional[str] = None) -> None:
+        """Load the relationships of every LB, VIP, frontend and IP address and prefix of a branch."""
+        results = await asyncio.gather(
+            *[
+                client.all(kind=kind, branch=branch, include=list(relationships), populate_store=False)
+                for kind, relationships in RELATIONSHIPS.items()
+            ]
+        )
+        for nodes in results:
+            for node in nodes:
+                self.update_from_node(node)
+
+    async def refresh(self, client: InfrahubClient, kind: str, ids: List[str], branch: Optional[str] = None) -> Set[str]:
+        """Fetch some objects again and update the index incrementally, returns the recomputed targets."""
+        nodes = await client.filters(
+            kind=kind, ids=ids, branch=branch, include=list(RELATIONSHIPS[kind]), populate_store=False
+        )
+        targets: Set[str] = set()
+        for node in nodes:
+            targets |= self.update_from_node(node)
+        return targets
+
+    # Persistence
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kinds": self.kinds, "labels": self.labels, "edges": self.edges}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DependencyIndex":
+        index = cls()
+        index.kinds = dict(data["kinds"])
+        index.labels = dict(data["labels"])
+        index.aliases = {label: node_id for node_id, label in index.labels.items()}
+        for node_id, relationships in data["edges"].items():
+            index.edges[node_id] = {relationship: list(peers) for relationship, peers in relationships.items()}
+        for node_id, kind in index.kinds.items():
+            if kind in TARGET_REACH:
+                index.compute(node_id)
+        return index
+
+    def save(self, path: Path = DEFAULT_INDEX_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), sort_keys=True))
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_INDEX_PATH) -> "DependencyIndex":
+        return cls.from_dict(json.loads(path.read_text()))
@@ -0,0 +1,387 @@
+import hashlib
+import logging
+import math
+import re
+import shlex
+import time
+
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from infrahub_sdk import InfrahubClient
+from nornir.core import Nornir
+from nornir.core.inventory import Defaults, Group, Groups, Host, Hosts, Inventory, ParentGroups
+from nornir.core.task import AggregatedResult, Result, Task
+from nornir.plugins.runners import ThreadedRunner
+
+from lbvip.artifacts import ARTIFACT_DEFINITIONS, DEFAULT_OUTPUT_DIRECTORY
+from lbvip.consistency import resolve_location
+
+DEFAULT_WORKERS = 10
+DEFAULT_MAX_UNAVAILABLE = 0.5
+UNKNOWN_LOCATION = "unknown"
+
+HOSTS_QUERY = """
+query DeploymentHosts($ids: [ID]) {
+  KIND(ids: $ids) {
+    edges {
+      node {
+        id
+        hostname { value }
+        ip_address {
+          node {
+            ... on IpamIPAddress {
+              address { value }
+              ip_prefix {
+                node {
+                  ... on IpamIPPrefix {
+                    location {
+                      node {
+                        name { value }
+                        id
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+class DeploymentError(Exception):
+    pass
+
+
+class Service(NamedTuple):
+    """Where an artifact is installed on a host, how it's validated and how the service picks it up."""
+
+    name: str
+    path: str
+    validate: str
+    reload: str
+
+
+SERVICES = {
+    "haproxy_config": Service(
+        name="haproxy", path="/etc/haproxy/haproxy.cfg", validate="haproxy -c -f {path}", reload="systemctl reload haproxy"
+    ),
+    "bird_config": Service(name="bird", path="/etc/bird/bird.conf", validate="bird -p -c {path}", reload="birdc configure"),
+    "ngninx_config": Service(
+        name="nginx", path="/etc/nginx/nginx.conf", validate="nginx -t -q -c {path}", reload="systemctl reload nginx"
+    ),
+}
+
+
+def checksum(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def slugify(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", value.lower()).strip("_")
+
+
+def balanced(content: str) -> bool:
+    depth = 0
+    for character in content:
+        depth += {"{": 1, "}": -1}.get(character, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+class LocalTarget:
+    """Stand-in for the hosts, each one is a directory under `root` and the commands are appended to its commands.log.
+
+    Nothing is executed, a configuration passes the validation when it's non-empty with balanced braces.
+    `reject` lists the services whose validation fails, to rehearse a failed rollout.
+    """
+
+    def __init__(self, root: Path, reject: Sequence[str] = ()) -> None:
+        self.root = root
+        self.reject = set(reject)
+
+    def local_path(self, host: Host, path: str) -> Path:
+        return self.root / host.name / PurePosixPath(path).relative_to("/")
+
+    def record(self, host: Host, command: str) -> None:
+        log_path = self.root / host.name / "commands.log"
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with log_path.open("a") as handle:
+            handle.write(command + "\n")
+
+    def checksum(self, host: Host, path: str) -> Optional[str]:
+        local_path = self.local_path(host, path)
+        return checksum(local_path.read_text()) if local_path.exists() else None
+
+    def upload(self, host: Host, path: str, content: str) -> None:
+        local_path = self.local_path(host, path)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path.write_text(content)
+
+    def validate(self, host: Host, service: Service, path: str) -> Tuple[bool, str]:
+        self.record(host, service.validate.format(path=path))
+        if service.name in self.reject:
+            return False, f"{service.name} rejected by the target"
+        content = self.local_path(host, path).read_text()
+        return bool(content.strip()) and balanced(content), ""
+
+    def activate(self, host: Host, staged: str, path: str) -> None:
+        self.record(host, f"mv {staged} {path}")
+        self.local_path(host, staged).replace(self.local_path(host, path))
+
+    def discard(self, host: Host, path: str) -> None:
+        self.record(host, f"rm -f {path}")
+        self.local_path(host, path).unlink(missing_ok=True)
+
+    def reload(self, host: Host, service: Service) -> None:
+        self.record(host, service.reload)
+
+
+class SSHTarget:
+    """Deploys over SSH with paramiko, the configuration is uploaded with SFTP and the commands run with sudo."""
+
+    def __init__(self, username: Optional[str] = None, port: int = 22, key_filename: Optional[str] = None, sudo: bool = True) -> None:
+        self.username = username
+        self.port = port
+        self.key_filename = key_filename
+        self.sudo = sudo
+
+    def connection(self, host: Host) -> Any:
+        if "ssh" not in host.data:
+            import paramiko
+
+            client = paramiko.SSHClient()
+            client.load_system_host_keys()
+            client.connect(hostname=host.hostname, port=self.port, username=self.username, key_filename=self.key_filename)
+            host.data["ssh"] = client
+        return host.data["ssh"]
+
+    def execute(self, host: Host, command: str) -> Tuple[int, str]:
+        _, stdout, stderr = self.connection(host).exec_command(f"sudo -n {command}" if self.sudo else command)
+        status = stdout.channel.recv_exit_status()
+        return status, stdout.read().decode() + stderr.read().decode()
+
+    def checksum(self, host: Host, path: str) -> Optional[str]:
+        status, output = self.execute(host, f"sha256sum {shlex.quote(path)}")
+        return output.split()[0] if status == 0 and output else None
+
+    def upload(self, host: Host, path: str, content: str) -> None:
+        # Written to the home directory first, the destination belongs to root
+        upload_path = f".{PurePosixPath(path).name}.{checksum(content)[:12]}"
+        with self.connection(host).open_sftp() as sftp:
+            with sftp.open(upload_path, "w") as handle:
+                handle.write(content)
+        status, output = self.execute(host, f"install -m 644 {upload_path} {shlex.quote(path)}")
+        self.connection(host).exec_command(f"rm -f {upload_path}")
+        if status:
+            raise DeploymentError(f"Unable to upload {path} to {host.name}: {output}")
+
+    def validate(self, host: Host, service: Service, path: str) -> Tuple[bool, str]:
+        status, output = self.execute(host, service.validate.format(path=shlex.quote(path)))
+        return status == 0, output
+
+    def activate(self, host: Host, staged: str, path: str) -> None:
+        status, output = self.execute(host, f"mv {shlex.quote(staged)} {shlex.quote(path)}")
+        if status:
+            raise DeploymentError(f"Unable to install {path} on {host.name}: {output}")
+
+    def discard(self, host: Host, path: str) -> None:
+        self.execute(host, f"rm -f {shlex.quote(path)}")
+
+    def reload(self, host: Host, service: Service) -> None:
+        status, output = self.execute(host, service.reload)
+        if status:
+            raise DeploymentError(f"Unable to reload {service.name} on {host.name}: {output}")
+
+    def close(self, hosts: Sequence[Host]) -> None:
+        for host in hosts:
+            client = host.data.pop("ssh", None)
+            if client:
+                client.close()
+
+
+def deploy_host(task: Task, target: Any, artifacts: Path) -> Result:
+    """Install the artifacts of a host that differ from what it runs, each one validated before the service reloads."""
+    changed = []
+    for definition in task.host.data["artifacts"]:
+        service = SERVICES[definition]
+        source = artifacts / task.host.name / f"{definition}.conf"
+        if not source.exists():
+            continue
+        content = source.read_text()
+        if target.checksum(task.host, service.path) == checksum(content):
+            continue
+
+        staged = f"{service.path}.new"
+        target.upload(task.host, staged, content)
+        valid, output = target.validate(task.host, service, staged)
+        if not valid:
+            target.discard(task.host, staged)
+            raise DeploymentError(f"The {service.name} configuration of {task.host.name} is invalid: {output}".strip())
+        target.activate(task.host, staged, service.path)
+        target.reload(task.host, service)
+        changed.append(service.name)
+    return Result(host=task.host, result=changed, changed=bool(changed))
+
+
+def rolling_batches(hosts: Sequence[Host], max_unavailable: float = DEFAULT_MAX_UNAVAILABLE) -> List[List[str]]:
+    """Split the hosts in batches deployed one after the other, per location and group.
+
+    A batch holds at most `max_unavailable` of the hosts of each (location, group), rounded up but
+    always leaving one host of the pair out when there are several, so a location keeps serving
+    through the rollout. A location with a single load balancer can only be updated in place.
+    """
+    pools: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    for host in sorted(hosts, key=lambda host: host.name):
+        for group in host.data["deploy_groups"]:
+            pools[(host.data["location"], group)].append(host.name)
+
+    batches: List[List[str]] = []
+    for members in pools.values():
+        size = max(1, math.ceil(len(members) * max_unavailable))
+        if len(members) > 1:
+            size = min(size, len(members) - 1)
+        for index in range(0, len(members), size):
+            position = index // size
+            if position == len(batches):
+                batches.append([])
+            batches[position].extend(name for name in members[index : index + size] if name not in batches[position])
+    return batches
+
+
+@dataclass
+class DeploymentReport:
+    deployed: Dict[str, List[str]]
+    unchanged: List[str]
+    failed: Dict[str, str]
+    skipped: List[str]
+    batches: int
+    seconds: float
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "deployed": self.deployed,
+            "unchanged": sorted(self.unchanged),
+            "failed": self.failed,
+            "skipped": sorted(self.skipped),
+            "batches": self.batches,
+            "seconds": self.seconds,
+        }
+
+
+class RollingDeployment:
+    """Pushes the rendered artifacts to the members of the `load_balancers` and `web_servers` groups with Nornir.
+
+    The Nornir inventory is built from the groups, like the nornir-infrahub inventory plugin but keyed by
+    hostname, each host belonging to its Infrahub groups and to a `location__<name>` group derived from the
+    prefix of its IP address. The hosts are deployed in rolling batches (see `rolling_batches`), the hosts
+    of a batch in parallel with at most `workers` threads, and the rollout stops after a batch with a failure.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        log: logging.Logger,
+        target: Any,
+        artifacts: Path = DEFAULT_OUTPUT_DIRECTORY,
+        branch: Optional[str] = None,
+        workers: int = DEFAULT_WORKERS,
+        max_unavailable: float = DEFAULT_MAX_UNAVAILABLE,
+    ) -> None:
+        self.client = client
+        self.log = log
+        self.target = target
+        self.artifacts = artifacts
+        self.branch = branch
+        self.workers = workers
+        self.max_unavailable = max_unavailable
+        self.definitions: Dict[str, List[str]] = defaultdict(list)
+        for definition in ARTIFACT_DEFINITIONS:
+            self.definitions[definition.targets].append(definition.name)
+
+    async def group_hosts(self, group_name: str) -> List[Dict[str, Any]]:
+        group = await self.client.get(kind="CoreStandardGroup", name__value=group_name, branch=self.branch, include=["members"])
+        ids_by_kind: Dict[str, List[str]] = defaultdict(list)
+        for member in group.members.peers:
+            ids_by_kind[member.typename].append(member.id)
+
+        nodes = []
+        for kind, ids in ids_by_kind.items():
+            response = await self.client.execute_graphql(
+                query=HOSTS_QUERY.replace("KIND", kind), variables={"ids": ids}, branch_name=self.branch
+            )
+            nodes.extend(edge["node"] for edge in response[kind]["edges"])
+        return nodes
+
+    async def inventory(self) -> Inventory:
+        hosts, groups, defaults = Hosts(), Groups(), Defaults()
+        for group_name, definitions in self.definitions.items():
+            groups[group_name] = Group(name=group_name, defaults=defaults)
+            for node in await self.group_hosts(group_name):
+                name = node["hostname"]["value"]
+                _, location = resolve_location(node)
+                location = location or UNKNOWN_LOCATION
+                location_group = f"location__{slugify(location)}"
+                if location_group not in groups:
+                    groups[location_group] = Group(name=location_group, defaults=defaults)
+
+                if name not in hosts:
+                    address = (node.get("ip_address") or {}).get("node") or {}
+                    hosts[name] = Host(
+                        name=name,
+                        hostname=address["address"]["value"].split("/")[0] if address.get("address") else name,
+                        groups=ParentGroups([groups[location_group]]),
+                        data={"id": node["id"], "location": location, "artifacts": [], "deploy_groups": []},
+                        defaults=defaults,
+                    )
+                hosts[name].groups.add(groups[group_name])
+                hosts[name].data["deploy_groups"].append(group_name)
+                hosts[name].data["artifacts"].extend(definitions)
+        return Inventory(hosts=hosts, groups=groups, defaults=defaults)
+
+    async def run(self) -> DeploymentReport:
+        start = time.perf_counter()
+        nornir = Nornir(inventory=await self.inventory(), runner=ThreadedRunner(num_workers=self.workers))
+        batches = rolling_batches(list(nornir.inventory.hosts.values()), max_unavailable=self.max_unavailable)
+        self.log.info(f"Deploying {len(nornir.inventory.hosts)} hosts in {len(batches)} batches")
+
+        report = DeploymentReport(deployed={}, unchanged=[], failed={}, skipped=[], batches=0, seconds=0.0)
+        try:
+            for number, batch in enumerate(batches, start=1):
+                if report.failed:
+                    report.skipped.extend(batch)
+                    continue
+                selected = set(batch)
+                results: AggregatedResult = nornir.filter(filter_func=lambda host: host.name in selected).run(
+                    task=deploy_host, target=self.target, artifacts=self.artifacts
+                )
+                report.batches += 1
+                for name, multi_result in results.items():
+                    if multi_result.failed:
+                        report.failed[name] = str(multi_result[0].exception)
+                    elif multi_result[0].changed:
+                        report.deployed[name] = multi_result[0].result
+                    else:
+                        report.unchanged.append(name)
+                self.log.info(
+                    f"- batch {number}: {len(batch)} hosts, {len([name for name in batch if name in report.deployed])} "
+                    f"deployed, {len([name for name in batch if name in report.failed])} failed"
+                )
+        finally:
+            if hasattr(self.target, "close"):
+                self.target.close(list(nornir.inventory.hosts.values()))
+
+        for name, error in report.failed.items():
+            self.log.error(f"{name}: {error}")
+        if report.skipped:
+            self.log.warning(f"Stopped the rollout, {len(report.skipped)} hosts weren't deployed")
+        report.seconds = time.perf_counter() - start
+        return report
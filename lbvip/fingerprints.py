@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from lbvip import aggregation, models, rendering
+from lbvip.incremental import fingerprint
+
+MANIFEST_NAME = ".fingerprints.json"
+
+
+@lru_cache(maxsize=None)
+def template_hash(name: str, directory: Path = rendering.TEMPLATES_DIRECTORY) -> str:
+    """Hash of a template and of the code turning the query result into the models and routes it renders."""
+    digest = hashlib.sha256()
+    digest.update((directory / name).read_bytes())
+    for module in (aggregation, models, rendering):
+        digest.update(Path(module.__file__).read_bytes())  # type: ignore[arg-type]
+    return digest.hexdigest()
+
+
+def artifact_fingerprint(definition: str, template: str, data: Dict[str, Any]) -> str:
+    """Content-addressed fingerprint of an artifact, it only changes with the data the template consumes."""
+    return fingerprint({"definition": definition, "template": template_hash(template), "data": data})
+
+
+class FingerprintStore:
+    """Fingerprints of the artifacts already rendered, stored next to them in the output directory."""
+
+    def __init__(self, directory: Path) -> None:
+        self.path = directory / MANIFEST_NAME
+        self.fingerprints: Dict[str, str] = {}
+        if self.path.exists():
+            self.fingerprints = json.loads(self.path.read_text())
+
+    @staticmethod
+    def key(definition: str, target: str) -> str:
+        return f"{definition}/{target}"
+
+    def get(self, definition: str, target: str) -> Optional[str]:
+        return self.fingerprints.get(self.key(definition=definition, target=target))
+
+    def matches(self, definition: str, target: str, value: str) -> bool:
+        return self.get(definition=definition, target=target) == value
+
+    def set(self, definition: str, target: str, value: str) -> None:
+        self.fingerprints[self.key(definition=definition, target=target)] = value
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.fingerprints, indent=2, sort_keys=True))
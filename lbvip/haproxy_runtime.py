@@ -0,0 +1,375 @@
+import asyncio
+import json
+import logging
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from infrahub_sdk import InfrahubClient
+
+from lbvip.models import VIP, LoadBalancer, load_balancers
+from lbvip.rendering import render_haproxy
+
+ADMIN_SOCKET = "/run/haproxy/admin.sock"
+SERVER_PORT = 80
+DEFAULT_STATE_DIRECTORY = Path(".haproxy-runtime")
+
+# Runtime state of the frontends by status, the frontends in maintenance are drained and kept in their backend
+RUNTIME_STATES = {"active": "ready", "maintenance": "drain"}
+
+# Replies of the runtime API to a command it couldn't apply, the successful ones are empty or informational
+ERROR_REPLIES = (
+    "No such",
+    "Unknown command",
+    "Permission denied",
+    "Require",
+    "Invalid",
+    "Can't",
+    "Unable",
+    "Missing",
+    "Only servers in maintenance mode",
+    "Already exists",
+    "Server still has connections",
+)
+
+# The only replies acknowledging the commands adding and removing a server, any other one is a refusal
+SUCCESS_REPLIES = {"add server": "New server registered.", "del server": "Server deleted."}
+
+
+class RuntimeChange(NamedTuple):
+    """A change of a server of a backend and the runtime API commands applying it.
+
+    `fallback` is sent when one of the commands fails, a drained server is gone after a reload
+    and has to be added again instead of being set ready.
+    """
+
+    action: str
+    backend: str
+    server: str
+    commands: Tuple[str, ...]
+    fallback: Tuple[str, ...] = ()
+
+
+@dataclass
+class RuntimePlan:
+    hostname: str
+    reload: bool = False
+    reasons: List[str] = field(default_factory=list)
+    changes: List[RuntimeChange] = field(default_factory=list)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "hostname": self.hostname,
+            "reload": self.reload,
+            "reasons": self.reasons,
+            "changes": [
+                {"action": change.action, "backend": change.backend, "server": change.server, "commands": list(change.commands)}
+                for change in self.changes
+            ],
+        }
+
+
+def backend_name(vip: VIP) -> str:
+    return f"vip_{vip.hostname}_backend"
+
+
+# Settings of the VIPs rendered in their frontend and backend sections
+VIP_SETTINGS = (
+    "ip",
+    "ssl_certificate",
+    "mode",
+    "balance",
+    "maxconn",
+    "rate_limit",
+    "timeout_client",
+    "timeout_server",
+    "timeout_connect",
+    "http_connection_mode",
+    "http_reuse",
+)
+
+
+def structure(lb: LoadBalancer) -> Dict[str, Any]:
+    """What the runtime API can't change: the global settings and the frontends and backends of the active VIPs."""
+    sections: Dict[str, Any] = {"global": {"maxconn": lb.maxconn, "nbthread": lb.nbthread, "cpu_map": lb.cpu_map}}
+    for vip in lb.vips:
+        if vip.active:
+            sections[backend_name(vip)] = {name: getattr(vip, name) for name in VIP_SETTINGS}
+            sections[backend_name(vip)]["health_checks"] = [tuple(check.__dict__.values()) for check in vip.health_checks]
+    return sections
+
+
+def runtime_servers(vip: VIP) -> Dict[str, Tuple[Optional[str], str]]:
+    """(address, runtime state) of the servers a backend holds, the frontends in another status are removed."""
+    return {
+        member.hostname: (member.ip, RUNTIME_STATES[member.status])  # type: ignore[index]
+        for member in vip.members
+        if member.status in RUNTIME_STATES
+    }
+
+
+def add_server_commands(backend: str, server: str, address: Optional[str], state: str) -> Tuple[str, ...]:
+    return (
+        f"add server {backend}/{server} {address}:{SERVER_PORT} check",
+        f"enable health {backend}/{server}",
+        f"set server {backend}/{server} state {state}",
+    )
+
+
+def plan_update(previous: Optional[LoadBalancer], current: LoadBalancer) -> RuntimePlan:
+    """Changes between two lb_vip results of a load balancer, a reload is planned when its structure changed."""
+    plan = RuntimePlan(hostname=current.hostname)
+    if previous is None:
+        plan.reload = True
+        plan.reasons.append("no previous state")
+        return plan
+
+    before, after = structure(previous), structure(current)
+    for backend in sorted(set(before) | set(after)):
+        if backend not in after:
+            plan.reasons.append(f"{backend} removed")
+        elif backend not in before:
+            plan.reasons.append(f"{backend} added")
+        elif before[backend] != after[backend]:
+            changed = sorted(key for key in after[backend] if before[backend][key] != after[backend][key])
+            plan.reasons.append(f"{backend} changed ({', '.join(changed)})")
+    if plan.reasons:
+        plan.reload = True
+        return plan
+
+    previous_vips = {backend_name(vip): vip for vip in previous.vips if vip.active}
+    for vip in current.vips:
+        if not vip.active:
+            continue
+        backend = backend_name(vip)
+        old, new = runtime_servers(previous_vips[backend]), runtime_servers(vip)
+        for server in sorted(set(old) | set(new)):
+            target = f"{backend}/{server}"
+            if server not in new:
+                commands = (f"set server {target} state maint", f"shutdown sessions server {target}", f"del server {target}")
+                plan.changes.append(RuntimeChange(action="removed", backend=backend, server=server, commands=commands))
+                continue
+            address, state = new[server]
+            if server not in old:
+                commands = add_server_commands(backend=backend, server=server, address=address, state=state)
+                plan.changes.append(RuntimeChange(action="added", backend=backend, server=server, commands=commands))
+                continue
+            old_address, old_state = old[server]
+            if old_address != address:
+                plan.changes.append(
+                    RuntimeChange(
+                        action="address",
+                        backend=backend,
+                        server=server,
+                        commands=(f"set server {target} addr {address} port {SERVER_PORT}",),
+                    )
+                )
+            if old_state != state:
+                plan.changes.append(
+                    RuntimeChange(
+                        action="drained" if state == "drain" else "status",
+                        backend=backend,
+                        server=server,
+                        commands=(f"set server {target} state {state}",),
+                        fallback=add_server_commands(backend=backend, server=server, address=address, state=state),
+                    )
+                )
+    return plan
+
+
+def failed(command: str, reply: str) -> bool:
+    for prefix, success in SUCCESS_REPLIES.items():
+        if command.startswith(prefix):
+            return reply.strip() != success
+    return reply.strip().startswith(ERROR_REPLIES)
+
+
+class RuntimeSocket:
+    """Client of the HAProxy runtime API, one connection per command like `socat stdio <socket>`.
+
+    `address` is the path of a unix socket or host:port for a `stats socket ipv4@...`.
+    """
+
+    def __init__(self, address: str = ADMIN_SOCKET, timeout: float = 5.0) -> None:
+        self.address = address
+        self.timeout = timeout
+
+    async def send(self, command: str) -> str:
+        if "/" in self.address:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.address), self.timeout)
+        else:
+            host, _, port = self.address.rpartition(":")
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), self.timeout)
+        try:
+            writer.write(command.encode() + b"\n")
+            await writer.drain()
+            return (await asyncio.wait_for(reader.read(), self.timeout)).decode()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+
+async def apply_plan(socket: RuntimeSocket, plan: RuntimePlan, log: logging.Logger) -> bool:
+    """Send the commands of the changes, returns False when one couldn't be applied and a reload is needed."""
+    for change in plan.changes:
+        for commands in (change.commands, change.fallback):
+            if not commands:
+                continue
+            replies = []
+            refused = False
+            for command in commands:
+                reply = await socket.send(command)
+                replies.append(reply)
+                refused = failed(command, reply)
+                if refused:
+                    break
+            # A frontend in maintenance isn't rendered, after a reload there is nothing left to remove
+            gone = change.action == "removed" and replies[:1] == replies[-1:] and replies[0].startswith("No such server")
+            if replies and (gone or not refused):
+                log.info(f"- {change.action} {change.backend}/{change.server}")
+                break
+        else:
+            log.warning(f"Unable to apply the {change.action} of {change.backend}/{change.server}: {replies[-1].strip()}")
+            return False
+    return True
+
+
+class RuntimeSync:
+    """Applies the changes of the `lb_vip` data of a load balancer through the HAProxy runtime API.
+
+    The data of the last synchronization is kept in `state_directory`. Frontends added, removed,
+    drained or put back in service, and their address changes, are applied with runtime commands
+    without dropping the established connections. A VIP added, removed or changed, or a command the
+    runtime API refuses, writes the configuration and calls `reload` instead.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        log: logging.Logger,
+        socket: RuntimeSocket,
+        reload: Callable[[], None],
+        config: Optional[Path] = None,
+        branch: Optional[str] = None,
+        state_directory: Path = DEFAULT_STATE_DIRECTORY,
+    ) -> None:
+        self.client = client
+        self.log = log
+        self.socket = socket
+        self.reload = reload
+        self.config = config
+        self.branch = branch
+        self.state_directory = state_directory
+
+    def state_path(self, hostname: str) -> Path:
+        return self.state_directory / f"{hostname}.json"
+
+    def previous(self, hostname: str) -> Optional[Dict[str, Any]]:
+        path = self.state_path(hostname)
+        return json.loads(path.read_text()) if path.exists() else None
+
+    async def sync(self, hostname: str, force_reload: bool = False) -> RuntimePlan:
+        response = await self.client.query_gql_query(name="lb_vip", variables={"hostname": hostname}, branch_name=self.branch)
+        data = response.get("data") or response
+        previous_data = self.previous(hostname)
+        previous = load_balancers(previous_data)[0] if previous_data else None
+        current = load_balancers(data)[0]
+
+        plan = plan_update(previous=None if force_reload else previous, current=current)
+        if not plan.reload and plan.changes and not await apply_plan(socket=self.socket, plan=plan, log=self.log):
+            plan.reload = True
+            plan.reasons.append("runtime API refused a change")
+
+        if self.config and (plan.reload or plan.changes):
+            # The configuration on disk follows the runtime state, for the next restart
+            self.config.write_text(render_haproxy(data))
+        if plan.reload:
+            self.log.info(f"Reloading HAProxy on {hostname}: {', '.join(plan.reasons)}")
+            self.reload()
+        elif plan.changes:
+            self.log.info(f"Applied {len(plan.changes)} changes to {hostname} without reloading")
+        else:
+            self.log.info(f"{hostname} is up to date")
+
+        self.state_directory.mkdir(parents=True, exist_ok=True)
+        self.state_path(hostname).write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+        return plan
+
+
+class FakeRuntimeServer:
+    """Unix socket answering the runtime API commands of RuntimeSync like HAProxy does, to rehearse a synchronization.
+
+    The servers of each backend are kept as {name: {"address", "state"}}, seeded from a load balancer
+    as its rendered configuration would start them. Every command received is kept in `commands`.
+    The `backend/server` targets of `attached` keep connections their sessions shutdown didn't close,
+    they can't be deleted.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.backends: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.commands: List[str] = []
+        self.attached: Set[str] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def load(self, lb: LoadBalancer) -> None:
+        """Servers of the configuration of a load balancer just after a reload, the active frontends of the active VIPs."""
+        self.backends = {
+            backend_name(vip): {
+                member.hostname: {"address": member.ip, "state": "ready"} for member in vip.members if member.active
+            }
+            for vip in lb.vips
+            if vip.active
+        }
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        Path(self.path).unlink(missing_ok=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        command = (await reader.readline()).decode().strip()
+        self.commands.append(command)
+        writer.write(self.execute(command).encode())
+        await writer.drain()
+        writer.close()
+
+    def _server_of(self, target: str) -> Tuple[Optional[Dict[str, Dict[str, Any]]], str]:
+        backend, _, server = target.partition("/")
+        return self.backends.get(backend), server
+
+    def execute(self, command: str) -> str:
+        words = command.split()
+        if words[:2] == ["add", "server"]:
+            servers, server = self._server_of(words[2])
+            if servers is None:
+                return "No such backend.\n"
+            if server in servers:
+                return "Already exists a server with the same name in backend.\n"
+            servers[server] = {"address": words[3].rsplit(":", 1)[0], "state": "maint"}
+            return "New server registered.\n"
+        if words[:2] == ["del", "server"]:
+            servers, server = self._server_of(words[2])
+            if not servers or server not in servers:
+                return "No such server.\n"
+            if servers[server]["state"] != "maint":
+                return "Only servers in maintenance mode can be deleted.\n"
+            if words[2] in self.attached:
+                return "Server still has connections attached to it, cannot remove it.\n"
+            del servers[server]
+            return "Server deleted.\n"
+        if words[:2] == ["set", "server"] or words[:2] == ["enable", "health"] or words[:3] == ["shutdown", "sessions", "server"]:
+            servers, server = self._server_of(words[3] if words[0] == "shutdown" else words[2])
+            if not servers or server not in servers:
+                return "No such server.\n"
+            if words[0] == "set" and words[3] == "state":
+                servers[server]["state"] = words[4]
+            elif words[0] == "set" and words[3] == "addr":
+                servers[server]["address"] = words[4]
+            return "\n"
+        return "Unknown command. Please enter one of the following commands only :\n"
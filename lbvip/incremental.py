@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.node import InfrahubNode
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+
+
+def fingerprint(values: Dict[str, Any]) -> str:
+    """Stable hash of a normalized object, the order of the keys and of the many relationships doesn't matter."""
+    canonical = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def normalize_peer(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return value.get("id")
+    if isinstance(value, str):
+        return value
+    return getattr(value, "id", None)
+
+
+class IncrementalSync:
+    """Diff the desired state of the loader against the nodes already present in Infrahub.
+
+    The existing nodes of each kind are prefetched with paginated bulk queries, then each desired
+    object is normalized and hashed so that only the new or changed objects are sent to Infrahub.
+    """
+
+    def __init__(self, client: InfrahubClient, branch: str, log: logging.Logger) -> None:
+        self.client = client
+        self.branch = branch
+        self.log = log
+        self.existing: Dict[str, Dict[str, InfrahubNode]] = defaultdict(dict)
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {CREATED: 0, UPDATED: 0, UNCHANGED: 0})
+
+    async def prefetch(self, kind: str, key_attribute: str, include: Optional[List[str]] = None) -> int:
+        nodes = await self.client.all(kind=kind, branch=self.branch, include=include, populate_store=False)
+        for node in nodes:
+            self.existing[kind][str(getattr(node, key_attribute).value)] = node
+        self.log.debug(f"- Prefetched {len(nodes)} existing {kind}")
+        return len(nodes)
+
+    async def prefetch_all(self, kinds: Sequence[Tuple[str, str, Optional[List[str]]]]) -> None:
+        """Prefetch several kinds concurrently, each kind is described by (kind, key_attribute, include)."""
+        await asyncio.gather(
+            *[self.prefetch(kind=kind, key_attribute=key_attribute, include=include) for kind, key_attribute, include in kinds]
+        )
+
+    def get(self, kind: str, key: Any) -> Optional[InfrahubNode]:
+        return self.existing.get(kind, {}).get(str(key))
+
+    @staticmethod
+    def normalize_data(node: InfrahubNode, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize the data used to create a node, {"value": ...} and {"id": ...} wrappers are removed."""
+        normalized: Dict[str, Any] = {}
+        for name, value in data.items():
+            if name in node._schema.attribute_names:
+                normalized[name] = value.get("value") if isinstance(value, dict) else value
+            elif name in node._schema.relationship_names:
+                if node._schema.get_relationship(name).cardinality == "many":
+                    normalized[name] = sorted(filter(None, [normalize_peer(peer) for peer in value or []]))
+                else:
+                    normalized[name] = normalize_peer(value)
+        return normalized
+
+    @staticmethod
+    def normalize_node(node: InfrahubNode, fields: Sequence[str]) -> Dict[str, Any]:
+        """Normalize the current values of an existing node, limited to the fields managed by the loader."""
+        normalized: Dict[str, Any] = {}
+        for name in fields:
+            if name in node._schema.attribute_names:
+                normalized[name] = getattr(node, name).value
+            elif name in node._schema.relationship_names:
+                if node._schema.get_relationship(name).cardinality == "many":
+                    normalized[name] = sorted(getattr(node, name).peer_ids)
+                else:
+                    normalized[name] = getattr(node, name).id
+        return normalized
+
+    def diff(self, kind: str, key: Any, data: Dict[str, Any]) -> Tuple[str, Optional[InfrahubNode]]:
+        """Return the status of a desired object and the existing node when there is one."""
+        existing = self.get(kind=kind, key=key)
+        if not existing:
+            return CREATED, None
+
+        desired = self.normalize_data(node=existing, data=data)
+        current = self.normalize_node(node=existing, fields=list(desired.keys()))
+        if fingerprint(desired) == fingerprint(current):
+            return UNCHANGED, existing
+        return UPDATED, existing
+
+    def record(self, kind: str, status: str) -> None:
+        self.stats[kind][status] += 1
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        return {kind: dict(stats) for kind, stats in sorted(self.stats.items())}
+
+    def log_summary(self) -> None:
+        totals = {CREATED: 0, UPDATED: 0, UNCHANGED: 0}
+        for kind, stats in self.summary().items():
+            self.log.info(
+                f"- {kind}: {stats[CREATED]} created, {stats[UPDATED]} updated, {stats[UNCHANGED]} unchanged"
+            )
+            for status, count in stats.items():
+                totals[status] += count
+        self.log.info(
+            f"Incremental load: {totals[CREATED]} created, {totals[UPDATED]} updated, {totals[UNCHANGED]} unchanged"
+        )
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.node import RelatedNode
+
+from lbvip.queries import repository_commit
+
+DEFAULT_TTL = 3600
+SQLITE = "sqlite"
+FILE = "file"
+
+
+@dataclass
+class InventorySnapshot:
+    """Hosts with their variables and the members of each group, computed once from Infrahub."""
+
+    commit: str
+    created: float
+    signal: str = ""
+    hosts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    groups: Dict[str, List[str]] = field(default_factory=dict)
+    children: Dict[str, List[str]] = field(default_factory=dict)
+
+    def expired(self, ttl: int) -> bool:
+        return time.time() - self.created > ttl
+
+
+def cache_key(**config: Any) -> str:
+    """Key of a cached inventory, the same options share the same entry."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SqliteInventoryCache:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS inventory (key TEXT PRIMARY KEY, commit_id TEXT, created REAL, payload TEXT)"
+            )
+
+    def get(self, key: str) -> Optional[InventorySnapshot]:
+        with sqlite3.connect(self.path) as connection:
+            row = connection.execute("SELECT payload FROM inventory WHERE key = ?", (key,)).fetchone()
+        return InventorySnapshot(**json.loads(row[0])) if row else None
+
+    def set(self, key: str, snapshot: InventorySnapshot) -> None:
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO inventory (key, commit_id, created, payload) VALUES (?, ?, ?, ?)",
+                (key, snapshot.commit, snapshot.created, json.dumps(asdict(snapshot))),
+            )
+
+
+class FileInventoryCache:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def entry(self, key: str) -> Path:
+        return self.path / f"{key}.json"
+
+    def get(self, key: str) -> Optional[InventorySnapshot]:
+        if not self.entry(key).is_file():
+            return None
+        return InventorySnapshot(**json.loads(self.entry(key).read_text()))
+
+    def set(self, key: str, snapshot: InventorySnapshot) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.entry(key).write_text(json.dumps(asdict(snapshot)))
+
+
+def get_cache(backend: str, path: Path) -> Any:
+    if backend == SQLITE:
+        return SqliteInventoryCache(path=path)
+    if backend == FILE:
+        return FileInventoryCache(path=path)
+    raise ValueError(f"Unknown inventory cache backend {backend!r}, expected {SQLITE!r} or {FILE!r}")
+
+
+async def fetch_hosts(
+    client: InfrahubClient, nodes: Dict[str, Dict[str, Any]], branch: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Variables of the hosts of each kind, the hosts are named after their hostname."""
+    kinds = list(nodes)
+    results = await asyncio.gather(
+        *[
+            client.all(kind=kind, branch=branch, include=(nodes[kind] or {}).get("include"), populate_store=False)
+            for kind in kinds
+        ]
+    )
+    hosts: Dict[str, Dict[str, Any]] = {}
+    for kind, kind_nodes in zip(kinds, results):
+        include = (nodes[kind] or {}).get("include") or []
+        for node in kind_nodes:
+            host_vars: Dict[str, Any] = {"id": node.id, "kind": kind}
+            for name in include:
+                if name in node._schema.attribute_names:
+                    host_vars[name] = getattr(node, name).value
+                elif name in node._schema.relationship_names:
+                    related = getattr(node, name)
+                    if isinstance(related, RelatedNode):
+                        host_vars[name] = related.display_label
+                    else:
+                        host_vars[name] = [peer.display_label for peer in related.peers]
+            hosts[node.hostname.value] = host_vars
+    return hosts
+
+
+async def data_signal(client: InfrahubClient, kinds: Iterable[str], branch: Optional[str] = None) -> str:
+    """Number of nodes and latest update of each kind, it changes when a host is added, removed or updated."""
+    kinds = sorted(kinds)
+    if not kinds:
+        return ""
+    query = "query { " + " ".join(f"{kind} {{ count edges {{ node {{ _updated_at }} }} }}" for kind in kinds) + " }"
+    response = await client.execute_graphql(query=query, branch_name=branch)
+    signal = []
+    for kind in kinds:
+        updated = max((edge["node"]["_updated_at"] or "" for edge in response[kind]["edges"]), default="")
+        signal.append(f"{kind}:{response[kind]['count']}:{updated}")
+    return ",".join(signal)
+
+
+async def cached_snapshot(
+    client: InfrahubClient,
+    cache: Any,
+    key: str,
+    kinds: Iterable[str],
+    branch: Optional[str] = None,
+    ttl: int = DEFAULT_TTL,
+) -> Tuple[Optional[InventorySnapshot], str, str]:
+    """Snapshot still valid for the branch if any, along with the current commit and data signal of the branch.
+
+    A snapshot is reused while it is younger than `ttl`, the repositories of the branch are still at
+    the commit it was computed for and the hosts of `kinds` have the same count and latest update.
+    Both checks are small queries, run concurrently. A change limited to a related node, like the
+    name of a group or of a location, doesn't touch the hosts and is only picked up after `ttl`.
+    """
+    commit, signal = await asyncio.gather(
+        repository_commit(client=client, branch=branch), data_signal(client=client, kinds=kinds, branch=branch)
+    )
+    snapshot = cache.get(key)
+    if snapshot is None or snapshot.expired(ttl) or snapshot.commit != commit or snapshot.signal != signal:
+        return None, commit, signal
+    return snapshot, commit, signal
@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from infrahub_sdk.node import InfrahubNode
+
+from lbvip.iparray import AddressArray, PrefixArray, extract_common_prefix
+
+PrefixKey = Tuple[Optional[str], str, Optional[str]]
+
+
+def pool_description(location: Optional[str], role: str, vrf: Optional[str]) -> str:
+    """Dotted role.vrf.location description of a prefix, the DMZ VRF is implied by the role."""
+    description = role
+    if vrf and vrf != "DMZ":
+        description += f".{vrf.lower()}"
+    if location:
+        description += f".{location.lower()}"
+    return description
+
+
+def pool_name(prefix: str, location: Optional[str], role: str, vrf: Optional[str]) -> str:
+    """Name of the resource pool created for a prefix."""
+    return f"{pool_description(location=location, role=role, vrf=vrf)}-{extract_common_prefix(prefix=prefix)}"
+
+
+@dataclass
+class PrefixEntry:
+    prefix: str
+    location: Optional[str]
+    role: str
+    vrf: Optional[str]
+    description: str
+    pool_name: str
+    location_id: Optional[str] = None
+    pool: Optional[InfrahubNode] = field(default=None, repr=False)
+
+
+class PrefixIndex:
+    """Lookup tables over the PREFIXES of the loader, built once.
+
+    (location, role, vrf) -> prefix -> resource pool lookups are O(1), the longest-prefix lookups
+    of addresses and the other containment queries over the prefixes go through `array`.
+    """
+
+    def __init__(self, prefixes: Iterable[Dict[str, Any]]) -> None:
+        self.by_key: Dict[PrefixKey, PrefixEntry] = {}
+        self.by_prefix: Dict[str, PrefixEntry] = {}
+        self.by_pool_name: Dict[str, PrefixEntry] = {}
+        # One entry per prefix, at the position of the prefix in `array`
+        self.entries: List[PrefixEntry] = []
+
+        self.prefixes = list(prefixes)
+        # The prefixes are also kept as arrays, the significant part of each is computed in bulk for the pool names
+        self.array = PrefixArray.from_strings(prefix["prefix"] for prefix in self.prefixes)
+        for prefix, common_prefix in zip(self.prefixes, self.array.common_prefixes()):
+            description = pool_description(location=prefix["location"], role=prefix["role"], vrf=prefix["vrf"])
+            entry = PrefixEntry(
+                prefix=prefix["prefix"],
+                location=prefix["location"],
+                role=prefix["role"],
+                vrf=prefix["vrf"],
+                description=description,
+                pool_name=f"{description}-{common_prefix}",
+                location_id=prefix.get("location_id"),
+            )
+            self.entries.append(entry)
+            # Keep the first prefix for a key, like the linear scan it replaces
+            self.by_key.setdefault((entry.location, entry.role, entry.vrf), entry)
+            self.by_prefix[entry.prefix] = entry
+            self.by_pool_name[entry.pool_name] = entry
+
+    def __iter__(self) -> Iterator[PrefixEntry]:
+        return iter(self.by_prefix.values())
+
+    def get(self, location: Optional[str], role: str, vrf: Optional[str]) -> Optional[PrefixEntry]:
+        return self.by_key.get((location, role, vrf))
+
+    def set_pool(self, prefix: str, pool: InfrahubNode) -> None:
+        self.by_prefix[prefix].pool = pool
+
+    def pool(self, location: Optional[str], role: str, vrf: Optional[str]) -> Optional[InfrahubNode]:
+        entry = self.get(location=location, role=role, vrf=vrf)
+        return entry.pool if entry else None
+
+    def containing(self, addresses: Iterable[str]) -> List[Optional[PrefixEntry]]:
+        """Most specific prefix containing each address, None for the addresses outside of every prefix."""
+        indexes = self.array.containing(AddressArray.from_strings(addresses))
+        return [self.entries[index] if index != -1 else None for index in indexes.tolist()]
+
+    def lookup(self, address: str) -> Optional[PrefixEntry]:
+        """Most specific prefix containing an address, `10.0.0.1` and `10.0.0.1/24` are both accepted."""
+        return self.containing([address])[0]
+
+    def gateways(self, roles: Iterable[str]) -> Dict[str, str]:
+        """Gateway of the prefixes of some roles, the second to last address of each with the prefix length."""
+        selected = [index for index, prefix in enumerate(self.prefixes) if prefix["role"] in roles]
+        if not selected:
+            return {}
+        addresses = self.array.gateways().to_strings()
+        return {
+            self.prefixes[index]["prefix"]: f"{addresses[index]}/{int(self.array.prefixlen[index])}" for index in selected
+        }
+
@@ -0,0 +1,319 @@
+import ipaddress
+import socket
+
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Addresses are stored as two unsigned 64 bits halves, IPv4 addresses only use the low half
+HALF = 64
+WIDTHS = {4: 32, 6: 128}
+IPV4_PADDING = bytes(12)
+
+
+def _split(value: int) -> Tuple[int, int]:
+    return value >> HALF, value & ((1 << HALF) - 1)
+
+
+def _mask_table(version: int, hostmask: bool = False) -> np.ndarray:
+    """Network (or host) mask of every prefix length of a version as (hi, lo) halves, indexed by the prefix length."""
+    width = WIDTHS[version]
+    table = np.zeros((129, 2), dtype=np.uint64)
+    for length in range(width + 1):
+        host = (1 << (width - length)) - 1
+        table[length] = _split(host if hostmask else ((1 << width) - 1) ^ host)
+    return table
+
+
+NETMASKS = {version: _mask_table(version) for version in WIDTHS}
+HOSTMASKS = {version: _mask_table(version, hostmask=True) for version in WIDTHS}
+
+
+def _pack(address: str) -> Tuple[int, bytes]:
+    """Version and 16 bytes big-endian value of an address, IPv4 addresses are left-padded with zeros."""
+    if ":" in address:
+        return 6, socket.inet_pton(socket.AF_INET6, address)
+    try:
+        return 4, IPV4_PADDING + socket.inet_pton(socket.AF_INET, address)
+    except OSError as exc:
+        raise ValueError(f"{address} is not a valid IP address") from exc
+
+
+def _unpack(packed: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """(hi, lo) halves of packed addresses, converted in one pass by NumPy."""
+    halves = np.frombuffer(b"".join(packed), dtype=">u8").astype(np.uint64).reshape(-1, 2)
+    return halves[:, 0].copy(), halves[:, 1].copy()
+
+
+def _to_string(version: int, hi: int, lo: int) -> str:
+    if version == 4:
+        return str(ipaddress.IPv4Address(lo))
+    return str(ipaddress.IPv6Address((hi << HALF) | lo))
+
+
+def _mask(table: dict, version: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    is_v4 = version == 4
+    v4, v6 = table[4][lengths], table[6][lengths]
+    return np.where(is_v4, v4[:, 0], v6[:, 0]), np.where(is_v4, v4[:, 1], v6[:, 1])
+
+
+def _dense_rank(*columns: np.ndarray) -> np.ndarray:
+    """Rank of each row among the distinct rows of the columns, so (version, hi, lo) values compare as integers."""
+    order = np.lexsort(columns[::-1])
+    changed = np.zeros(len(order), dtype=bool)
+    for column in columns:
+        ordered = column[order]
+        changed[1:] |= ordered[1:] != ordered[:-1]
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.cumsum(changed)
+    return ranks
+
+
+def _keys(version: np.ndarray, hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+    """One sortable integer per (version, hi, lo) value, the IPv4 only tables use the addresses directly."""
+    if not len(version) or (np.all(version == 4)):
+        return lo
+    return _dense_rank(version, hi, lo)
+
+
+def _offset(hi: np.ndarray, lo: np.ndarray, delta: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Addresses moved by one up or down, the carry goes from the low half to the high half."""
+    step = np.uint64(1)
+    if delta > 0:
+        new_lo = lo + step
+        return hi + (new_lo < lo).astype(np.uint64), new_lo
+    new_lo = lo - step
+    return hi - (new_lo > lo).astype(np.uint64), new_lo
+
+
+def extract_common_prefix(prefix: str) -> str:
+    # Create an IP network object
+    net = ipaddress.ip_network(prefix, strict=False)
+
+    # Get the network address in binary form
+    network_address = net.network_address
+    # Convert the network address to a string
+    net_str = str(network_address)
+
+    # Calculate how many full octets (for IPv4) to extract
+    if isinstance(network_address, ipaddress.IPv4Address):
+        # Full octets (each 8 bits)
+        full_octets = net.prefixlen // 8
+
+        # Handle partial octet
+        partial_bits = net.prefixlen % 8
+        if partial_bits > 0:
+            # Extract the first full octets
+            octets = net_str.split('.')[:full_octets]
+            # Add the partial octet if necessary
+            partial_octet = int(net_str.split('.')[full_octets]) & (0xFF << (8 - partial_bits))
+            octets.append(str(partial_octet))
+            return '.'.join(octets) + f"/{net.prefixlen}"
+        else:
+            return '.'.join(net_str.split('.')[:full_octets]) + f"/{net.prefixlen}"
+
+    elif isinstance(network_address, ipaddress.IPv6Address):
+        # Full hextets (each 16 bits)
+        full_hextets = net.prefixlen // 16
+        partial_bits = net.prefixlen % 16
+        if partial_bits > 0:
+            hextets = net_str.split(':')[:full_hextets]
+            partial_hextet = int(net_str.split(':')[full_hextets], 16) & (0xFFFF << (16 - partial_bits))
+            hextets.append(f'{partial_hextet:x}')
+            return ':'.join(hextets) + f"/{net.prefixlen}"
+        else:
+            return ':'.join(net_str.split(':')[:full_hextets]) + f"/{net.prefixlen}"
+
+
+class AddressArray:
+    """IPv4 and IPv6 addresses stored as NumPy arrays, the prefix length of `10.0.0.1/24` is ignored."""
+
+    def __init__(self, version: np.ndarray, hi: np.ndarray, lo: np.ndarray) -> None:
+        self.version = version
+        self.hi = hi
+        self.lo = lo
+
+    def __len__(self) -> int:
+        return len(self.version)
+
+    @classmethod
+    def from_strings(cls, addresses: Iterable[str]) -> "AddressArray":
+        versions, packed = [], []
+        for address in addresses:
+            version, value = _pack(address.split("/", 1)[0])
+            versions.append(version)
+            packed.append(value)
+        hi, lo = _unpack(packed)
+        return cls(version=np.array(versions, dtype=np.uint8), hi=hi, lo=lo)
+
+    def to_strings(self) -> List[str]:
+        return [_to_string(v, h, low) for v, h, low in zip(self.version.tolist(), self.hi.tolist(), self.lo.tolist())]
+
+
+class PrefixArray:
+    """Table of IPv4 and IPv6 prefixes stored as NumPy arrays of versions, network addresses and prefix lengths.
+
+    The gateways, the boundaries of the pools, the containment of addresses and the nesting and duplicates
+    of the prefixes are computed for the whole table at once. The lookups go one prefix length at a
+    time, so their cost depends on the number of distinct lengths rather than on the number of prefixes.
+    """
+
+    def __init__(self, version: np.ndarray, hi: np.ndarray, lo: np.ndarray, prefixlen: np.ndarray) -> None:
+        self.version = version
+        self.prefixlen = prefixlen
+        mask_hi, mask_lo = _mask(NETMASKS, version, prefixlen)
+        # Host bits are dropped, like ipaddress.ip_network(strict=False)
+        self.hi = hi & mask_hi
+        self.lo = lo & mask_lo
+
+    def __len__(self) -> int:
+        return len(self.version)
+
+    @classmethod
+    def from_strings(cls, prefixes: Iterable[str]) -> "PrefixArray":
+        versions: List[int] = []
+        packed: List[bytes] = []
+        lengths: List[int] = []
+        for prefix in prefixes:
+            address, _, length = prefix.partition("/")
+            version, value = _pack(address)
+            prefixlen = int(length) if length else WIDTHS[version]
+            if not 0 <= prefixlen <= WIDTHS[version]:
+                raise ValueError(f"{prefix} has an invalid prefix length")
+            versions.append(version)
+            packed.append(value)
+            lengths.append(prefixlen)
+        hi, lo = _unpack(packed)
+        return cls(
+            version=np.array(versions, dtype=np.uint8), hi=hi, lo=lo, prefixlen=np.array(lengths, dtype=np.uint8)
+        )
+
+    def to_strings(self) -> List[str]:
+        return [
+            f"{_to_string(v, h, low)}/{p}"
+            for v, h, low, p in zip(self.version.tolist(), self.hi.tolist(), self.lo.tolist(), self.prefixlen.tolist())
+        ]
+
+    def width(self) -> np.ndarray:
+        return np.where(self.version == 4, 32, 128)
+
+    def broadcast(self) -> AddressArray:
+        """Last address of each prefix."""
+        host_hi, host_lo = _mask(HOSTMASKS, self.version, self.prefixlen)
+        return AddressArray(version=self.version, hi=self.hi | host_hi, lo=self.lo | host_lo)
+
+    def gateways(self) -> AddressArray:
+        """Second to last address of each prefix, `ipaddress.ip_network(prefix)[-2]`; a /32 or /128 keeps its address."""
+        last = self.broadcast()
+        hi, lo = _offset(last.hi, last.lo, -1)
+        single = self.prefixlen == self.width()
+        return AddressArray(version=self.version, hi=np.where(single, last.hi, hi), lo=np.where(single, last.lo, lo))
+
+    def host_range(self) -> Tuple[AddressArray, AddressArray]:
+        """First and last address of each prefix handed out by its pool, with the semantics of ipaddress hosts().
+
+        The network and broadcast addresses of the IPv4 prefixes up to /30 and the Subnet-Router anycast
+        address of the IPv6 prefixes up to /126 are excluded, the /31, /32, /127 and /128 use all their addresses.
+        """
+        last = self.broadcast()
+        shrink = self.prefixlen < self.width() - 1
+        first_hi, first_lo = _offset(self.hi, self.lo, 1)
+        end_hi, end_lo = _offset(last.hi, last.lo, -1)
+        shrink_end = shrink & (self.version == 4)
+        first = AddressArray(self.version, np.where(shrink, first_hi, self.hi), np.where(shrink, first_lo, self.lo))
+        end = AddressArray(self.version, np.where(shrink_end, end_hi, last.hi), np.where(shrink_end, end_lo, last.lo))
+        return first, end
+
+    def sizes(self) -> np.ndarray:
+        """Number of addresses of each prefix, as floats since an IPv6 prefix doesn't fit 64 bits."""
+        return np.exp2((self.width() - self.prefixlen).astype(np.float64))
+
+    def capacities(self) -> np.ndarray:
+        """Number of addresses a pool can hand out from each prefix, the addresses between the bounds of host_range()."""
+        shrink = self.prefixlen < self.width() - 1
+        excluded = np.where(shrink, np.where(self.version == 4, 2, 1), 0)
+        return self.sizes() - excluded
+
+    def _lengths(self) -> List[int]:
+        """Distinct prefix lengths of the table, most specific first."""
+        return sorted(np.unique(self.prefixlen).tolist(), reverse=True)
+
+    def _lookup(
+        self, version: np.ndarray, hi: np.ndarray, lo: np.ndarray, lengths: Sequence[int], exclude: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Index of the most specific prefix of the table containing each value, -1 when none does.
+
+        `lengths` are the prefix lengths to try, most specific first. A value is never matched with the
+        prefix at the same position of `exclude`, to find the strict supernets of the table itself.
+        """
+        result = np.full(len(version), -1, dtype=np.int64)
+        for length in lengths:
+            candidates = np.flatnonzero(self.prefixlen == length)
+            pending = np.flatnonzero(result == -1)
+            if not len(candidates) or not len(pending):
+                continue
+            mask_hi, mask_lo = _mask(NETMASKS, version[pending], np.full(len(pending), length, dtype=np.uint8))
+            keys = _keys(
+                np.concatenate([self.version[candidates], version[pending]]),
+                np.concatenate([self.hi[candidates], hi[pending] & mask_hi]),
+                np.concatenate([self.lo[candidates], lo[pending] & mask_lo]),
+            )
+            table, queries = keys[: len(candidates)], keys[len(candidates) :]
+            # A stable sort keeps the copies of a duplicated prefix in order, the first one is matched
+            order = np.argsort(table, kind="stable")
+            positions = np.minimum(np.searchsorted(table[order], queries), len(order) - 1)
+            matches = np.where(table[order][positions] == queries, candidates[order][positions], -1)
+            if exclude is not None:
+                matches = np.where(matches == exclude[pending], -1, matches)
+            result[pending] = matches
+        return result
+
+    def containing(self, addresses: AddressArray) -> np.ndarray:
+        """Index of the most specific prefix containing each address, -1 when none does."""
+        return self._lookup(addresses.version, addresses.hi, addresses.lo, self._lengths())
+
+    def parents(self) -> np.ndarray:
+        """Index of the most specific strict supernet of each prefix, -1 for the top level prefixes.
+
+        The copies of a duplicated prefix have its first occurrence as parent.
+        """
+        result = np.full(len(self), -1, dtype=np.int64)
+        for length in self._lengths():
+            selected = np.flatnonzero((self.prefixlen >= length) & (result == -1))
+            if not len(selected):
+                continue
+            found = self._lookup(self.version[selected], self.hi[selected], self.lo[selected], [length], exclude=selected)
+            # A prefix of the same length is only the parent of the later copies of itself
+            valid = (found != -1) & ((self.prefixlen[selected] > length) | (found < selected))
+            result[selected[valid]] = found[valid]
+        return result
+
+    def duplicates(self) -> np.ndarray:
+        """Indexes of the prefixes already present earlier in the table."""
+        ranks = _dense_rank(self.version, self.hi, self.lo, self.prefixlen)
+        _, first = np.unique(ranks, return_index=True)
+        return np.setdiff1d(np.arange(len(self)), first)
+
+    def overlaps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs (outer, inner) of the prefixes nested in another one, with their most specific supernet.
+
+        Two CIDR prefixes either nest or are disjoint, these pairs are all the overlaps of the table.
+        """
+        parents = self.parents()
+        inner = np.flatnonzero(parents != -1)
+        return parents[inner], inner
+
+    def common_prefixes(self) -> List[str]:
+        """extract_common_prefix of each prefix, the significant octets of the IPv4 prefixes are computed in bulk."""
+
+        octets = np.stack([(self.lo >> np.uint64(shift)) & np.uint64(0xFF) for shift in (24, 16, 8, 0)], axis=1).tolist()
+        significant = ((self.prefixlen.astype(np.int64) + 7) // 8).tolist()
+        result = []
+        for version, row, count, prefixlen, hi, lo in zip(
+            self.version.tolist(), octets, significant, self.prefixlen.tolist(), self.hi.tolist(), self.lo.tolist()
+        ):
+            if version == 6:
+                result.append(extract_common_prefix(f"{_to_string(6, hi, lo)}/{prefixlen}"))
+            else:
+                result.append(".".join(str(octet) for octet in row[:count]) + f"/{prefixlen}")
+        return result
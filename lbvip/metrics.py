@@ -0,0 +1,304 @@
+import cProfile
+import json
+import logging
+import os
+import re
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.types import HTTPMethod
+
+METRICS_ENV = "LB_VIP_LOADER_METRICS"
+PROFILE_ENV = "LB_VIP_LOADER_PROFILE"
+PROFILE_OUTPUT_ENV = "LB_VIP_LOADER_PROFILE_OUTPUT"
+CPROFILE = "cprofile"
+PYINSTRUMENT = "pyinstrument"
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+OPERATION_PATTERN = re.compile(r"^\s*(?:mutation|query)\b[^{]*\{\s*(?:\w+\s*:\s*)?(\w+)", re.DOTALL)
+ACTIONS = (
+    ("PoolGetResource", "allocation"),
+    ("RelationshipAdd", "relationship"),
+    ("RelationshipRemove", "relationship"),
+    ("Create", "create"),
+    ("Upsert", "create"),
+    ("Update", "update"),
+    ("Delete", "delete"),
+)
+
+
+def classify(url: str, payload: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    """Kind and action of a request of the SDK, from its URL or the first field of its GraphQL operation."""
+    path = httpx.URL(url).path
+    if path.startswith("/api/query/"):
+        return path[len("/api/query/") :], "stored_query"
+    if not path.startswith("/graphql"):
+        return path, "api"
+    query = (payload or {}).get("query", "")
+    match = OPERATION_PATTERN.match(query)
+    operation = match.group(1) if match else "unknown"
+    if not query.lstrip().startswith("mutation"):
+        return operation, "read"
+    for suffix, action in ACTIONS:
+        if operation.endswith(suffix) and action == "allocation":
+            # IPAddressPoolGetResource is the allocation of a CoreIPAddressPool
+            return f"Core{operation[: -len('GetResource')]}", action
+        if operation.endswith(suffix):
+            return operation[: -len(suffix)] or operation, action
+    return operation, "mutation"
+
+
+def has_errors(response: httpx.Response) -> bool:
+    """GraphQL returns its errors with a 200."""
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and bool(body.get("errors"))
+
+
+@dataclass
+class Histogram:
+    """Cumulative latency histogram with the same buckets as Prometheus."""
+
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        result, running = [], 0
+        for bound, count in zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+@dataclass
+class OperationStats:
+    requests: int = 0
+    errors: int = 0
+    sent_bytes: int = 0
+    received_bytes: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "sent_bytes": self.sent_bytes,
+            "received_bytes": self.received_bytes,
+            "seconds": self.latency.total,
+            "mean": self.latency.total / self.latency.count if self.latency.count else 0.0,
+            "histogram": dict(self.latency.cumulative()),
+        }
+
+
+class LoaderMetrics:
+    """Wall time of the phases of the loader and statistics of the requests sent to Infrahub during each phase.
+
+    The requests are recorded by wrapping the requester of the client, so the batches, the allocations
+    from the pools and the relationship updates are all accounted for, per kind and per action
+    (create, update, relationship, allocation, read, ...). A request sent again after a failure
+    to reach Infrahub, as the SDK does with retry_on_failure, counts as a retry.
+    """
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self.operations: Dict[Tuple[str, str, str], OperationStats] = defaultdict(OperationStats)
+        self.retries = 0
+        self.current: Optional[str] = None
+        self._phase_start = 0.0
+        self._failed: set = set()
+
+    def start_phase(self, name: str) -> None:
+        """End the current phase and start the next one, the phases follow each other."""
+        self.end_phase()
+        self.current = name
+        self._phase_start = time.perf_counter()
+
+    def end_phase(self) -> None:
+        if self.current:
+            self.phases[self.current] = self.phases.get(self.current, 0.0) + time.perf_counter() - self._phase_start
+        self.current = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.start_phase(name)
+        try:
+            yield
+        finally:
+            self.end_phase()
+
+    def instrument(self, client: InfrahubClient) -> None:
+        """Record every request of the client, the requester it was configured with still sends them."""
+        requester = client._request_method
+
+        async def request(
+            url: str, method: HTTPMethod, headers: Dict[str, Any], timeout: int, payload: Optional[dict] = None
+        ) -> httpx.Response:
+            kind, action = classify(url=url, payload=payload)
+            stats = self.operations[(self.current or "setup", kind, action)]
+            body = json.dumps(payload, default=str) if payload else ""
+            attempt = (url, body)
+            if attempt in self._failed:
+                self.retries += 1
+                self._failed.discard(attempt)
+
+            stats.requests += 1
+            stats.sent_bytes += len(body)
+            start = time.perf_counter()
+            try:
+                response = await requester(url=url, method=method, headers=headers, timeout=timeout, payload=payload)
+            except Exception:
+                stats.errors += 1
+                self._failed.add(attempt)
+                raise
+            finally:
+                stats.latency.observe(time.perf_counter() - start)
+
+            stats.received_bytes += len(response.content)
+            if response.status_code >= 400 or has_errors(response):
+                stats.errors += 1
+            return response
+
+        client._request_method = request
+
+    def totals(self) -> Dict[str, int]:
+        return {
+            "requests": sum(stats.requests for stats in self.operations.values()),
+            "errors": sum(stats.errors for stats in self.operations.values()),
+            "retries": self.retries,
+            "sent_bytes": sum(stats.sent_bytes for stats in self.operations.values()),
+            "received_bytes": sum(stats.received_bytes for stats in self.operations.values()),
+        }
+
+    def by_action(self) -> Dict[str, float]:
+        """Time spent waiting for Infrahub per action, to tell the allocations from the creates and the updates."""
+        result: Dict[str, float] = defaultdict(float)
+        for (_, _, action), stats in self.operations.items():
+            result[action] += stats.latency.total
+        return dict(result)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "phases": self.phases,
+            "totals": self.totals(),
+            "actions": self.by_action(),
+            "operations": [
+                {"phase": phase, "kind": kind, "action": action, **stats.summary()}
+                for (phase, kind, action), stats in sorted(self.operations.items())
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP lbvip_loader_phase_seconds Wall time of each phase of the loader.",
+            "# TYPE lbvip_loader_phase_seconds gauge",
+        ]
+        lines += [f'lbvip_loader_phase_seconds{{phase="{phase}"}} {duration}' for phase, duration in self.phases.items()]
+        lines += [
+            "# HELP lbvip_loader_retries_total Requests sent again after a failure.",
+            "# TYPE lbvip_loader_retries_total counter",
+            f"lbvip_loader_retries_total {self.retries}",
+        ]
+        for metric, attribute, help_text in (
+            ("requests_total", "requests", "Requests sent to Infrahub."),
+            ("request_errors_total", "errors", "Requests that failed or returned errors."),
+            ("request_sent_bytes_total", "sent_bytes", "Size of the payloads sent to Infrahub."),
+            ("request_received_bytes_total", "received_bytes", "Size of the responses of Infrahub."),
+        ):
+            lines += [f"# HELP lbvip_loader_{metric} {help_text}", f"# TYPE lbvip_loader_{metric} counter"]
+            for (phase, kind, action), stats in sorted(self.operations.items()):
+                labels = f'phase="{phase}",kind="{kind}",action="{action}"'
+                lines.append(f"lbvip_loader_{metric}{{{labels}}} {getattr(stats, attribute)}")
+
+        lines += [
+            "# HELP lbvip_loader_request_duration_seconds Latency of the requests sent to Infrahub.",
+            "# TYPE lbvip_loader_request_duration_seconds histogram",
+        ]
+        for (phase, kind, action), stats in sorted(self.operations.items()):
+            labels = f'phase="{phase}",kind="{kind}",action="{action}"'
+            for bound, count in stats.latency.cumulative():
+                lines.append(f'lbvip_loader_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"lbvip_loader_request_duration_seconds_sum{{{labels}}} {stats.latency.total}")
+            lines.append(f"lbvip_loader_request_duration_seconds_count{{{labels}}} {stats.latency.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Path) -> None:
+        """Write the metrics as Prometheus text for a .prom file, as JSON otherwise."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".prom":
+            path.write_text(self.to_prometheus())
+        else:
+            path.write_text(json.dumps(self.to_json(), indent=2) + "\n")
+
+    def log_summary(self, log: logging.Logger) -> None:
+        totals = self.totals()
+        log.info(
+            f"Sent {totals['requests']} requests ({totals['errors']} errors, {totals['retries']} retries, "
+            f"{totals['sent_bytes']} bytes sent, {totals['received_bytes']} bytes received)"
+        )
+        for phase, duration in self.phases.items():
+            log.info(f"- {phase}: {duration:.2f}s")
+        for action, duration in sorted(self.by_action().items(), key=lambda item: -item[1]):
+            log.info(f"- waiting for {action}: {duration:.2f}s")
+
+
+@contextmanager
+def profiled(mode: Optional[str] = None, output: Optional[str] = None, log: Optional[logging.Logger] = None) -> Iterator[None]:
+    """Profile the block with cProfile or pyinstrument, chosen with LB_VIP_LOADER_PROFILE when `mode` isn't given.
+
+    cProfile writes pstats to LB_VIP_LOADER_PROFILE_OUTPUT (loader.prof by default), pyinstrument an
+    HTML report (loader.html by default). Nothing is profiled when neither is set.
+    """
+    mode = (mode or os.environ.get(PROFILE_ENV, "")).lower()
+    if not mode:
+        yield
+        return
+    output = output or os.environ.get(PROFILE_OUTPUT_ENV) or ("loader.prof" if mode == CPROFILE else "loader.html")
+
+    if mode == CPROFILE:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(output)
+    elif mode == PYINSTRUMENT:
+        try:
+            from pyinstrument import Profiler
+        except ImportError as exc:
+            raise RuntimeError(f"{PROFILE_ENV}={PYINSTRUMENT} requires pyinstrument to be installed") from exc
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            Path(output).write_text(profiler.output_html())
+    else:
+        raise ValueError(f"Unknown profiler {mode!r}, expected {CPROFILE!r} or {PYINSTRUMENT!r}")
+
+    if log:
+        log.info(f"Wrote the {mode} profile of the loader to {output}")
@@ -0,0 +1,165 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+ACTIVE = "active"
+
+
+def value(node: Optional[Dict[str, Any]], attribute: str, key: str = "value") -> Any:
+    """Value of an attribute of a GraphQL node, None when the node or the attribute is missing."""
+    if not node or not node.get(attribute):
+        return None
+    return node[attribute].get(key)
+
+
+def peer(node: Optional[Dict[str, Any]], relationship: str) -> Optional[Dict[str, Any]]:
+    if not node or not node.get(relationship):
+        return None
+    return node[relationship].get("node")
+
+
+def peers(node: Optional[Dict[str, Any]], relationship: str) -> List[Dict[str, Any]]:
+    if not node or not node.get(relationship):
+        return []
+    return [edge["node"] for edge in node[relationship]["edges"]]
+
+
+@dataclass
+class HealthCheck:
+    check_type: Optional[str]
+    rise: Optional[int]
+    fall: Optional[int]
+    timeout: Optional[int]
+
+    @classmethod
+    def from_node(cls, node: Dict[str, Any]) -> "HealthCheck":
+        return cls(
+            check_type=value(node, "check_type"),
+            rise=value(node, "rise"),
+            fall=value(node, "fall"),
+            timeout=value(node, "timeout"),
+        )
+
+
+@dataclass
+class Member:
+    """Frontend server behind a VIP."""
+
+    hostname: str
+    status: Optional[str]
+    ip: Optional[str]
+
+    @property
+    def active(self) -> bool:
+        return self.status == ACTIVE
+
+    @classmethod
+    def from_node(cls, node: Dict[str, Any]) -> "Member":
+        return cls(
+            hostname=value(node, "hostname"),
+            status=value(node, "status"),
+            ip=value(peer(node, "ip_address"), "address", "ip"),
+        )
+
+
+@dataclass
+class VIP:
+    hostname: str
+    status: Optional[str]
+    mode: Optional[str]
+    balance: Optional[str]
+    ssl_certificate: Optional[str]
+    ip: Optional[str]
+    members: List[Member] = field(default_factory=list)
+    health_checks: List[HealthCheck] = field(default_factory=list)
+    maxconn: Optional[int] = None
+    rate_limit: Optional[int] = None
+    timeout_client: Optional[int] = None
+    timeout_server: Optional[int] = None
+    timeout_connect: Optional[int] = None
+    http_connection_mode: Optional[str] = None
+    http_reuse: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status == ACTIVE
+
+    @classmethod
+    def from_node(cls, node: Dict[str, Any]) -> "VIP":
+        return cls(
+            hostname=value(node, "hostname"),
+            status=value(node, "status"),
+            mode=value(node, "mode"),
+            balance=value(node, "balance"),
+            ssl_certificate=value(node, "ssl_certificate"),
+            ip=value(peer(node, "ip_address"), "address", "ip"),
+            members=[Member.from_node(member) for member in peers(node, "frontend_servers")],
+            health_checks=[HealthCheck.from_node(check) for check in peers(node, "health_checks")],
+            maxconn=value(node, "maxconn"),
+            rate_limit=value(node, "rate_limit"),
+            timeout_client=value(node, "timeout_client"),
+            timeout_server=value(node, "timeout_server"),
+            timeout_connect=value(node, "timeout_connect"),
+            http_connection_mode=value(node, "http_connection_mode"),
+            http_reuse=value(node, "http_reuse"),
+        )
+
+
+@dataclass
+class LoadBalancer:
+    hostname: str
+    address: Optional[str]
+    asn: Optional[int]
+    gateway: Optional[str]
+    vips: List[VIP] = field(default_factory=list)
+    maxconn: Optional[int] = None
+    nbthread: Optional[int] = None
+    cpu_map: Optional[str] = None
+
+    @classmethod
+    def from_node(cls, node: Dict[str, Any]) -> "LoadBalancer":
+        public_prefix = peer(peer(node, "public_ip_address"), "ip_prefix")
+        return cls(
+            hostname=value(node, "hostname"),
+            address=value(peer(node, "ip_address"), "address"),
+            asn=value(peer(node, "asn"), "asn"),
+            gateway=value(peer(public_prefix, "gateway"), "address", "ip"),
+            vips=[VIP.from_node(vip) for vip in peers(node, "virtual_ips")],
+            maxconn=value(node, "maxconn"),
+            nbthread=value(node, "nbthread"),
+            cpu_map=value(node, "cpu_map"),
+        )
+
+
+@dataclass
+class Frontend:
+    hostname: str
+    address: Optional[str]
+    ip: Optional[str]
+    vips: List[VIP] = field(default_factory=list)
+    cpu_count: Optional[int] = None
+    worker_connections: Optional[int] = None
+    keepalive_timeout: Optional[int] = None
+    upstream_keepalive: Optional[int] = None
+
+    @classmethod
+    def from_node(cls, node: Dict[str, Any]) -> "Frontend":
+        return cls(
+            hostname=value(node, "hostname"),
+            address=value(peer(node, "ip_address"), "address"),
+            ip=value(peer(node, "ip_address"), "address", "ip"),
+            vips=[VIP.from_node(vip) for vip in peers(node, "virtual_ips")],
+            cpu_count=value(node, "cpu_count"),
+            worker_connections=value(node, "worker_connections"),
+            keepalive_timeout=value(node, "keepalive_timeout"),
+            upstream_keepalive=value(node, "upstream_keepalive"),
+        )
+
+
+def load_balancers(data: Dict[str, Any]) -> List[LoadBalancer]:
+    """Flat models of the lb_vip query result."""
+    return [LoadBalancer.from_node(edge["node"]) for edge in data["ServerLoadBalancer"]["edges"]]
+
+
+def frontends(data: Dict[str, Any]) -> List[Frontend]:
+    """Flat models of the frontend_vip query result."""
+    return [Frontend.from_node(edge["node"]) for edge in data["ServerFrontend"]["edges"]]
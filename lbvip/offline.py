@@ -0,0 +1,1067 @@
+import hashlib
+import importlib.util
+import ipaddress
+import json
+import logging
+import time
+import uuid
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import yaml
+
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    Undefined,
+    parse,
+    value_from_ast_untyped,
+)
+from infrahub_sdk import Config, InfrahubClient
+from infrahub_sdk.types import HTTPMethod
+
+from lbvip.allocation import ALLOCATION_MUTATION
+from lbvip.catalog import MODELS_DIRECTORY
+from lbvip.rendering import render_bird, render_haproxy, render_nginx
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+OFFLINE_ADDRESS = "http://infrahub.offline"
+DEFAULT_NAMESPACE = "default"
+
+# Subset of the schema Infrahub defines itself that the models, the loader and the artifacts rely on
+CORE_SCHEMA: Dict[str, Any] = {
+    "generics": [
+        {
+            "name": "Node",
+            "namespace": "Core",
+            "relationships": [
+                {"name": "member_of_groups", "peer": "CoreGroup", "identifier": "group_member", "kind": "Group"},
+                {"name": "subscriber_of_groups", "peer": "CoreGroup", "identifier": "group_subscriber", "kind": "Group"},
+            ],
+        },
+        {
+            "name": "Group",
+            "namespace": "Core",
+            "display_labels": ["label__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "label", "kind": "Text", "optional": True},
+                {"name": "description", "kind": "Text", "optional": True},
+            ],
+            "relationships": [
+                {"name": "members", "peer": "CoreNode", "identifier": "group_member", "kind": "Generic"},
+                {"name": "subscribers", "peer": "CoreNode", "identifier": "group_subscriber", "kind": "Generic"},
+            ],
+        },
+        {
+            "name": "ArtifactTarget",
+            "namespace": "Core",
+            "relationships": [
+                {"name": "artifacts", "peer": "CoreArtifact", "identifier": "artifact__node", "read_only": True},
+            ],
+        },
+        {
+            "name": "GenericRepository",
+            "namespace": "Core",
+            "display_labels": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "location", "kind": "Text"},
+                {"name": "commit", "kind": "Text", "optional": True},
+            ],
+        },
+        {
+            "name": "IPNamespace",
+            "namespace": "Builtin",
+            "display_labels": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "description", "kind": "Text", "optional": True},
+            ],
+        },
+        {
+            "name": "IPPrefix",
+            "namespace": "Builtin",
+            "display_labels": ["prefix__value"],
+            "attributes": [
+                {"name": "prefix", "kind": "IPNetwork"},
+                {"name": "description", "kind": "Text", "optional": True},
+                {"name": "member_type", "kind": "Dropdown", "default_value": "address", "optional": True},
+                {"name": "is_pool", "kind": "Boolean", "default_value": False, "optional": True},
+            ],
+            "relationships": [
+                {"name": "ip_namespace", "peer": "BuiltinIPNamespace", "identifier": "ip_namespace__ip_prefix", "cardinality": "one"},
+                {"name": "parent", "peer": "BuiltinIPPrefix", "identifier": "parent__child", "cardinality": "one", "read_only": True},
+                {"name": "children", "peer": "BuiltinIPPrefix", "identifier": "parent__child", "read_only": True},
+                {"name": "ip_addresses", "peer": "BuiltinIPAddress", "identifier": "ip_prefix__ip_address", "read_only": True},
+            ],
+        },
+        {
+            "name": "IPAddress",
+            "namespace": "Builtin",
+            "display_labels": ["address__value"],
+            "attributes": [
+                {"name": "address", "kind": "IPHost"},
+                {"name": "description", "kind": "Text", "optional": True},
+            ],
+            "relationships": [
+                {"name": "ip_namespace", "peer": "BuiltinIPNamespace", "identifier": "ip_namespace__ip_address", "cardinality": "one"},
+                {"name": "ip_prefix", "peer": "BuiltinIPPrefix", "identifier": "ip_prefix__ip_address", "cardinality": "one", "read_only": True},
+            ],
+        },
+    ],
+    "nodes": [
+        {"name": "StandardGroup", "namespace": "Core", "inherit_from": ["CoreGroup"], "human_friendly_id": ["name__value"]},
+        {"name": "Repository", "namespace": "Core", "inherit_from": ["CoreGenericRepository"], "human_friendly_id": ["name__value"]},
+        {
+            "name": "Tag",
+            "namespace": "Builtin",
+            "display_labels": ["name__value"],
+            "human_friendly_id": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "description", "kind": "Text", "optional": True},
+            ],
+        },
+        {
+            "name": "Namespace",
+            "namespace": "Ipam",
+            "inherit_from": ["BuiltinIPNamespace"],
+            "human_friendly_id": ["name__value"],
+            "attributes": [{"name": "default", "kind": "Boolean", "optional": True}],
+        },
+        {
+            "name": "IPAddressPool",
+            "namespace": "Core",
+            "display_labels": ["name__value"],
+            "human_friendly_id": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "description", "kind": "Text", "optional": True},
+                {"name": "default_address_type", "kind": "Text"},
+                {"name": "default_prefix_length", "kind": "Number", "optional": True},
+            ],
+            "relationships": [
+                {"name": "resources", "peer": "BuiltinIPPrefix", "identifier": "ipaddresspool__resource", "kind": "Attribute"},
+                {"name": "ip_namespace", "peer": "BuiltinIPNamespace", "identifier": "ipaddresspool__ipnamespace", "cardinality": "one"},
+            ],
+        },
+        {
+            "name": "IPPrefixPool",
+            "namespace": "Core",
+            "display_labels": ["name__value"],
+            "human_friendly_id": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "description", "kind": "Text", "optional": True},
+                {"name": "default_prefix_length", "kind": "Number", "optional": True},
+                {"name": "default_member_type", "kind": "Text", "optional": True},
+                {"name": "default_prefix_type", "kind": "Text", "optional": True},
+            ],
+            "relationships": [
+                {"name": "resources", "peer": "BuiltinIPPrefix", "identifier": "prefixpool__resource", "kind": "Attribute"},
+                {"name": "ip_namespace", "peer": "BuiltinIPNamespace", "identifier": "prefixpool__ipnamespace", "cardinality": "one"},
+            ],
+        },
+        {
+            "name": "NumberPool",
+            "namespace": "Core",
+            "display_labels": ["name__value"],
+            "human_friendly_id": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "description", "kind": "Text", "optional": True},
+                {"name": "node", "kind": "Text"},
+                {"name": "node_attribute", "kind": "Text"},
+                {"name": "start_range", "kind": "Number"},
+                {"name": "end_range", "kind": "Number"},
+            ],
+        },
+        {
+            "name": "ArtifactDefinition",
+            "namespace": "Core",
+            "display_labels": ["name__value"],
+            "human_friendly_id": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text", "unique": True},
+                {"name": "artifact_name", "kind": "Text"},
+                {"name": "description", "kind": "Text", "optional": True},
+                {"name": "parameters", "kind": "JSON", "optional": True},
+                {"name": "content_type", "kind": "Text"},
+            ],
+        },
+        {
+            "name": "Artifact",
+            "namespace": "Core",
+            "display_labels": ["name__value"],
+            "attributes": [
+                {"name": "name", "kind": "Text"},
+                {"name": "status", "kind": "Text", "optional": True},
+                {"name": "content_type", "kind": "Text", "optional": True},
+                {"name": "checksum", "kind": "Text", "optional": True},
+                {"name": "storage_id", "kind": "Text", "optional": True},
+                {"name": "parameters", "kind": "JSON", "optional": True},
+            ],
+            "relationships": [
+                {"name": "object", "peer": "CoreArtifactTarget", "identifier": "artifact__node", "cardinality": "one", "kind": "Attribute"},
+                {
+                    "name": "definition",
+                    "peer": "CoreArtifactDefinition",
+                    "identifier": "artifact__artifact_definition",
+                    "cardinality": "one",
+                    "kind": "Attribute",
+                },
+            ],
+        },
+    ],
+}
+
+
+class OfflineError(Exception):
+    """Error returned to the client in the `errors` of the GraphQL response."""
+
+
+def utcnow() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@lru_cache(maxsize=256)
+def parse_query(query: str) -> DocumentNode:
+    """The stored queries and the queries of client.filters are sent again and again, the mutations rarely."""
+    return parse(query, no_location=True)
+
+
+def default_identifier(kind: str, peer: str) -> str:
+    """Identifier Infrahub gives to a relationship without one, both sides compute the same."""
+    return "__".join(sorted([kind.lower(), peer.lower()]))
+
+
+class OfflineSchema:
+    """Schema of the models/ files and of the part of the core schema they use, with the inheritance resolved."""
+
+    def __init__(self, documents: Iterable[Dict[str, Any]]) -> None:
+        self.definitions: Dict[str, Dict[str, Any]] = {}
+        self.generics: Set[str] = set()
+        extensions: List[Dict[str, Any]] = []
+        for document in documents:
+            for is_generic, key in ((True, "generics"), (False, "nodes")):
+                for definition in document.get(key) or []:
+                    kind = f"{definition['namespace']}{definition['name']}"
+                    self.definitions[kind] = self._normalize(kind=kind, definition=definition)
+                    if is_generic:
+                        self.generics.add(kind)
+            extensions.extend((document.get("extensions") or {}).get("nodes") or [])
+
+        for extension in extensions:
+            definition = self.definitions[extension["kind"]]
+            normalized = self._normalize(kind=extension["kind"], definition=extension)
+            definition["attributes"].extend(normalized["attributes"])
+            definition["relationships"].extend(normalized["relationships"])
+
+        for kind, definition in self.definitions.items():
+            if kind != "CoreNode" and "CoreNode" not in definition["inherit_from"]:
+                definition["inherit_from"].append("CoreNode")
+        for kind in self.definitions:
+            self._inherit(kind)
+
+        self.attributes = {kind: {item["name"]: item for item in d["attributes"]} for kind, d in self.definitions.items()}
+        self.relationships = {kind: {item["name"]: item for item in d["relationships"]} for kind, d in self.definitions.items()}
+
+    @classmethod
+    def from_directory(cls, directory: Path = MODELS_DIRECTORY) -> "OfflineSchema":
+        documents = [CORE_SCHEMA] + [yaml.safe_load(path.read_text()) for path in sorted(directory.glob("**/*.yml"))]
+        return cls(documents=documents)
+
+    @staticmethod
+    def _normalize(kind: str, definition: Dict[str, Any]) -> Dict[str, Any]:
+        normalized = {key: value for key, value in definition.items() if key not in ("parent", "children")}
+        normalized["attributes"] = [dict(item) for item in definition.get("attributes") or []]
+        normalized["relationships"] = [dict(item) for item in definition.get("relationships") or []]
+        normalized["inherit_from"] = list(definition.get("inherit_from") or [])
+        for relationship in normalized["relationships"]:
+            relationship.setdefault("identifier", default_identifier(kind, relationship["peer"]))
+            relationship.setdefault("cardinality", "many")
+            relationship.setdefault("optional", True)
+        if definition.get("parent"):
+            normalized["relationships"].append(
+                {"name": "parent", "peer": definition["parent"], "identifier": "parent__child", "cardinality": "one", "kind": "Hierarchy", "optional": True}
+            )
+        if definition.get("children"):
+            normalized["relationships"].append(
+                {"name": "children", "peer": definition["children"], "identifier": "parent__child", "cardinality": "many", "kind": "Hierarchy", "optional": True}
+            )
+        return normalized
+
+    def _inherit(self, kind: str) -> None:
+        definition = self.definitions[kind]
+        for generic in definition["inherit_from"]:
+            parent = self.definitions.get(generic)
+            if not parent:
+                continue
+            for key in ("attributes", "relationships"):
+                names = {item["name"] for item in definition[key]}
+                for item in parent[key]:
+                    if item["name"] in names:
+                        continue
+                    definition[key].append({**item, "inherited": True})
+            for key in ("human_friendly_id", "default_filter", "display_labels"):
+                if not definition.get(key) and parent.get(key):
+                    definition[key] = list(parent[key]) if isinstance(parent[key], list) else parent[key]
+
+    def lineage(self, kind: str) -> List[str]:
+        return [kind] + self.definitions[kind]["inherit_from"]
+
+    def is_a(self, kind: str, other: str) -> bool:
+        return kind == other or other in self.definitions.get(kind, {}).get("inherit_from", [])
+
+    def get(self, kind: str) -> Dict[str, Any]:
+        if kind not in self.definitions:
+            raise OfflineError(f"Unknown kind {kind}")
+        return self.definitions[kind]
+
+    def reverse(self, kind: str, relationship: Dict[str, Any], peer_kind: str) -> Optional[Dict[str, Any]]:
+        """Relationship of the peer sharing the identifier of a relationship, None when it is one-sided."""
+        candidates = [
+            item
+            for item in self.relationships.get(peer_kind, {}).values()
+            if item["identifier"] == relationship["identifier"] and self.is_a(kind, item["peer"])
+        ]
+        preferred = [item for item in candidates if item["name"] != relationship["name"]]
+        return (preferred or candidates or [None])[0]
+
+    def to_api(self) -> Dict[str, Any]:
+        """Payload of /api/schema."""
+        nodes, generics = [], []
+        for kind, definition in self.definitions.items():
+            if kind in self.generics:
+                used_by = [other for other, item in self.definitions.items() if kind in item["inherit_from"]]
+                generics.append({**definition, "used_by": used_by})
+            else:
+                nodes.append(definition)
+        payload = {"nodes": nodes, "generics": generics, "profiles": []}
+        payload["main"] = hashlib.md5(json.dumps(payload, sort_keys=True, default=str).encode(), usedforsecurity=False).hexdigest()
+        return payload
+
+
+@dataclass
+class StoredNode:
+    id: str
+    kind: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    relationships: Dict[str, List[str]] = field(default_factory=dict)
+    updated_at: str = field(default_factory=utcnow)
+
+
+@dataclass
+class Context:
+    fragments: Dict[str, FragmentDefinitionNode]
+    variables: Dict[str, Any]
+
+
+class OfflineInfrahub:
+    """In-memory stand-in of an Infrahub server for the SDK, to run the loader, the checks and the transforms
+    without the docker compose stack.
+
+    It answers the GraphQL queries and mutations the SDK generates (queries of a kind with their filters and
+    pagination, Create/Upsert/Update/Delete, RelationshipAdd/Remove and the allocation of IP addresses from
+    a pool), the stored queries of .infrahub.yml, the schema with its hash and the object store. All the branches
+    share the same graph and the permissions aren't enforced, a schema load only changes the hash.
+    """
+
+    def __init__(self, schema: Optional[OfflineSchema] = None, repository: Path = REPOSITORY_ROOT) -> None:
+        self.schema = schema or OfflineSchema.from_directory()
+        self.nodes: Dict[str, StoredNode] = {}
+        self.by_kind: Dict[str, Dict[str, StoredNode]] = defaultdict(dict)
+        self.index: Dict[Tuple[str, str], Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        self.prefixes: Dict[Tuple[Optional[str], str], str] = {}
+        self.addresses: Dict[Tuple[Optional[str], str], str] = {}
+        self.allocations: Dict[Tuple[str, str], str] = {}
+        self.objects: Dict[str, str] = {}
+        # The loaded schemas are only tracked by their hash, the graph keeps the schema of models/
+        self._schema_hash: Optional[str] = None
+        self.stats: Counter = Counter()
+        self.queries = self._load_queries(repository)
+        self.create(kind="IpamNamespace", data={"name": DEFAULT_NAMESPACE, "default": True})
+
+    @staticmethod
+    def _load_queries(repository: Path) -> Dict[str, str]:
+        config_path = repository / ".infrahub.yml"
+        if not config_path.exists():
+            return {}
+        config = yaml.safe_load(config_path.read_text()) or {}
+        return {query["name"]: (repository / query["file_path"]).read_text() for query in config.get("queries") or []}
+
+    # Storage
+    def _index(self, node: StoredNode, add: bool = True) -> None:
+        for kind in self.schema.lineage(node.kind):
+            for name, value in node.attributes.items():
+                bucket = self.index[(kind, name)][str(value)]
+                bucket.add(node.id) if add else bucket.discard(node.id)
+            if add:
+                self.by_kind[kind][node.id] = node
+            else:
+                self.by_kind[kind].pop(node.id, None)
+        namespace = (node.relationships.get("ip_namespace") or [None])[0]
+        if self.schema.is_a(node.kind, "BuiltinIPPrefix"):
+            key = (namespace, str(ipaddress.ip_network(node.attributes["prefix"], strict=False)))
+            if add:
+                self.prefixes[key] = node.id
+            else:
+                self.prefixes.pop(key, None)
+        if self.schema.is_a(node.kind, "BuiltinIPAddress"):
+            key = (namespace, str(ipaddress.ip_interface(node.attributes["address"]).ip))
+            if add:
+                self.addresses[key] = node.id
+            else:
+                self.addresses.pop(key, None)
+
+    def default_namespace(self) -> Optional[str]:
+        ids = self.index[("IpamNamespace", "name")].get(DEFAULT_NAMESPACE)
+        return next(iter(ids)) if ids else None
+
+    def get_node(self, node_id: str) -> StoredNode:
+        if node_id not in self.nodes:
+            raise OfflineError(f"Unable to find the node {node_id}")
+        return self.nodes[node_id]
+
+    def find(self, kind: str, reference: Any) -> StoredNode:
+        """Node from a reference of the mutations, {"id": ...} or {"hfid": [...]}."""
+        if isinstance(reference, dict) and reference.get("id"):
+            return self.get_node(reference["id"])
+        if isinstance(reference, str):
+            return self.get_node(reference)
+        hfid = reference.get("hfid") if isinstance(reference, dict) else None
+        if hfid:
+            for node in self.by_kind.get(kind, {}).values():
+                if self.hfid(node) == [str(value) for value in hfid]:
+                    return node
+        raise OfflineError(f"Unable to find the {kind} {reference}")
+
+    def create(self, kind: str, data: Dict[str, Any]) -> StoredNode:
+        definition = self.schema.get(kind)
+        if kind in self.schema.generics:
+            raise OfflineError(f"{kind} is a generic and can't be instantiated")
+        node = StoredNode(id=str(uuid.uuid4()), kind=kind)
+        for name, attribute in self.schema.attributes[kind].items():
+            if attribute.get("default_value") is not None:
+                node.attributes[name] = attribute["default_value"]
+        self._apply(node=node, data=data)
+        for name, attribute in self.schema.attributes[kind].items():
+            if node.attributes.get(name) is None and not attribute.get("optional", False):
+                raise OfflineError(f"{name} is mandatory for {kind}")
+        if self.schema.is_a(kind, "BuiltinIPPrefix") or self.schema.is_a(kind, "BuiltinIPAddress"):
+            node.relationships.setdefault("ip_namespace", [self.default_namespace()] if self.default_namespace() else [])
+        self._check_unique(node)
+        self.nodes[node.id] = node
+        self._index(node)
+        for name, peer_ids in list(node.relationships.items()):
+            self._link(node=node, relationship=self.schema.relationships[kind][name], peer_ids=peer_ids, previous=[])
+        self.stats[f"create:{definition['namespace']}{definition['name']}"] += 1
+        return node
+
+    def update(self, node: StoredNode, data: Dict[str, Any]) -> StoredNode:
+        self._index(node, add=False)
+        previous = {name: list(peer_ids) for name, peer_ids in node.relationships.items()}
+        self._apply(node=node, data=data)
+        self._check_unique(node)
+        self._index(node)
+        for name, peer_ids in node.relationships.items():
+            if previous.get(name, []) != peer_ids:
+                self._link(
+                    node=node, relationship=self.schema.relationships[node.kind][name], peer_ids=peer_ids, previous=previous.get(name, [])
+                )
+        node.updated_at = utcnow()
+        self.stats[f"update:{node.kind}"] += 1
+        return node
+
+    def delete(self, node: StoredNode) -> None:
+        for name, peer_ids in list(node.relationships.items()):
+            self._link(node=node, relationship=self.schema.relationships[node.kind][name], peer_ids=[], previous=peer_ids)
+        self._index(node, add=False)
+        del self.nodes[node.id]
+        self.stats[f"delete:{node.kind}"] += 1
+
+    def upsert(self, kind: str, data: Dict[str, Any]) -> StoredNode:
+        existing = self._existing(kind=kind, data=data)
+        return self.update(existing, data) if existing else self.create(kind=kind, data=data)
+
+    def _existing(self, kind: str, data: Dict[str, Any]) -> Optional[StoredNode]:
+        if data.get("id") or data.get("hfid"):
+            try:
+                return self.find(kind, data)
+            except OfflineError:
+                return None
+        for name, attribute in self.schema.attributes[kind].items():
+            value = self._attribute_value(data.get(name))
+            if attribute.get("unique") and value is not None:
+                ids = self.index[(kind, name)].get(str(value))
+                if ids:
+                    return self.nodes[next(iter(ids))]
+        return None
+
+    def _check_unique(self, node: StoredNode) -> None:
+        for name, attribute in self.schema.attributes[node.kind].items():
+            if not attribute.get("unique") or node.attributes.get(name) is None:
+                continue
+            kind = next(kind for kind in reversed(self.schema.lineage(node.kind)) if name in self.schema.attributes.get(kind, {}))
+            others = self.index[(kind, name)].get(str(node.attributes[name]), set()) - {node.id}
+            if others:
+                raise OfflineError(f"An object already exist with this value: {name}: {node.attributes[name]}")
+
+    @staticmethod
+    def _attribute_value(value: Any) -> Any:
+        return value.get("value") if isinstance(value, dict) else value
+
+    def _apply(self, node: StoredNode, data: Dict[str, Any]) -> None:
+        attributes = self.schema.attributes[node.kind]
+        relationships = self.schema.relationships[node.kind]
+        for name, value in data.items():
+            if name in ("id", "hfid") or name.startswith("_relation__"):
+                continue
+            if name in attributes:
+                if isinstance(value, dict) and "from_pool" in value:
+                    raise OfflineError(f"Allocating {name} from a number pool isn't supported offline")
+                node.attributes[name] = self._attribute_value(value)
+            elif name in relationships:
+                relationship = relationships[name]
+                if relationship.get("read_only"):
+                    raise OfflineError(f"{name} is read-only")
+                references = value if isinstance(value, list) else [value] if value else []
+                peer_ids = []
+                for reference in references:
+                    if isinstance(reference, dict) and "from_pool" in reference:
+                        peer_ids.append(self.allocate_address(pool_id=reference["from_pool"]["id"], identifier=None)["id"])
+                    elif reference and (not isinstance(reference, dict) or reference.get("id") or reference.get("hfid")):
+                        peer_ids.append(self.find(relationship["peer"], reference).id)
+                node.relationships[name] = peer_ids
+            else:
+                raise OfflineError(f"{name} is not a valid input for {node.kind}")
+
+    def _link(self, node: StoredNode, relationship: Dict[str, Any], peer_ids: List[str], previous: List[str]) -> None:
+        """Keep the other side of a relationship in sync with the peers given on one side."""
+        for peer_id in set(previous) - set(peer_ids):
+            peer = self.nodes.get(peer_id)
+            reverse = self.schema.reverse(node.kind, relationship, peer.kind) if peer else None
+            if peer and reverse:
+                peer.relationships[reverse["name"]] = [item for item in peer.relationships.get(reverse["name"], []) if item != node.id]
+        for peer_id in peer_ids:
+            if peer_id in previous:
+                continue
+            peer = self.get_node(peer_id)
+            reverse = self.schema.reverse(node.kind, relationship, peer.kind)
+            if not reverse:
+                continue
+            current = peer.relationships.get(reverse["name"], [])
+            if node.id in current:
+                continue
+            if reverse["cardinality"] == "one":
+                for old_id in current:
+                    old = self.nodes.get(old_id)
+                    if old:
+                        old.relationships[relationship["name"]] = [
+                            item for item in old.relationships.get(relationship["name"], []) if item != peer_id
+                        ]
+                peer.relationships[reverse["name"]] = [node.id]
+            else:
+                peer.relationships[reverse["name"]] = current + [node.id]
+
+    # IPAM
+    def _containing_prefix(self, namespace: Optional[str], network: Any, strict: bool = False) -> Optional[str]:
+        """Most specific prefix containing an address or a network, excluding the network itself when strict."""
+        start = network.prefixlen - 1 if strict else network.max_prefixlen
+        for prefixlen in range(start, -1, -1):
+            candidate = network.supernet(new_prefix=prefixlen) if prefixlen < network.prefixlen else ipaddress.ip_network(
+                (network.network_address, prefixlen), strict=False
+            )
+            prefix_id = self.prefixes.get((namespace, str(candidate)))
+            if prefix_id:
+                return prefix_id
+        return None
+
+    def computed_peers(self, node: StoredNode, name: str) -> Optional[List[str]]:
+        """Peers of the relationships Infrahub maintains itself from the IP addresses and prefixes."""
+        namespace = (node.relationships.get("ip_namespace") or [None])[0]
+        if self.schema.is_a(node.kind, "BuiltinIPAddress") and name == "ip_prefix":
+            address = ipaddress.ip_interface(node.attributes["address"]).ip
+            prefix_id = self._containing_prefix(namespace, ipaddress.ip_network(address))
+            return [prefix_id] if prefix_id else []
+        if self.schema.is_a(node.kind, "BuiltinIPPrefix"):
+            network = ipaddress.ip_network(node.attributes["prefix"], strict=False)
+            if name == "parent":
+                parent_id = self._containing_prefix(namespace, network, strict=True)
+                return [parent_id] if parent_id else []
+            if name == "children":
+                return [
+                    other.id
+                    for other in self.by_kind.get("BuiltinIPPrefix", {}).values()
+                    if other.id != node.id and self.computed_peers(other, "parent") == [node.id]
+                ]
+            if name == "ip_addresses":
+                return [
+                    other.id for other in self.by_kind.get("BuiltinIPAddress", {}).values() if self.computed_peers(other, "ip_prefix") == [node.id]
+                ]
+        return None
+
+    def allocate_address(
+        self, pool_id: str, identifier: Optional[str], prefix_length: Optional[int] = None, data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Next free address of the resources of a CoreIPAddressPool, the same identifier gets the same address."""
+        if identifier and (pool_id, identifier) in self.allocations:
+            node = self.nodes[self.allocations[(pool_id, identifier)]]
+            return {"id": node.id, "kind": node.kind, "identifier": identifier, "display_label": self.display_label(node)}
+
+        pool = self.get_node(pool_id)
+        if pool.kind != "CoreIPAddressPool":
+            raise OfflineError(f"{pool_id} is not a CoreIPAddressPool")
+        namespace = (pool.relationships.get("ip_namespace") or [self.default_namespace()])[0]
+        for resource_id in pool.relationships.get("resources", []):
+            network = ipaddress.ip_network(self.nodes[resource_id].attributes["prefix"], strict=False)
+            length = prefix_length or pool.attributes.get("default_prefix_length") or network.prefixlen
+            hosts = network.hosts() if network.num_addresses > 2 else iter(network)
+            for host in hosts:
+                if (namespace, str(host)) in self.addresses:
+                    continue
+                node = self.create(
+                    kind=pool.attributes.get("default_address_type") or "IpamIPAddress",
+                    data={**(data or {}), "address": f"{host}/{length}", "ip_namespace": {"id": namespace}},
+                )
+                if identifier:
+                    self.allocations[(pool_id, identifier)] = node.id
+                return {"id": node.id, "kind": node.kind, "identifier": identifier, "display_label": self.display_label(node)}
+        raise OfflineError(f"No more resources available in {pool.attributes.get('name')}")
+
+    # Representation
+    def path_value(self, node: StoredNode, path: str) -> Any:
+        """Value of `attr__value` or `relationship__attr__value` for a node."""
+        parts = path.split("__")
+        if parts[0] in node.attributes or parts[0] in self.schema.attributes[node.kind]:
+            return node.attributes.get(parts[0])
+        peers = self.peers(node, parts[0])
+        if not peers or len(parts) < 2:
+            return None
+        return self.path_value(self.nodes[peers[0]], "__".join(parts[1:]))
+
+    def hfid(self, node: StoredNode) -> Optional[List[str]]:
+        paths = self.schema.definitions[node.kind].get("human_friendly_id")
+        if not paths:
+            return None
+        return [str(self.path_value(node, path)) for path in paths]
+
+    def display_label(self, node: StoredNode) -> str:
+        paths = self.schema.definitions[node.kind].get("display_labels")
+        if paths:
+            return " ".join(str(self.path_value(node, path)) for path in paths if self.path_value(node, path) is not None)
+        hfid = self.hfid(node)
+        return " ".join(hfid) if hfid else f"{node.kind}(ID: {node.id})"
+
+    def peers(self, node: StoredNode, name: str) -> List[str]:
+        computed = self.computed_peers(node, name)
+        if computed is not None:
+            return computed
+        return node.relationships.get(name, [])
+
+    # GraphQL
+    def execute(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        try:
+            document = parse_query(query)
+        except GraphQLError as exc:
+            return {"data": None, "errors": [{"message": exc.message}]}
+
+        fragments = {item.name.value: item for item in document.definitions if isinstance(item, FragmentDefinitionNode)}
+        operation = next(item for item in document.definitions if isinstance(item, OperationDefinitionNode))
+        resolved = dict(variables or {})
+        for definition in operation.variable_definitions or []:
+            name = definition.variable.name.value
+            if name not in resolved and definition.default_value is not None:
+                resolved[name] = value_from_ast_untyped(definition.default_value)
+        context = Context(fragments=fragments, variables=resolved)
+
+        data: Dict[str, Any] = {}
+        try:
+            for item in self._collect(operation.selection_set, None, context):
+                key = item.alias.value if item.alias else item.name.value
+                if operation.operation == OperationType.MUTATION:
+                    data[key] = self._mutation(item, context)
+                else:
+                    data[key] = self._root_query(item, context)
+        except OfflineError as exc:
+            return {"data": None, "errors": [{"message": str(exc)}]}
+        return {"data": data}
+
+    def _arguments(self, item: FieldNode, context: Context) -> Dict[str, Any]:
+        arguments = {}
+        for argument in item.arguments or []:
+            value = value_from_ast_untyped(argument.value, context.variables)
+            arguments[argument.name.value] = None if value is Undefined else value
+        return arguments
+
+    def _collect(self, selection_set: Optional[SelectionSetNode], kind: Optional[str], context: Context) -> Iterator[FieldNode]:
+        """Fields of a selection set, the fragments applying to the kind are expanded."""
+        if not selection_set:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = context.fragments[selection.name.value]
+                condition, nested = fragment.type_condition, fragment.selection_set
+            elif isinstance(selection, InlineFragmentNode):
+                condition, nested = selection.type_condition, selection.selection_set
+            else:
+                continue
+            if condition is None or kind is None or self.schema.is_a(kind, condition.name.value):
+                yield from self._collect(nested, kind, context)
+
+    def _root_query(self, item: FieldNode, context: Context) -> Any:
+        name = item.name.value
+        if name == "__typename":
+            return "Query"
+        if name == "Branch":
+            branch = {"id": "main", "name": "main", "is_default": True, "sync_with_git": True, "description": None, "origin_branch": "main", "branched_from": None, "has_schema_changes": False}
+            return [{field.name.value: branch.get(field.name.value) for field in self._collect(item.selection_set, None, context)}]
+        self.schema.get(name)
+        self.stats[f"query:{name}"] += 1
+        arguments = self._arguments(item, context)
+        nodes = self.filter(kind=name, filters=arguments)
+        count = len(nodes)
+        offset = arguments.get("offset") or 0
+        limit = arguments.get("limit")
+        nodes = nodes[offset : offset + limit if limit is not None else None]
+        return self._connection(nodes, count, item.selection_set, context)
+
+    def _connection(self, nodes: List[StoredNode], count: int, selection_set: Optional[SelectionSetNode], context: Context) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for item in self._collect(selection_set, None, context):
+            key = item.alias.value if item.alias else item.name.value
+            if item.name.value == "count":
+                result[key] = count
+            elif item.name.value == "edges":
+                result[key] = [self._edge(node, item.selection_set, context) for node in nodes]
+            else:
+                result[key] = None
+        return result
+
+    def _edge(self, node: Optional[StoredNode], selection_set: Optional[SelectionSetNode], context: Context) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for item in self._collect(selection_set, None, context):
+            key = item.alias.value if item.alias else item.name.value
+            if item.name.value == "node":
+                result[key] = self._node(node, item.selection_set, context) if node else None
+            elif item.name.value == "properties":
+                properties = {"is_protected": False, "is_visible": True, "updated_at": node.updated_at if node else None}
+                result[key] = {field.name.value: properties.get(field.name.value) for field in self._collect(item.selection_set, None, context)}
+            else:
+                result[key] = None
+        return result
+
+    def _node(self, node: StoredNode, selection_set: Optional[SelectionSetNode], context: Context) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        attributes = self.schema.attributes[node.kind]
+        relationships = self.schema.relationships[node.kind]
+        for item in self._collect(selection_set, node.kind, context):
+            name = item.name.value
+            key = item.alias.value if item.alias else name
+            if name == "id":
+                result[key] = node.id
+            elif name == "__typename":
+                result[key] = node.kind
+            elif name == "hfid":
+                result[key] = self.hfid(node)
+            elif name == "display_label":
+                result[key] = self.display_label(node)
+            elif name == "_updated_at":
+                result[key] = node.updated_at
+            elif name in attributes:
+                result[key] = self._attribute(node, attributes[name], item, context)
+            elif name in relationships:
+                peers = [self.nodes[peer_id] for peer_id in self.peers(node, name) if peer_id in self.nodes]
+                if relationships[name]["cardinality"] == "one":
+                    result[key] = self._edge(peers[0] if peers else None, item.selection_set, context)
+                else:
+                    arguments = self._arguments(item, context)
+                    if arguments:
+                        peers = [peer for peer in peers if self.matches(peer, arguments)]
+                    result[key] = self._connection(peers, len(peers), item.selection_set, context)
+            else:
+                result[key] = None
+        return result
+
+    def _attribute(self, node: StoredNode, attribute: Dict[str, Any], item: FieldNode, context: Context) -> Dict[str, Any]:
+        value = node.attributes.get(attribute["name"])
+        fields: Dict[str, Any] = {
+            "id": f"{node.id}:{attribute['name']}",
+            "value": value,
+            "is_default": False,
+            "is_from_profile": False,
+            "is_protected": False,
+            "is_visible": True,
+            "updated_at": node.updated_at,
+            "__typename": f"{attribute['kind']}Attribute",
+        }
+        if value is not None and attribute["kind"] in ("IPHost", "IPNetwork"):
+            interface = ipaddress.ip_interface(value)
+            fields.update(
+                {
+                    "ip": str(interface.ip),
+                    "prefixlen": interface.network.prefixlen,
+                    "netmask": str(interface.netmask),
+                    "hostmask": str(interface.hostmask),
+                    "version": interface.version,
+                    "with_hostmask": interface.with_hostmask,
+                    "with_netmask": interface.with_netmask,
+                    "network_address": str(interface.network.network_address),
+                    "broadcast_address": str(interface.network.broadcast_address),
+                    "num_addresses": interface.network.num_addresses,
+                }
+            )
+        return {field.name.value: fields.get(field.name.value) for field in self._collect(item.selection_set, None, context)}
+
+    # Filters
+    def filter(self, kind: str, filters: Dict[str, Any]) -> List[StoredNode]:
+        candidates: Optional[Iterable[str]] = None
+        if filters.get("ids"):
+            candidates = [node_id for node_id in filters["ids"] if node_id in self.by_kind.get(kind, {})]
+        else:
+            for key, value in filters.items():
+                parts = key.split("__")
+                if len(parts) == 2 and parts[0] in self.schema.attributes[kind] and parts[1] in ("value", "values"):
+                    values = value if parts[1] == "values" else [value]
+                    candidates = {node_id for item in values or [] for node_id in self.index[(kind, parts[0])].get(str(item), set())}
+                    break
+        nodes = list(self.by_kind.get(kind, {}).values()) if candidates is None else [self.nodes[node_id] for node_id in candidates]
+        return sorted((node for node in nodes if self.matches(node, filters)), key=lambda node: self._order(node))
+
+    def _order(self, node: StoredNode) -> Tuple[str, ...]:
+        paths = self.schema.definitions[node.kind].get("order_by") or self.schema.definitions[node.kind].get("human_friendly_id") or []
+        return tuple(str(self.path_value(node, path)) for path in paths) + (node.id,)
+
+    def matches(self, node: StoredNode, filters: Dict[str, Any]) -> bool:
+        for key, expected in filters.items():
+            if key in ("offset", "limit", "partial_match", "order", "include_descendants"):
+                continue
+            if expected is None:
+                continue
+            if key == "ids":
+                if node.id not in expected:
+                    return False
+                continue
+            if key == "hfid":
+                if self.hfid(node) != [str(value) for value in expected]:
+                    return False
+                continue
+            parts = key.split("__")
+            if parts[-1] == "ids" and len(parts) == 2:
+                if not set(self.peers(node, parts[0])) & set(expected):
+                    return False
+                continue
+            if parts[-1] not in ("value", "values") or len(parts) not in (2, 3):
+                raise OfflineError(f"Unsupported filter {key}")
+            allowed = {str(item) for item in expected} if parts[-1] == "values" else {str(expected)}
+            if len(parts) == 2:
+                if parts[0] not in self.schema.attributes[node.kind]:
+                    raise OfflineError(f"Unsupported filter {key}")
+                if str(node.attributes.get(parts[0])) not in allowed:
+                    return False
+            elif not any(str(self.nodes[peer].attributes.get(parts[1])) in allowed for peer in self.peers(node, parts[0]) if peer in self.nodes):
+                return False
+        return True
+
+    # Mutations
+    def _mutation(self, item: FieldNode, context: Context) -> Dict[str, Any]:
+        name = item.name.value
+        arguments = self._arguments(item, context)
+        data = arguments.get("data") or {}
+        self.stats[f"mutation:{name}"] += 1
+
+        if name == ALLOCATION_MUTATION:
+            allocated = self.allocate_address(
+                pool_id=data["id"], identifier=data.get("identifier"), prefix_length=data.get("prefix_length"), data=data.get("data")
+            )
+            return self._mutation_result(item, context, {"ok": True, "node": allocated})
+        if name in ("RelationshipAdd", "RelationshipRemove"):
+            node = self.get_node(data["id"])
+            relationship = self.schema.relationships[node.kind].get(data["name"])
+            if not relationship:
+                raise OfflineError(f"{data['name']} is not a relationship of {node.kind}")
+            current = list(node.relationships.get(data["name"], []))
+            changed = [self.find(relationship["peer"], reference).id for reference in data.get("nodes") or []]
+            if name == "RelationshipAdd":
+                peer_ids = current + [peer_id for peer_id in changed if peer_id not in current]
+            else:
+                peer_ids = [peer_id for peer_id in current if peer_id not in changed]
+            self.update(node, {data["name"]: [{"id": peer_id} for peer_id in peer_ids]})
+            return self._mutation_result(item, context, {"ok": True})
+
+        for suffix in ("Create", "Upsert", "Update", "Delete"):
+            if name.endswith(suffix) and name[: -len(suffix)] in self.schema.definitions:
+                kind = name[: -len(suffix)]
+                break
+        else:
+            raise OfflineError(f"Unsupported mutation {name}")
+
+        if suffix == "Create":
+            node = self.create(kind=kind, data=data)
+        elif suffix == "Upsert":
+            node = self.upsert(kind=kind, data=data)
+        elif suffix == "Update":
+            node = self.update(self.find(kind, data), data)
+        else:
+            node = self.find(kind, data)
+            self.delete(node)
+            return self._mutation_result(item, context, {"ok": True})
+
+        result: Dict[str, Any] = {}
+        for field_item in self._collect(item.selection_set, None, context):
+            key = field_item.alias.value if field_item.alias else field_item.name.value
+            if field_item.name.value == "ok":
+                result[key] = True
+            elif field_item.name.value == "object":
+                result[key] = self._node(node, field_item.selection_set, context)
+            else:
+                result[key] = None
+        return result
+
+    def _mutation_result(self, item: FieldNode, context: Context, values: Dict[str, Any]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for field_item in self._collect(item.selection_set, None, context):
+            key = field_item.alias.value if field_item.alias else field_item.name.value
+            value = values.get(field_item.name.value)
+            if isinstance(value, dict):
+                value = {sub.name.value: value.get(sub.name.value) for sub in self._collect(field_item.selection_set, None, context)}
+            result[key] = value
+        return result
+
+    # REST
+    def schema_hash(self, schemas: Optional[List[Dict[str, Any]]] = None) -> str:
+        if schemas is None and self._schema_hash:
+            return self._schema_hash
+        content = self.schema.to_api() if schemas is None else schemas
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+    def handle(self, method: str, url: str, payload: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+        """Status code and body of a request of the SDK."""
+        parsed = urlparse(url)
+        path = parsed.path.rstrip("/")
+        params = parse_qs(parsed.query)
+        self.stats[f"request:{method}"] += 1
+
+        if path == "/graphql" or path.startswith("/graphql/"):
+            return 200, self.execute(query=(payload or {}).get("query", ""), variables=(payload or {}).get("variables"))
+        if path.startswith("/api/query/"):
+            name = path[len("/api/query/") :]
+            if name not in self.queries:
+                return 404, {"errors": [{"message": f"Unable to find the GraphQLQuery {name}"}]}
+            return 200, self.execute(query=self.queries[name], variables=(payload or {}).get("variables"))
+        if path == "/api/schema":
+            return 200, self.schema.to_api()
+        if path == "/api/schema/summary":
+            return 200, {"main": self.schema_hash(), "nodes": {}, "generics": {}}
+        if path == "/api/schema/load":
+            previous_hash = self.schema_hash()
+            self._schema_hash = self.schema_hash(schemas=(payload or {}).get("schemas", []))
+            return 200, {"hash": self._schema_hash, "previous_hash": previous_hash}
+        if path == "/api/storage/upload/content":
+            content = (payload or {}).get("content", "")
+            identifier = str(uuid.uuid4())
+            self.objects[identifier] = content
+            return 200, {"identifier": identifier, "checksum": hashlib.md5(content.encode(), usedforsecurity=False).hexdigest()}
+        if path.startswith("/api/storage/object/"):
+            identifier = path[len("/api/storage/object/") :]
+            if identifier not in self.objects:
+                return 404, {"errors": [{"message": f"Unable to find the object {identifier}"}]}
+            return 200, self.objects[identifier]
+        return 404, {"errors": [{"message": f"{method} {path} isn't supported offline ({params})"}]}
+
+
+class OfflineRequester:
+    """Requester of the SDK answering from an OfflineInfrahub instead of sending HTTP requests."""
+
+    def __init__(self, backend: OfflineInfrahub) -> None:
+        self.backend = backend
+
+    async def __call__(
+        self, url: str, method: HTTPMethod, headers: Dict[str, Any], timeout: int, payload: Optional[dict] = None
+    ) -> httpx.Response:
+        status_code, body = self.backend.handle(method=method.value, url=url, payload=payload)
+        request = httpx.Request(method=method.value, url=url)
+        if isinstance(body, str):
+            return httpx.Response(status_code=status_code, text=body, request=request)
+        return httpx.Response(status_code=status_code, json=body, request=request)
+
+
+def offline_client(backend: Optional[OfflineInfrahub] = None, **config: Any) -> InfrahubClient:
+    """InfrahubClient backed by an in-memory OfflineInfrahub, `config` is passed to the SDK Config."""
+    backend = backend or OfflineInfrahub()
+    return InfrahubClient(config=Config(address=OFFLINE_ADDRESS, requester=OfflineRequester(backend), **config))
+
+
+@lru_cache(maxsize=None)
+def init_data_module() -> ModuleType:
+    """scripts/init_data.py, it isn't part of a package and is loaded from its file like infrahubctl run does."""
+    spec = importlib.util.spec_from_file_location("init_data", REPOSITORY_ROOT / "scripts" / "init_data.py")
+    module = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
+    spec.loader.exec_module(module)  # type: ignore[union-attr]
+    return module
+
+
+async def run_demo(
+    client: InfrahubClient, log: logging.Logger, branch: str = "main", output: Optional[Path] = None, **kwargs: Any
+) -> Dict[str, Any]:
+    """Load the demo data, run the check and render the artifacts of every LB and frontend, timing each step.
+
+    `kwargs` are the options of init_data (concurrency, incremental, source, ...), the artifacts are written
+    to `output` when given.
+    """
+    from checks.validate_lb_and_vip import InfrahubCheckLBVIPBackendLocationEnvironment
+
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    await init_data_module().run(client=client, log=log, branch=branch, **kwargs)
+    timings["load_data"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    check = InfrahubCheckLBVIPBackendLocationEnvironment(branch=branch, client=client, root_directory=str(REPOSITORY_ROOT))
+    await check.run()
+    timings["check"] = time.perf_counter() - start
+
+    renders: List[Tuple[str, str, Callable[[Dict[str, Any]], str]]] = [
+        ("ServerLoadBalancer", "lb_vip", render_haproxy),
+        ("ServerLoadBalancer", "lb_vip", render_bird),
+        ("ServerFrontend", "frontend_vip", render_nginx),
+    ]
+    artifacts: Dict[str, str] = {}
+    start = time.perf_counter()
+    for kind, query, render in renders:
+        for node in await client.all(kind=kind, branch=branch, populate_store=False):
+            hostname = node.hostname.value
+            response = await client.query_gql_query(name=query, branch_name=branch, variables={"hostname": hostname})
+            artifacts[f"{hostname}/{render.__name__[len('render_'):]}"] = render(response.get("data") or response)
+    timings["render"] = time.perf_counter() - start
+
+    if output:
+        for name, content in artifacts.items():
+            path = output / f"{name}.conf"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+
+    return {
+        "timings": timings,
+        "check": {"passed": check.passed, "errors": len(check.errors)},
+        "artifacts": len(artifacts),
+    }
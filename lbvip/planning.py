@@ -0,0 +1,192 @@
+import logging
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from infrahub_sdk import InfrahubClient
+
+from lbvip.ipam import PrefixIndex
+from lbvip.iparray import PrefixArray
+
+
+class AllocationPlanError(ValueError):
+    def __init__(self, errors: List[str]) -> None:
+        self.errors = errors
+        super().__init__("The IP address pools can't satisfy the load: " + "; ".join(errors))
+
+
+class AddressRequest(NamedTuple):
+    """An object asking a pool for the address of one of its relationships, identified like the allocation."""
+
+    kind: str
+    reference_attribute: str
+    identifier: str
+    relationship: str
+
+
+@dataclass
+class PoolPlan:
+    pool_name: str
+    prefix: str
+    capacity: int = 0
+    used: int = 0
+    requests: Set[AddressRequest] = field(default_factory=set)
+    satisfied: Set[AddressRequest] = field(default_factory=set)
+
+    @property
+    def needed(self) -> int:
+        """Addresses to allocate, the objects already holding one get the same address back."""
+        return len(self.requests - self.satisfied)
+
+    @property
+    def free(self) -> int:
+        return max(self.capacity - self.used, 0)
+
+
+class AllocationPlanner:
+    """Checks that the CoreIPAddressPools of the loader can allocate every address of a load before anything is written.
+
+    The requests of the load are registered per pool name, then `check()` fetches in a few queries the
+    prefixes backing the pools with their IP addresses, the gateways already created and the objects
+    already holding an address, and compares the remaining demand of each pool with its free addresses.
+    The prefixes of the index are checked for duplicates and for address pools nested in each other too.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        log: logging.Logger,
+        branch: str,
+        prefix_index: PrefixIndex,
+        reserved: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.client = client
+        self.log = log
+        self.branch = branch
+        self.prefix_index = prefix_index
+        # Addresses the loader creates itself in the prefixes before the allocations, the gateways
+        self.reserved = reserved or {}
+        self.pools: Dict[str, PoolPlan] = {}
+        self.unplanned: Dict[str, int] = defaultdict(int)
+
+    def add(
+        self, pool_name: str, kind: str, identifier: str, relationship: str, reference_attribute: str = "hostname"
+    ) -> None:
+        entry = self.prefix_index.by_pool_name.get(pool_name)
+        if entry is None:
+            # A pool the loader doesn't create, its prefix is unknown
+            self.unplanned[pool_name] += 1
+            return
+        if pool_name not in self.pools:
+            self.pools[pool_name] = PoolPlan(pool_name=pool_name, prefix=entry.prefix)
+        self.pools[pool_name].requests.add(
+            AddressRequest(kind=kind, reference_attribute=reference_attribute, identifier=identifier, relationship=relationship)
+        )
+
+    def overlaps(self) -> List[str]:
+        """Prefixes listed twice and address pools overlapping another address pool."""
+        errors = []
+        prefixes = self.prefix_index.prefixes
+        array = self.prefix_index.array
+        duplicates = set(array.duplicates().tolist())
+        for index in sorted(duplicates):
+            errors.append(f"{prefixes[index]['prefix']} is listed more than once")
+        outer, inner = array.overlaps()
+        for outer_index, inner_index in zip(outer.tolist(), inner.tolist()):
+            # The copies of a prefix have its first occurrence as parent, they are already reported
+            if prefixes[outer_index]["role"] == "supernet" or inner_index in duplicates:
+                continue
+            errors.append(
+                f"{prefixes[inner_index]['prefix']} ({prefixes[inner_index]['role']}) overlaps the address pool "
+                f"{prefixes[outer_index]['prefix']} ({prefixes[outer_index]['role']})"
+            )
+        return errors
+
+    async def _fetch_usage(self) -> None:
+        """Addresses already used in the prefix of each pool, the gateways not created yet included."""
+        plans = {plan.prefix: plan for plan in self.pools.values()}
+        prefixes = await self.client.filters(
+            kind="IpamIPPrefix",
+            branch=self.branch,
+            populate_store=False,
+            prefix__values=sorted(plans),
+            include=["ip_addresses"],
+        )
+        existing = {str(prefix.prefix.value): len(prefix.ip_addresses.peers) for prefix in prefixes}
+
+        gateways = {prefix: address for prefix, address in self.reserved.items() if prefix in plans}
+        created_gateways: Set[str] = set()
+        if gateways:
+            addresses = await self.client.filters(
+                kind="IpamIPAddress",
+                branch=self.branch,
+                populate_store=False,
+                address__values=sorted(set(gateways.values())),
+            )
+            created_gateways = {str(address.address.value) for address in addresses}
+
+        for prefix, plan in plans.items():
+            plan.used = existing.get(prefix, 0)
+            if prefix in gateways and gateways[prefix] not in created_gateways:
+                plan.used += 1
+
+    async def _fetch_satisfied(self) -> None:
+        """Requests of the objects that already exist with an address, a re-run allocates nothing for them."""
+        identifiers: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        relationships: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        for plan in self.pools.values():
+            for request in plan.requests:
+                identifiers[(request.kind, request.reference_attribute)].add(request.identifier)
+                relationships[(request.kind, request.reference_attribute)].add(request.relationship)
+
+        holding: Set[Tuple[str, str, str]] = set()
+        for (kind, attribute), values in identifiers.items():
+            nodes = await self.client.filters(
+                kind=kind, branch=self.branch, populate_store=False, **{f"{attribute}__values": sorted(values)}
+            )
+            for node in nodes:
+                for relationship in relationships[(kind, attribute)]:
+                    related = getattr(node, relationship, None)
+                    if getattr(related, "id", None):
+                        holding.add((kind, str(getattr(node, attribute).value), relationship))
+
+        for plan in self.pools.values():
+            plan.satisfied = {
+                request for request in plan.requests if (request.kind, request.identifier, request.relationship) in holding
+            }
+
+    async def check(self) -> Dict[str, PoolPlan]:
+        """Raise an AllocationPlanError listing the overlapping prefixes and the pools that would run out."""
+        errors = self.overlaps()
+        if self.pools:
+            array = PrefixArray.from_strings(plan.prefix for plan in self.pools.values())
+            for plan, capacity in zip(self.pools.values(), array.capacities().tolist()):
+                plan.capacity = int(min(capacity, 2**63 - 1))
+            await self._fetch_usage()
+            await self._fetch_satisfied()
+
+        for pool_name, count in sorted(self.unplanned.items()):
+            self.log.info(f"- {pool_name}: {count} addresses requested from a pool the loader doesn't create, not planned")
+        for plan in sorted(self.pools.values(), key=lambda plan: plan.pool_name):
+            self.log.info(
+                f"- {plan.pool_name}: {plan.needed} addresses needed, {plan.free} free of {plan.capacity} ({plan.used} used)"
+            )
+            if plan.needed > plan.free:
+                errors.append(
+                    f"{plan.pool_name} ({plan.prefix}) needs {plan.needed} addresses but only {plan.free} are free"
+                )
+
+        if errors:
+            raise AllocationPlanError(errors=errors)
+        return self.pools
+
+    def add_many(self, requests: Iterable[Tuple[str, AddressRequest]]) -> None:
+        for pool_name, request in requests:
+            self.add(
+                pool_name=pool_name,
+                kind=request.kind,
+                identifier=request.identifier,
+                relationship=request.relationship,
+                reference_attribute=request.reference_attribute,
+            )
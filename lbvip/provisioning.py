@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from infrahub_sdk.topological_sort import topological_sort
+
+DEFAULT_CONCURRENCY = 10
+
+
+@dataclass
+class ProvisioningStep:
+    key: str
+    phase: str
+    task: Callable[..., Awaitable[Any]]
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PhaseTiming:
+    """Steps of a phase, `duration` is the time spent in them and `wall` the time from the first start to the last end."""
+
+    phase: str
+    tasks: int = 0
+    duration: float = 0.0
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def wall(self) -> float:
+        return self.finished - self.started
+
+    def record(self, started: float, finished: float) -> None:
+        self.started = min(self.started, started) if self.tasks else started
+        self.finished = max(self.finished, finished)
+        self.tasks += 1
+        self.duration += finished - started
+
+
+class ProvisioningGraph:
+    """Dependency graph of provisioning steps, each one started as soon as its own dependencies are done.
+
+    Independent work runs concurrently, at most `concurrency` steps at a time, and only true
+    dependencies (object -> IP allocation -> relationship) are serialized: a step never waits for
+    the unrelated steps of another site.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        self.concurrency = concurrency
+        self.steps: Dict[str, ProvisioningStep] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, PhaseTiming] = {}
+
+    def add(
+        self,
+        key: str,
+        phase: str,
+        task: Callable[..., Awaitable[Any]],
+        depends_on: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        if key in self.steps:
+            raise ValueError(f"A provisioning step with the key '{key}' already exists")
+        self.steps[key] = ProvisioningStep(key=key, phase=phase, task=task, kwargs=kwargs, depends_on=depends_on or [])
+
+    def levels(self) -> List[List[ProvisioningStep]]:
+        missing = {dep for step in self.steps.values() for dep in step.depends_on if dep not in self.steps}
+        if missing:
+            raise ValueError(f"Unknown provisioning dependencies: {', '.join(sorted(missing))}")
+
+        ordered = topological_sort({key: step.depends_on for key, step in self.steps.items()})
+        return [[self.steps[key] for key in sorted(level)] for level in ordered]
+
+    async def execute(self, log: logging.Logger) -> List[PhaseTiming]:
+        # Rejects the unknown dependencies and the cycles before anything runs
+        order = [step for level in self.levels() for step in level]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: Dict[str, "asyncio.Task[None]"] = {}
+
+        async def run(step: ProvisioningStep) -> None:
+            for dependency in step.depends_on:
+                await tasks[dependency]
+            async with semaphore:
+                start = time.perf_counter()
+                self.results[step.key] = await step.task(**step.kwargs)
+                finished = time.perf_counter()
+            self.timings.setdefault(step.phase, PhaseTiming(phase=step.phase)).record(started=start, finished=finished)
+
+        for step in order:
+            tasks[step.key] = asyncio.create_task(run(step))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        for timing in self.timings.values():
+            log.info(
+                f"- {timing.phase}: {timing.tasks} tasks, {timing.duration:.2f}s of work within {timing.wall:.2f}s"
+            )
+        return list(self.timings.values())
+
+    def phase_durations(self) -> Dict[str, float]:
+        """Time spent in the steps of each phase."""
+        return {phase: timing.duration for phase, timing in self.timings.items()}
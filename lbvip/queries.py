@@ -0,0 +1,178 @@
+import asyncio
+import json
+import re
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from graphql import FragmentDefinitionNode, FragmentSpreadNode, Visitor, parse, visit
+from infrahub_sdk import InfrahubClient
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+FRAGMENTS_FILE = REPOSITORY_ROOT / "transforms" / "fragments.gql"
+QUERY_FILES = (
+    REPOSITORY_ROOT / "transforms" / "lb_vip.gql",
+    REPOSITORY_ROOT / "transforms" / "frontend_vip.gql",
+    REPOSITORY_ROOT / "checks" / "lb_and_vip_env.gql",
+    REPOSITORY_ROOT / "checks" / "lb_and_vip_env_page.gql",
+    REPOSITORY_ROOT / "checks" / "lb_and_vip_env_vips.gql",
+)
+
+DEFAULT_MAX_ENTRIES = 1024
+
+CacheKey = Tuple[str, Optional[str], str, str]
+
+
+class _SpreadCollector(Visitor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.names: List[str] = []
+
+    def enter_fragment_spread(self, node: FragmentSpreadNode, *args: Any) -> None:
+        if node.name.value not in self.names:
+            self.names.append(node.name.value)
+
+
+def split_document(text: str) -> Tuple[str, Dict[str, str]]:
+    """Split a GraphQL document into its operations and the source of its fragment definitions."""
+    document = parse(text)
+    fragments: Dict[str, str] = {}
+    spans = []
+    for definition in document.definitions:
+        if isinstance(definition, FragmentDefinitionNode):
+            fragments[definition.name.value] = text[definition.loc.start : definition.loc.end]
+            spans.append((definition.loc.start, definition.loc.end))
+
+    operations = text
+    for start, end in reversed(spans):
+        operations = operations[:start] + operations[end:]
+    # Drop the comments and blank lines left between the removed fragments
+    operations = re.sub(r"(\n\s*(#[^\n]*)?)+$", "", operations.rstrip())
+    return operations + "\n", fragments
+
+
+def fragment_spreads(text: str) -> List[str]:
+    collector = _SpreadCollector()
+    visit(parse(text), collector)
+    return collector.names
+
+
+def used_fragments(operations: str, fragments: Dict[str, str]) -> List[str]:
+    """Names of the fragments an operation depends on, including the nested ones, in the order of `fragments`."""
+    used = set()
+    pending = fragment_spreads(operations)
+    while pending:
+        name = pending.pop()
+        if name in used:
+            continue
+        if name not in fragments:
+            raise ValueError(f"Unknown fragment {name!r}")
+        used.add(name)
+        pending.extend(fragment_spreads(fragments[name]))
+    return [name for name in fragments if name in used]
+
+
+def with_fragments(text: str, fragments: Dict[str, str]) -> str:
+    """Query document with the shared fragments it uses appended, replacing the ones already present."""
+    operations, _ = split_document(text)
+    definitions = [fragments[name] for name in used_fragments(operations, fragments)]
+    return "\n".join([operations] + [f"{definition}\n" for definition in definitions])
+
+
+def load_fragments(path: Path = FRAGMENTS_FILE) -> Dict[str, str]:
+    _, fragments = split_document(path.read_text())
+    return fragments
+
+
+def sync_query_file(path: Path, fragments: Dict[str, str], check: bool = False) -> bool:
+    """Copy the shared fragments into a stored query file, returns True when the file was out of date."""
+    current = path.read_text()
+    expected = with_fragments(current, fragments)
+    if current == expected:
+        return False
+    if not check:
+        path.write_text(expected)
+    return True
+
+
+async def repository_commit(client: InfrahubClient, branch: Optional[str] = None) -> str:
+    """Commit(s) of the repositories of a branch, the transforms and queries change with them."""
+    repositories = await client.all(kind="CoreGenericRepository", branch=branch, populate_store=False)
+    return ",".join(sorted(str(repository.commit.value) for repository in repositories))
+
+
+class QueryCache:
+    """Per run cache of the stored query results, keyed by branch, repository commit, query and variables.
+
+    Transforms rendering the same host share one request per query, concurrent requests for the
+    same key wait for the first one. The least recently used entries are evicted beyond
+    `max_entries` and everything is dropped when the commit changes.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        branch: Optional[str] = None,
+        commit: Optional[str] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        self.client = client
+        self.branch = branch
+        self.commit = commit
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[CacheKey, "asyncio.Future[Dict[str, Any]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, name: str, variables: Optional[Dict[str, Any]] = None) -> CacheKey:
+        return (self.branch or "", self.commit, name, json.dumps(variables or {}, sort_keys=True, default=str))
+
+    async def refresh(self) -> None:
+        """Fetch the current commit of the branch, the cache is invalidated if it moved."""
+        commit = await repository_commit(client=self.client, branch=self.branch)
+        if commit != self.commit:
+            self.invalidate(commit=commit)
+
+    def invalidate(self, commit: Optional[str] = None) -> None:
+        self._entries.clear()
+        self.commit = commit
+
+    async def query(self, name: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        key = self.key(name=name, variables=variables)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if key in self._pending:
+            self.hits += 1
+            return await self._pending[key]
+
+        self.misses += 1
+        future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            response = await self.client.query_gql_query(name=name, variables=variables, branch_name=self.branch)
+            data = response.get("data") or response
+        except Exception as exc:
+            future.set_exception(exc)
+            # Only the callers waiting on this future should see the error
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+        future.set_result(data)
+        self._entries[key] = data
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
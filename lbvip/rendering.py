@@ -0,0 +1,49 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict
+
+import jinja2
+
+from lbvip.aggregation import announce
+from lbvip.models import frontends, load_balancers
+
+TEMPLATES_DIRECTORY = Path(__file__).resolve().parent.parent / "transforms" / "templates"
+
+HAPROXY_TEMPLATE = "haproxy.conf.j2"
+BIRD_TEMPLATE = "bird.conf.j2"
+NGINX_TEMPLATE = "nginx.conf.j2"
+
+
+@lru_cache(maxsize=None)
+def get_environment(directory: Path = TEMPLATES_DIRECTORY) -> jinja2.Environment:
+    """Jinja environment shared by all the renders of a process.
+
+    The templates are compiled once per process, auto_reload is disabled so they aren't checked
+    against the filesystem on every render, and the compiled bytecode is kept on disk for the
+    next processes.
+    """
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(directory)),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=False,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_template(name: str, directory: Path = TEMPLATES_DIRECTORY) -> jinja2.Template:
+    return get_environment(directory=directory).get_template(name)
+
+
+def render_haproxy(data: Dict[str, Any]) -> str:
+    return get_template(HAPROXY_TEMPLATE).render(load_balancers=load_balancers(data))
+
+
+def render_bird(data: Dict[str, Any]) -> str:
+    lbs = load_balancers(data)
+    return get_template(BIRD_TEMPLATE).render(load_balancers=lbs, announcements={lb.hostname: announce(lb) for lb in lbs})
+
+
+def render_nginx(data: Dict[str, Any]) -> str:
+    return get_template(NGINX_TEMPLATE).render(frontends=frontends(data))
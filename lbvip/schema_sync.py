@@ -0,0 +1,173 @@
+import glob
+import hashlib
+import json
+import logging
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import yaml
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.schema import SchemaRoot
+from pydantic import ValidationError
+
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+SCHEMA_PATTERN = "models/**/*.yml"
+STATE_FILE = REPOSITORY_ROOT / ".schema-sync.json"
+
+# The schemas keep long descriptions on one line
+YAMLLINT_CONFIG = "{extends: relaxed, rules: {line-length: disable}}"
+
+
+class SchemaSyncError(ValueError):
+    def __init__(self, errors: List[str]) -> None:
+        self.errors = errors
+        super().__init__("Unable to load the schema: " + "; ".join(errors))
+
+
+@dataclass
+class SchemaFile:
+    path: str
+    content: Optional[Dict[str, Any]] = None
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+
+
+def lint_schema_file(path: str) -> SchemaFile:
+    """Parse a schema file, lint it with yamllint when it's installed and validate it like `infrahubctl schema load`."""
+    schema_file = SchemaFile(path=path)
+    text = Path(path).read_text()
+    try:
+        from yamllint import linter
+        from yamllint.config import YamlLintConfig
+    except ImportError:
+        pass
+    else:
+        for problem in linter.run(text, YamlLintConfig(YAMLLINT_CONFIG)):
+            message = f"{path}:{problem.line}:{problem.column} {problem.desc} ({problem.rule})"
+            (schema_file.errors if problem.level == "error" else schema_file.warnings).append(message)
+
+    try:
+        schema_file.content = yaml.safe_load(text)
+    except yaml.YAMLError as exc:
+        schema_file.errors.append(f"{path}: invalid YAML, {exc}")
+        return schema_file
+    if not schema_file.content:
+        schema_file.errors.append(f"{path}: empty schema")
+        return schema_file
+
+    try:
+        SchemaRoot(**schema_file.content)
+    except ValidationError as exc:
+        for error in exc.errors():
+            location = "/".join(str(item) for item in error["loc"])
+            schema_file.errors.append(f"{path}: '{location}' {error['msg']}")
+    return schema_file
+
+
+def schema_paths(pattern: str = SCHEMA_PATTERN, root: Path = REPOSITORY_ROOT) -> List[Path]:
+    base = Path(pattern) if Path(pattern).is_absolute() else root / pattern
+    return sorted(Path(path) for path in glob.glob(str(base), recursive=True))
+
+
+def schema_digest(paths: Sequence[Path], root: Path = REPOSITORY_ROOT) -> str:
+    """Hash of the names and contents of the schema files, renaming or reordering them changes it too."""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        name = str(path.resolve().relative_to(root)) if path.resolve().is_relative_to(root) else str(path)
+        digest.update(name.encode())
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+class SchemaSync:
+    """Loads the schema files into Infrahub only when they, or the schema of the branch, changed since the last load.
+
+    The hash of the files and the schema hash Infrahub reported after the last load are kept in
+    `.schema-sync.json` for each address and branch. When both still match, nothing is sent. Otherwise
+    the files are parsed, linted and validated in parallel before being uploaded in a single request.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        log: logging.Logger,
+        paths: Sequence[Path],
+        branch: Optional[str] = None,
+        state_path: Path = STATE_FILE,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.client = client
+        self.log = log
+        self.paths = list(paths)
+        self.branch = branch or client.default_branch
+        self.state_path = state_path
+        self.workers = workers
+        self.state: Dict[str, Dict[str, str]] = {}
+        if self.state_path.exists():
+            self.state = json.loads(self.state_path.read_text())
+
+    @property
+    def key(self) -> str:
+        return f"{self.client.address}@{self.branch}"
+
+    async def server_hash(self) -> str:
+        """Hash of the whole schema of the branch, as reported by Infrahub."""
+        # The SDK has no public call for the summary, _get adds the authentication and goes through its requester
+        url = httpx.URL(f"{self.client.address}/api/schema/summary", params={"branch": self.branch})
+        response = await self.client._get(url=str(url))
+        response.raise_for_status()
+        return response.json()["main"]
+
+    def lint(self) -> List[SchemaFile]:
+        if not self.paths:
+            raise SchemaSyncError(errors=["no schema file found"])
+        with ProcessPoolExecutor(max_workers=self.workers or len(self.paths)) as pool:
+            schema_files = list(pool.map(lint_schema_file, [str(path) for path in self.paths]))
+
+        for schema_file in schema_files:
+            for warning in schema_file.warnings:
+                self.log.warning(warning)
+        errors = [error for schema_file in schema_files for error in schema_file.errors]
+        if errors:
+            raise SchemaSyncError(errors=errors)
+        return schema_files
+
+    async def sync(self, force: bool = False) -> bool:
+        """Load the schema files when they differ from the last load, returns whether they were sent."""
+        start = time.perf_counter()
+        digest = schema_digest(self.paths)
+        known = self.state.get(self.key, {})
+        current_hash = await self.server_hash()
+        if not force and known.get("digest") == digest and known.get("hash") == current_hash:
+            self.log.info(
+                f"The schema of {self.branch} is up to date ({len(self.paths)} files), "
+                f"checked in {time.perf_counter() - start:.3f}s"
+            )
+            return False
+
+        schema_files = self.lint()
+        self.log.info(f"Validated {len(schema_files)} schema files in {time.perf_counter() - start:.3f}s")
+        response = await self.client.schema.load(
+            schemas=[schema_file.content for schema_file in schema_files], branch=self.branch  # type: ignore[misc]
+        )
+        if response.errors:
+            raise SchemaSyncError(errors=[json.dumps(response.errors)])
+
+        if response.schema_updated:
+            self.log.info(f"Loaded {len(schema_files)} schema files into {self.branch}")
+        else:
+            self.log.info(f"The schema of {self.branch} already matched the files, no changes were required")
+        self.state[self.key] = {"digest": digest, "hash": response.hash or current_hash}
+        self.save()
+        self.log.info(f"Synchronized the schema in {time.perf_counter() - start:.3f}s")
+        return True
+
+    def save(self) -> None:
+        self.state_path.write_text(json.dumps(self.state, indent=2, sort_keys=True) + "\n")
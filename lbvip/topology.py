@@ -0,0 +1,327 @@
+import csv
+import json
+import logging
+import time
+
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import yaml
+
+from infrahub_sdk import InfrahubClient
+from infrahub_sdk.batch import InfrahubBatch
+from infrahub_sdk.node import InfrahubNode
+
+from lbvip.allocation import BulkIPAllocator
+from lbvip.catalog import CORE_RELATIONSHIPS, SchemaCatalog
+from lbvip.planning import AddressRequest
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_REFERENCE_CACHE_SIZE = 50000
+
+# CSV cells can't hold structured values, these prefixes and separator are used instead
+CSV_POOL_PREFIX = "pool:"
+CSV_LIST_SEPARATOR = "|"
+
+
+class TopologyValidationError(ValueError):
+    def __init__(self, location: str, errors: List[str]) -> None:
+        self.location = location
+        self.errors = errors
+        super().__init__(f"Invalid record at {location}: {'; '.join(errors)}")
+
+
+@dataclass
+class TopologyRecord:
+    location: str
+    kind: str
+    data: Dict[str, Any]
+
+
+def read_jsonl(path: Path) -> Iterator[TopologyRecord]:
+    with path.open() as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            yield TopologyRecord(location=f"{path}:{line_number}", kind=data.pop("kind", ""), data=data)
+
+
+def read_yaml(path: Path) -> Iterator[TopologyRecord]:
+    """Each YAML document holds either a single record or a list of records."""
+    with path.open() as handle:
+        for document_number, document in enumerate(yaml.safe_load_all(handle), start=1):
+            items = document if isinstance(document, list) else [document]
+            for item_number, data in enumerate(items, start=1):
+                if not data:
+                    continue
+                yield TopologyRecord(
+                    location=f"{path}:document {document_number}, item {item_number}",
+                    kind=data.pop("kind", ""),
+                    data=data,
+                )
+
+
+def read_csv(path: Path, catalog: SchemaCatalog) -> Iterator[TopologyRecord]:
+    with path.open(newline="") as handle:
+        for line_number, row in enumerate(csv.DictReader(handle), start=2):
+            kind = row.pop("kind", "") or ""
+            kind_definition = catalog.kinds.get(kind)
+            data: Dict[str, Any] = {}
+            for name, value in row.items():
+                if value is None or value == "":
+                    continue
+                data[name] = convert_csv_value(kind_definition=kind_definition, name=name, value=value)
+            yield TopologyRecord(location=f"{path}:{line_number}", kind=kind, data=data)
+
+
+def convert_csv_value(kind_definition: Any, name: str, value: str) -> Any:
+    if kind_definition is None:
+        return value
+    if name in kind_definition.attributes:
+        attribute_kind = kind_definition.attributes[name].kind
+        if attribute_kind == "Number":
+            return int(value)
+        if attribute_kind == "Boolean":
+            return value.lower() in ("1", "true", "yes")
+        return value
+    relationship = kind_definition.relationships.get(name)
+    cardinality = relationship.cardinality if relationship else CORE_RELATIONSHIPS.get(name, ("", "one"))[1]
+    if cardinality == "many":
+        return [item for item in value.split(CSV_LIST_SEPARATOR) if item]
+    if value.startswith(CSV_POOL_PREFIX):
+        return {"pool": value[len(CSV_POOL_PREFIX) :]}
+    return value
+
+
+def read_records(path: Path, catalog: SchemaCatalog) -> Iterator[TopologyRecord]:
+    """Stream the records of a topology file, the format is selected from the extension of the file."""
+    if path.suffix in (".jsonl", ".ndjson"):
+        return read_jsonl(path)
+    if path.suffix in (".yml", ".yaml"):
+        return read_yaml(path)
+    if path.suffix == ".csv":
+        return read_csv(path, catalog=catalog)
+    raise ValueError(f"Unsupported topology format {path.suffix!r}, expected .jsonl, .yml/.yaml or .csv")
+
+
+class ReferenceCache:
+    """Bounded mapping of (kind, reference) to node id, the oldest entries are evicted first."""
+
+    def __init__(self, maxsize: int = DEFAULT_REFERENCE_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    def get(self, kind: str, reference: str) -> Optional[str]:
+        key = (kind, reference)
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def set(self, kind: str, reference: str, node_id: str) -> None:
+        self._items[(kind, reference)] = node_id
+        self._items.move_to_end((kind, reference))
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class TopologyLoader:
+    """Stream a topology file into Infrahub, one batch of at most `chunk_size` records at a time.
+
+    References to other nodes are given by name (the human friendly id or default filter of the peer)
+    and resolved in bulk for each chunk, `{"pool": <name>}` allocates the next IP address of a
+    CoreIPAddressPool using the reference of the record as identifier. A chunk is flushed early
+    when a record references an object of the chunk that hasn't been saved yet.
+    """
+
+    def __init__(
+        self,
+        client: InfrahubClient,
+        log: logging.Logger,
+        branch: str,
+        catalog: Optional[SchemaCatalog] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        concurrency: int = 10,
+    ) -> None:
+        self.client = client
+        self.log = log
+        self.branch = branch
+        self.catalog = catalog or SchemaCatalog.from_directory()
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.references = ReferenceCache()
+        self.pools: Dict[str, InfrahubNode] = {}
+        self.counts: Dict[str, int] = defaultdict(int)
+
+        self._chunk: List[TopologyRecord] = []
+        self._pending: Set[Tuple[str, str]] = set()
+
+    def peer_kind(self, kind: str, relationship: str) -> str:
+        kind_definition = self.catalog.get(kind)
+        if relationship in kind_definition.relationships:
+            return kind_definition.relationships[relationship].peer
+        return CORE_RELATIONSHIPS[relationship][0]
+
+    def reference_attribute(self, kind: str) -> str:
+        if kind in self.catalog.kinds:
+            return self.catalog.kinds[kind].reference_attribute
+        return "name"
+
+    def references_of(self, record: TopologyRecord) -> Iterator[Tuple[str, str]]:
+        """(peer kind, reference) of every relationship of a record, pool allocations excluded."""
+        kind_definition = self.catalog.get(record.kind)
+        for name, value in record.data.items():
+            if name in kind_definition.attributes or isinstance(value, dict):
+                continue
+            peer_kind = self.peer_kind(kind=record.kind, relationship=name)
+            for reference in value if isinstance(value, list) else [value]:
+                yield peer_kind, str(reference)
+
+    def pool_fields(self, record: TopologyRecord) -> Iterator[Tuple[str, Any]]:
+        """(relationship, pool name) of every `{"pool": <name>}` of a record, the name is None when missing."""
+        kind_definition = self.catalog.get(record.kind)
+        for name, value in record.data.items():
+            if name not in kind_definition.attributes and isinstance(value, dict):
+                yield name, value.get("pool")
+
+    def validate(self, record: TopologyRecord) -> List[str]:
+        """Errors of a record against the schema and the `{"pool": <name>}` syntax."""
+        errors = self.catalog.validate(kind=record.kind, data=record.data)
+        if errors:
+            return errors
+        return [
+            f"{name} expects a reference or {{\"pool\": <name>}}, got {record.data[name]!r}"
+            for name, pool in self.pool_fields(record)
+            if not pool or not isinstance(pool, str)
+        ]
+
+    def _depends_on_pending(self, record: TopologyRecord) -> bool:
+        return any(reference in self._pending for reference in self.references_of(record))
+
+    async def load(self, path: Path) -> Dict[str, int]:
+        start = time.perf_counter()
+        for record in read_records(path=path, catalog=self.catalog):
+            errors = self.validate(record)
+            if errors:
+                raise TopologyValidationError(location=record.location, errors=errors)
+
+            if len(self._chunk) >= self.chunk_size or self._depends_on_pending(record):
+                await self.flush()
+
+            self._chunk.append(record)
+            reference = record.data.get(self.reference_attribute(record.kind))
+            if reference is not None:
+                for kind in [record.kind] + self.catalog.get(record.kind).inherit_from:
+                    self._pending.add((kind, str(reference)))
+
+        await self.flush()
+        total = sum(self.counts.values())
+        self.log.info(f"Loaded {total} records from {path} in {time.perf_counter() - start:.2f}s")
+        return dict(self.counts)
+
+    def pool_requests(self, path: Path) -> Iterator[Tuple[str, AddressRequest]]:
+        """Pool name and request of every `{"pool": <name>}` of a topology file, to plan the allocations before loading it."""
+        for record in read_records(path=path, catalog=self.catalog):
+            attribute = self.reference_attribute(record.kind)
+            for name, value in record.data.items():
+                if isinstance(value, dict) and "pool" in value:
+                    yield value["pool"], AddressRequest(
+                        kind=record.kind,
+                        reference_attribute=attribute,
+                        identifier=str(record.data.get(attribute)),
+                        relationship=name,
+                    )
+
+    async def _resolve_references(self, records: List[TopologyRecord]) -> None:
+        missing: Dict[str, Set[str]] = defaultdict(set)
+        for record in records:
+            for peer_kind, reference in self.references_of(record):
+                if self.references.get(peer_kind, reference) is None:
+                    missing[peer_kind].add(reference)
+
+        for peer_kind, references in missing.items():
+            attribute = self.reference_attribute(peer_kind)
+            nodes = await self.client.filters(
+                kind=peer_kind,
+                branch=self.branch,
+                populate_store=False,
+                **{f"{attribute}__values": sorted(references)},
+            )
+            for node in nodes:
+                self.references.set(peer_kind, str(getattr(node, attribute).value), node.id)
+
+            unresolved = [reference for reference in references if self.references.get(peer_kind, reference) is None]
+            if unresolved:
+                raise ValueError(f"Unable to find {peer_kind} {', '.join(sorted(unresolved))}")
+
+    async def _resolve_pools(self, records: List[TopologyRecord]) -> BulkIPAllocator:
+        allocator = BulkIPAllocator(client=self.client, branch=self.branch)
+        missing = set()
+        for record in records:
+            for name, pool in self.pool_fields(record):
+                if not pool:
+                    raise TopologyValidationError(location=record.location, errors=[f"{name} has no pool"])
+                if pool not in self.pools:
+                    missing.add(pool)
+        if missing:
+            pools = await self.client.filters(
+                kind="CoreIPAddressPool", branch=self.branch, populate_store=False, name__values=sorted(missing)
+            )
+            self.pools.update({pool.name.value: pool for pool in pools})
+            unknown = missing - set(self.pools)
+            if unknown:
+                raise ValueError(f"Unable to find CoreIPAddressPool {', '.join(sorted(unknown))}")
+
+        for record in records:
+            identifier = str(record.data.get(self.reference_attribute(record.kind)))
+            for _, pool in self.pool_fields(record):
+                allocator.request(resource_pool=self.pools[pool], identifier=identifier)
+        await allocator.resolve()
+        return allocator
+
+    def _node_data(self, record: TopologyRecord, allocator: BulkIPAllocator) -> Dict[str, Any]:
+        kind_definition = self.catalog.get(record.kind)
+        identifier = str(record.data.get(self.reference_attribute(record.kind)))
+        data: Dict[str, Any] = {}
+        for name, value in record.data.items():
+            if name in kind_definition.attributes:
+                data[name] = value
+            elif isinstance(value, dict):
+                address = allocator.get(resource_pool=self.pools[value["pool"]], identifier=identifier)
+                data[name] = {"id": address.id}
+            elif isinstance(value, list):
+                peer_kind = self.peer_kind(kind=record.kind, relationship=name)
+                data[name] = [{"id": self.references.get(peer_kind, str(item))} for item in value]
+            else:
+                peer_kind = self.peer_kind(kind=record.kind, relationship=name)
+                data[name] = {"id": self.references.get(peer_kind, str(value))}
+        return data
+
+    async def flush(self) -> None:
+        records, self._chunk, self._pending = self._chunk, [], set()
+        if not records:
+            return
+
+        start = time.perf_counter()
+        await self._resolve_references(records=records)
+        allocator = await self._resolve_pools(records=records)
+
+        batch = InfrahubBatch(max_concurrent_execution=self.concurrency)
+        for record in records:
+            node = await self.client.create(kind=record.kind, branch=self.branch, data=self._node_data(record, allocator))
+            batch.add(task=node.save, allow_upsert=True, node=(record, node))
+
+        async for (record, node), _ in batch.execute():
+            reference = record.data.get(self.reference_attribute(record.kind))
+            if reference is not None:
+                for kind in [record.kind] + self.catalog.get(record.kind).inherit_from:
+                    self.references.set(kind, str(reference), node.id)
+            self.counts[record.kind] += 1
+
+        self.log.info(f"- Saved {len(records)} records in {time.perf_counter() - start:.2f}s")
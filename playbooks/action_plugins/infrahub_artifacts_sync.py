@@ -0,0 +1,95 @@
+"""Download the artifacts of an artifact definition in bulk and write the ones that changed.
+
+Runs once on the controller, the artifacts of all the targets are listed with a single query and
+only the content of the artifacts whose checksum differs from the local file is downloaded,
+concurrently and through one pool of HTTP connections.
+
+    - name: Sync the Haproxy artifacts
+      infrahub_artifacts_sync:
+        artifact_name: "Configuration for Haproxy on LB"
+        dest: "{{ playbook_dir }}/../configs"
+        filename: "{target}.haproxy.conf"
+        targets: "{{ ansible_play_hosts | map('extract', hostvars, 'id') | list }}"
+      run_once: true
+"""
+
+import asyncio
+import os
+import sys
+
+from pathlib import Path
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+# The shared helpers live at the root of the repository
+REPOSITORY_ROOT = str(Path(__file__).resolve().parents[2])
+if REPOSITORY_ROOT not in sys.path:
+    sys.path.append(REPOSITORY_ROOT)
+
+from lbvip.artifact_sync import CHANGED, DEFAULT_CONCURRENCY, FAILED, MISSING, ArtifactSync, pooled_client  # noqa: E402
+
+
+async def sync_artifacts(args: dict, check_mode: bool) -> list:
+    config = {"address": args["api_endpoint"], "tls_insecure": not args["validate_certs"]}
+    if args["token"]:
+        config["api_token"] = args["token"]
+
+    async with pooled_client(concurrency=args["concurrency"], **config) as client:
+        sync = ArtifactSync(
+            client=client,
+            artifact_name=args["artifact_name"],
+            destination=Path(args["dest"]),
+            filename=args["filename"],
+            branch=args["branch"],
+            concurrency=args["concurrency"],
+        )
+        return await sync.run(target_ids=args["targets"], check_mode=check_mode)
+
+
+class ActionModule(ActionBase):
+    TRANSFERS_FILES = False
+    _VALID_ARGS = frozenset(
+        ("artifact_name", "dest", "filename", "targets", "api_endpoint", "token", "branch", "concurrency", "validate_certs")
+    )
+
+    def run(self, tmp=None, task_vars=None):
+        result = super().run(tmp, task_vars)
+
+        args = {
+            "artifact_name": self._task.args.get("artifact_name"),
+            "dest": self._task.args.get("dest"),
+            "filename": self._task.args.get("filename", "{target}"),
+            "targets": self._task.args.get("targets") or None,
+            "api_endpoint": self._task.args.get("api_endpoint") or os.environ.get("INFRAHUB_ADDRESS", "http://localhost:8000"),
+            "token": self._task.args.get("token") or os.environ.get("INFRAHUB_API_TOKEN"),
+            "branch": self._task.args.get("branch"),
+            "concurrency": int(self._task.args.get("concurrency", DEFAULT_CONCURRENCY)),
+            "validate_certs": self._task.args.get("validate_certs", True),
+        }
+        if not args["artifact_name"] or not args["dest"]:
+            raise AnsibleActionFail("artifact_name and dest are required")
+
+        try:
+            synced = asyncio.run(sync_artifacts(args=args, check_mode=self._task.check_mode))
+        except Exception as exc:
+            raise AnsibleActionFail(f"Unable to sync the artifacts of {args['artifact_name']}: {exc}") from exc
+
+        changed = [artifact for artifact in synced if artifact.status == CHANGED]
+        missing = [artifact for artifact in synced if artifact.status == MISSING]
+        failed = [artifact for artifact in synced if artifact.status == FAILED]
+        result["changed"] = bool(changed)
+        result["failed"] = bool(failed)
+        result["artifacts"] = {
+            artifact.target: {
+                "path": str(artifact.path),
+                "checksum": artifact.checksum,
+                "status": artifact.status,
+                "error": artifact.error,
+            }
+            for artifact in synced
+        }
+        result["msg"] = (
+            f"{len(changed)} of {len(synced)} artifacts changed, {len(missing)} missing and {len(failed)} failed"
+        )
+        return result
@@ -1,7 +1,10 @@
-import ipaddress
 import logging
+import os
+import sys
+import time
 
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 from infrahub_sdk import InfrahubClient
 from infrahub_sdk.batch import InfrahubBatch
@@ -9,6 +12,19 @@ from infrahub_sdk.exceptions import GraphQLError
 from infrahub_sdk.node import InfrahubNode
 from infrahub_sdk.store import NodeStore
 
+# `infrahubctl run` only adds the scripts directory to the path, the shared helpers live at the root of the repository
+REPOSITORY_ROOT = str(Path(__file__).resolve().parent.parent)
+if REPOSITORY_ROOT not in sys.path:
+    sys.path.append(REPOSITORY_ROOT)
+
+from lbvip.allocation import AllocationRequest, BulkIPAllocator
+from lbvip.incremental import UNCHANGED, IncrementalSync
+from lbvip.ipam import PrefixIndex
+from lbvip.metrics import METRICS_ENV, LoaderMetrics, profiled
+from lbvip.planning import AllocationPlanner
+from lbvip.provisioning import DEFAULT_CONCURRENCY, ProvisioningGraph
+from lbvip.topology import DEFAULT_CHUNK_SIZE, TopologyLoader
+
 # flake8: noqa
 # pylint: skip-file
 
@@ -116,57 +132,33 @@ PREFIXES = [
 ]
 
 
+# Kinds prefetched by the incremental mode
+INCREMENTAL_KINDS = (
+    # kind, key attribute, cardinality many relationships managed by the loader
+    ("OrganizationTenant", "name", None),
+    ("OrganizationManufacturer", "name", None),
+    ("OrganizationProvider", "name", None),
+    ("InfraAutonomousSystem", "name", None),
+    ("InfraPlatform", "name", None),
+    ("CoreStandardGroup", "name", ["members"]),
+    ("LocationCountry", "name", None),
+    ("LocationMetro", "name", None),
+    ("LocationSite", "name", None),
+    ("InfraVRF", "name", None),
+    ("IpamIPPrefix", "prefix", None),
+    ("IpamIPAddress", "address", None),
+    ("CoreNumberPool", "name", None),
+    ("CoreIPPrefixPool", "name", ["resources"]),
+    ("CoreIPAddressPool", "name", ["resources"]),
+    ("ServerFrontend", "hostname", None),
+    ("InfraVIP", "hostname", ["frontend_servers"]),
+    ("ServerLoadBalancer", "hostname", None),
+)
+
 INTERNAL_DOMAIN = "duff.ninja"
 EXTERNAL_DOMAIN = "duff.io"
 
 # --- Utils
-# Helper function to generate pool name
-def generate_pool_name(vrf_label: str, site_name: str, prefix: str, role: str) -> str:
-    prefix_common = extract_common_prefix(prefix)
-    if vrf_label:
-        return f"{role}.{vrf_label.lower()}.{site_name.lower()}-{prefix_common}"
-    else:
-        return f"{role}.{site_name.lower()}-{prefix_common}"
-
-def extract_common_prefix(prefix: str) -> str:
-    # Create an IP network object
-    net = ipaddress.ip_network(prefix, strict=False)
-
-    # Get the network address in binary form
-    network_address = net.network_address
-    # Convert the network address to a string
-    net_str = str(network_address)
-
-    # Calculate how many full octets (for IPv4) to extract
-    if isinstance(network_address, ipaddress.IPv4Address):
-        # Full octets (each 8 bits)
-        full_octets = net.prefixlen // 8
-
-        # Handle partial octet
-        partial_bits = net.prefixlen % 8
-        if partial_bits > 0:
-            # Extract the first full octets
-            octets = net_str.split('.')[:full_octets]
-            # Add the partial octet if necessary
-            partial_octet = int(net_str.split('.')[full_octets]) & (0xFF << (8 - partial_bits))
-            octets.append(str(partial_octet))
-            return '.'.join(octets) + f"/{net.prefixlen}"
-        else:
-            return '.'.join(net_str.split('.')[:full_octets]) + f"/{net.prefixlen}"
-
-    elif isinstance(network_address, ipaddress.IPv6Address):
-        # Full hextets (each 16 bits)
-        full_hextets = net.prefixlen // 16
-        partial_bits = net.prefixlen % 16
-        if partial_bits > 0:
-            hextets = net_str.split(':')[:full_hextets]
-            partial_hextet = int(net_str.split(':')[full_hextets], 16) & (0xFFFF << (16 - partial_bits))
-            hextets.append(f'{partial_hextet:x}')
-            return ':'.join(hextets) + f"/{net.prefixlen}"
-        else:
-            return ':'.join(net_str.split(':')[:full_hextets]) + f"/{net.prefixlen}"
-
-
 async def execute_batch(batch: InfrahubBatch, log: logging.Logger) -> None:
     try:
         async for node, _ in batch.execute():
@@ -184,6 +176,56 @@ async def execute_batch(batch: InfrahubBatch, log: logging.Logger) -> None:
         log.debug(f"- Creation failed due to {exc}")
 
 
+def reuse_if_unchanged(
+    client: InfrahubClient,
+    log: logging.Logger,
+    sync: Optional[IncrementalSync],
+    object_name: str,
+    kind_name: str,
+    data: Dict,
+) -> Optional[InfrahubNode]:
+    """Returns the existing node when the incremental mode finds it unchanged, it then doesn't need to be saved."""
+    if not sync:
+        return None
+    status, existing = sync.diff(kind=kind_name, key=object_name, data=data)
+    sync.record(kind=kind_name, status=status)
+    if status != UNCHANGED:
+        return None
+    client.store.set(key=object_name, node=existing)
+    log.debug(f"- Unchanged [{kind_name}] '{object_name}'")
+    return existing
+
+
+async def build_node(
+    client: InfrahubClient, branch: str, sync: Optional[IncrementalSync], object_name: str, kind_name: str, data: Dict
+) -> InfrahubNode:
+    """Node to save for an object, it carries the id of the existing node when the incremental mode found one."""
+    existing = sync.get(kind=kind_name, key=object_name) if sync else None
+    return await client.create(branch=branch, kind=kind_name, data={**data, "id": existing.id} if existing else data)
+
+
+async def save_node(obj: InfrahubNode, allow_upsert: Optional[bool]) -> None:
+    """Save a new node, or update a changed one by id: not every kind allows upserts (CoreNumberPool)."""
+    if obj.id:
+        await obj.update(do_full_update=True)
+    else:
+        await obj.save(allow_upsert=allow_upsert)
+
+
+def related_id(node: InfrahubNode, relationship: str) -> Optional[str]:
+    """Returns the peer of a cardinality one relationship, nodes created in this run don't have it set."""
+    related = getattr(node, relationship)
+    return related.id if related else None
+
+
+def existing_peer_id(sync: Optional[IncrementalSync], kind_name: str, object_name: str, relationship: str) -> Optional[str]:
+    """Returns the peer of a relationship of an existing node, used to skip allocating an IP that is already assigned."""
+    existing = sync.get(kind=kind_name, key=object_name) if sync else None
+    if not existing:
+        return None
+    return related_id(node=existing, relationship=relationship)
+
+
 async def create_and_save(
     client: InfrahubClient,
     log: logging.Logger,
@@ -193,11 +235,16 @@ async def create_and_save(
     data: Dict,
     allow_upsert: Optional[bool] = True,
     retrieved_on_failure: Optional[bool] = False,
+    sync: Optional[IncrementalSync] = None,
 ) -> InfrahubNode:
     """Creates an object, saves it and handles failures."""
+    existing = reuse_if_unchanged(client=client, log=log, sync=sync, object_name=object_name, kind_name=kind_name, data=data)
+    if existing:
+        return existing
+
     try:
-        obj = await client.create(branch=branch, kind=kind_name, data=data)
-        await obj.save(allow_upsert=allow_upsert)
+        obj = await build_node(client=client, branch=branch, sync=sync, object_name=object_name, kind_name=kind_name, data=data)
+        await save_node(obj=obj, allow_upsert=allow_upsert)
         log.debug(f"- Created {obj._schema.kind} - {object_name}")
         client.store.set(key=object_name, node=obj)
     except GraphQLError as exc:
@@ -218,17 +265,526 @@ async def create_and_add_to_batch(
     data: Dict,
     batch: InfrahubBatch,
     allow_upsert: Optional[bool] = True,
+    sync: Optional[IncrementalSync] = None,
 ) -> InfrahubNode:
     """Creates an object and adds it to a batch for deferred saving."""
-    obj = await client.create(branch=branch, kind=kind_name, data=data)
-    batch.add(task=obj.save, allow_upsert=allow_upsert, node=obj)
+    existing = reuse_if_unchanged(client=client, log=log, sync=sync, object_name=object_name, kind_name=kind_name, data=data)
+    if existing:
+        return existing
+
+    obj = await build_node(client=client, branch=branch, sync=sync, object_name=object_name, kind_name=kind_name, data=data)
+    batch.add(task=save_node, obj=obj, allow_upsert=allow_upsert, node=obj)
     log.debug(f"- Added to batch [{obj._schema.kind}] '{object_name}'")
     client.store.set(key=object_name, node=obj)
     return obj
 
 
+# ---- Frontend Servers and VIPs
+async def provision_servers_sequentially(
+    client: InfrahubClient,
+    log: logging.Logger,
+    branch: str,
+    duff_org_obj: InfrahubNode,
+    prefix_index: PrefixIndex,
+    sync: Optional[IncrementalSync] = None,
+) -> None:
+    """Creates the Frontend Servers, VIPs and Load Balancers one site and one object at a time."""
+    web_srv_grp = client.store.get(kind="CoreStandardGroup", key="web_servers")
+    lb_grp = client.store.get(kind="CoreStandardGroup", key="load_balancers")
+    all_frontends = []
+    all_load_balancers = []
+    for site in SITES:
+        site_name = site[0]
+
+        # Create 4 Frontend Servers per site
+        for i in range(1, 5):
+            # Set VRF for server (Production VRF for the first 3, Development VRF for the 4th)
+            if i < 4:
+                site_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
+                vrf_label = "Production"
+            else:
+                site_vrf = client.store.get(kind="InfraVRF", key="Development", raise_when_missing=False)
+                vrf_label = "Development"
+
+            # Create frontend server data
+            hostname = f"frontend{i}.{vrf_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}"
+            frontend_server_data = {
+                "hostname": hostname,
+                "environment": "production" if vrf_label == "Production" else "development",
+                "status": "active",
+                "organization": {"id": duff_org_obj.id},
+                "vrf": {"id": site_vrf.id},
+            }
+
+            # Create frontend server object
+            frontend_server_obj = await create_and_save(
+                client=client,
+                log=log,
+                branch=branch,
+                object_name=hostname,
+                kind_name="ServerFrontend",
+                data=frontend_server_data,
+                sync=sync,
+            )
+            all_frontends.append(frontend_server_obj.id)
+            if existing_peer_id(sync=sync, kind_name="ServerFrontend", object_name=hostname, relationship="ip_address"):
+                continue
+            # Get the IP pool of the site from the prefix index
+            frontend_ip_pool = prefix_index.pool(location=site_name, role="server", vrf=vrf_label)
+
+            # Allocate IP for the frontend server from the correct pool
+            if frontend_ip_pool:
+                frontend_ip_obj = await client.allocate_next_ip_address(
+                    resource_pool=frontend_ip_pool,
+                    identifier=hostname,
+                    data={"server": frontend_server_obj.id}
+                )
+
+        # Create 3 VIPs per site (2 for production, 1 for development)
+        for j in range(1, 4):
+            # Set VRF for VIP (Production VRF for the first 2, Development VRF for the 3rd)
+            if j < 3:
+                vip_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
+                vip_label = "Production"
+                frontend_servers_for_vip_range = range(1, 4)
+            else:
+                vip_vrf = client.store.get(kind="InfraVRF", key="Development", raise_when_missing=False)
+                vip_label = "Development"
+                frontend_servers_for_vip_range = range(4, 5)
+
+            # Create VIP hostname and data
+            vip_hostname = f"vip{j}.{vip_label.lower()}.{site_name.lower()}.{EXTERNAL_DOMAIN}"
+            vip_data = {
+                "hostname": vip_hostname,
+                "mode": "http",  # Assuming HTTP for the VIP
+                "balance": "roundrobin",  # Assuming roundrobin for load balancing
+                "status": "active",
+                "vrf": {"id": vip_vrf.id},
+            }
+
+            # Get the IP pool of the site from the prefix index (public internet)
+            vip_ip_pool = prefix_index.pool(location=site_name, role="public", vrf="Internet")
+
+            existing_vip_ip = existing_peer_id(sync=sync, kind_name="InfraVIP", object_name=vip_hostname, relationship="ip_address")
+            if existing_vip_ip:
+                vip_data["ip_address"] = {"id": existing_vip_ip}
+            elif vip_ip_pool:
+                # Allocate VIP IP address from the correct pool
+                vip_ip_obj = await client.allocate_next_ip_address(
+                    resource_pool=vip_ip_pool,
+                    identifier=vip_hostname,
+                )
+                vip_data["ip_address"] = {"id": vip_ip_obj.id}
+
+            # Create VIP object
+            vip_obj = await create_and_save(
+                    client=client,
+                    log=log,
+                    branch=branch,
+                    object_name=vip_hostname,
+                    kind_name="InfraVIP",
+                    data=vip_data,
+                    sync=sync,
+                )
+
+            # Associate the frontend servers created above with the VIP
+            frontend_servers_for_vip = [
+                client.store.get(kind="ServerFrontend", key=f"frontend{k}.{vip_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}") for k in frontend_servers_for_vip_range
+            ]
+            # vip_obj.frontend_servers.fetch()
+            frontend_servers = [server.id for server in frontend_servers_for_vip]
+            if set(frontend_servers) - set(vip_obj.frontend_servers.peer_ids):
+                await vip_obj.add_relationships(relation_to_update="frontend_servers", related_nodes=frontend_servers)
+                await vip_obj.save()
+
+        lb_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
+        vrf_label = "Production"
+
+        # Create Load Balancer hostname
+        lb_hostname = f"lb.dmz.{site_name.lower()}.{INTERNAL_DOMAIN}"
+
+        # Create Load Balancer data
+        load_balancer_data = {
+            "hostname": lb_hostname,
+            "environment": "production",
+            "status": "active",
+            "organization": {"id": duff_org_obj.id},
+            "vrf": {"id": lb_vrf.id},
+        }
+
+        # Create the Load Balancer object
+        load_balancer_obj = await create_and_save(
+            client=client,
+            log=log,
+            branch=branch,
+            object_name=lb_hostname,
+            kind_name="ServerLoadBalancer",
+            data=load_balancer_data,
+            sync=sync,
+        )
+
+        all_load_balancers.append(load_balancer_obj.id)
+        if related_id(node=load_balancer_obj, relationship="ip_address") and related_id(
+            node=load_balancer_obj, relationship="public_ip_address"
+        ):
+            continue
+
+        # --- Allocate Private IP Address ---
+        # Get the private IP pool of the site from the prefix index
+        private_ip_pool = prefix_index.pool(location=site_name, role="dmz", vrf="DMZ")
+
+        # Allocate private IP for the Load Balancer from the correct pool
+        if private_ip_pool:
+            private_ip_obj = await client.allocate_next_ip_address(
+                resource_pool=private_ip_pool,
+                identifier=lb_hostname,
+                data={"description": load_balancer_obj.hostname.value}
+            )
+
+            # Assign the allocated private IP to the Load Balancer
+            if private_ip_obj:
+                load_balancer_obj.ip_address = {"id": private_ip_obj.id}
+
+        # --- Allocate Public IP Address ---
+        # Get the public IP pool of the site from the prefix index
+        tech_ip_pool = prefix_index.pool(location=site_name, role="technical", vrf="Internet")
+
+        # Allocate public IP for the Load Balancer from the correct pool
+        if tech_ip_pool:
+            tech_ip_obj = await client.allocate_next_ip_address(
+                resource_pool=tech_ip_pool,
+                identifier=lb_hostname,
+                data={"description": load_balancer_obj.hostname.value}
+            )
+            # Assign the allocated public IP to the Load Balancer
+            if tech_ip_obj:
+                load_balancer_obj.public_ip_address = {"id": tech_ip_obj.id}
+
+        # Save the Load Balancer object with the assigned private and public IPs
+        await load_balancer_obj.save()
+
+    for group_obj, members in ((web_srv_grp, all_frontends), (lb_grp, all_load_balancers)):
+        missing_members = [member for member in members if member not in group_obj.members.peer_ids]
+        if missing_members:
+            await group_obj.add_relationships(relation_to_update="members", related_nodes=missing_members)
+
+
+async def create_with_relationships(
+    client: InfrahubClient,
+    log: logging.Logger,
+    branch: str,
+    object_name: str,
+    kind_name: str,
+    data: Dict,
+    ip_addresses: Optional[Dict[str, AllocationRequest]] = None,
+    related_nodes: Optional[Dict[str, List[str]]] = None,
+    sync: Optional[IncrementalSync] = None,
+) -> InfrahubNode:
+    """Creates an object once its IP addresses are allocated and the related nodes it points to are in the store."""
+    data = dict(data)
+    for attribute, allocation in (ip_addresses or {}).items():
+        if allocation.address:
+            data[attribute] = {"id": allocation.address.id}
+    for relationship, peers in (related_nodes or {}).items():
+        data[relationship] = [client.store.get(key=peer).id for peer in peers]
+
+    return await create_and_save(
+        client=client,
+        log=log,
+        branch=branch,
+        object_name=object_name,
+        kind_name=kind_name,
+        data=data,
+        sync=sync,
+    )
+
+
+def request_allocation(
+    graph: ProvisioningGraph,
+    allocator: BulkIPAllocator,
+    log: logging.Logger,
+    resource_pool: InfrahubNode,
+    identifier: str,
+    data: Optional[Dict] = None,
+) -> Tuple[str, AllocationRequest]:
+    """Registers an IP allocation and the graph step resolving all the allocations of its pool."""
+    step_key = f"pool:{resource_pool.name.value}"
+    if step_key not in graph.steps:
+        graph.add(
+            key=step_key,
+            phase="ip_allocation",
+            task=resolve_pool_allocations,
+            allocator=allocator,
+            log=log,
+            resource_pool=resource_pool,
+        )
+    return step_key, allocator.request(resource_pool=resource_pool, identifier=identifier, data=data)
+
+
+async def resolve_pool_allocations(
+    allocator: BulkIPAllocator,
+    log: logging.Logger,
+    resource_pool: InfrahubNode,
+) -> List[AllocationRequest]:
+    allocations = await allocator.resolve_pool(resource_pool=resource_pool)
+    log.debug(f"- Allocated {len(allocations)} IP addresses from {resource_pool.name.value}")
+    return allocations
+
+
+async def add_group_members(
+    client: InfrahubClient,
+    log: logging.Logger,
+    group_name: str,
+    members: List[str],
+) -> None:
+    group_obj = client.store.get(kind="CoreStandardGroup", key=group_name)
+    member_ids = [client.store.get(key=member).id for member in members]
+    missing_members = [member_id for member_id in member_ids if member_id not in group_obj.members.peer_ids]
+    if missing_members:
+        await group_obj.add_relationships(relation_to_update="members", related_nodes=missing_members)
+    log.debug(f"- Added {len(missing_members)} members to group {group_name}")
+
+
+async def provision_servers_concurrently(
+    client: InfrahubClient,
+    log: logging.Logger,
+    branch: str,
+    duff_org_obj: InfrahubNode,
+    prefix_index: PrefixIndex,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    sync: Optional[IncrementalSync] = None,
+) -> None:
+    """Creates the Frontend Servers, VIPs and Load Balancers of all sites as a dependency graph.
+
+    The IP addresses are allocated in bulk, one step per pool, and assigned when the objects are created.
+    Objects that don't depend on each other run concurrently, the VIPs are only created once their
+    IP address and frontends exist.
+    """
+    graph = ProvisioningGraph(concurrency=concurrency)
+    allocator = BulkIPAllocator(client=client, branch=branch)
+    all_frontends = []
+    all_load_balancers = []
+
+    for site in SITES:
+        site_name = site[0]
+
+        # 4 Frontend Servers per site, the first 3 in Production and the 4th in Development
+        for i in range(1, 5):
+            vrf_label = "Production" if i < 4 else "Development"
+            site_vrf = client.store.get(kind="InfraVRF", key=vrf_label, raise_when_missing=False)
+            hostname = f"frontend{i}.{vrf_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}"
+            frontend_server_data = {
+                "hostname": hostname,
+                "environment": "production" if vrf_label == "Production" else "development",
+                "status": "active",
+                "organization": {"id": duff_org_obj.id},
+                "vrf": {"id": site_vrf.id},
+            }
+            frontend_ip_addresses = {}
+            frontend_dependencies = []
+
+            existing_frontend_ip = existing_peer_id(sync=sync, kind_name="ServerFrontend", object_name=hostname, relationship="ip_address")
+            if existing_frontend_ip:
+                frontend_server_data["ip_address"] = {"id": existing_frontend_ip}
+
+            frontend_ip_pool = prefix_index.pool(location=site_name, role="server", vrf=vrf_label)
+            if frontend_ip_pool and not existing_frontend_ip:
+                step_key, frontend_ip_addresses["ip_address"] = request_allocation(
+                    graph=graph, allocator=allocator, log=log, resource_pool=frontend_ip_pool, identifier=hostname
+                )
+                frontend_dependencies.append(step_key)
+
+            graph.add(
+                key=hostname,
+                phase="frontend",
+                task=create_with_relationships,
+                depends_on=frontend_dependencies,
+                client=client,
+                log=log,
+                branch=branch,
+                object_name=hostname,
+                kind_name="ServerFrontend",
+                data=frontend_server_data,
+                ip_addresses=frontend_ip_addresses,
+                sync=sync,
+            )
+            all_frontends.append(hostname)
+
+        # 3 VIPs per site, 2 for Production and 1 for Development
+        for j in range(1, 4):
+            if j < 3:
+                vip_label = "Production"
+                frontend_servers_for_vip_range = range(1, 4)
+            else:
+                vip_label = "Development"
+                frontend_servers_for_vip_range = range(4, 5)
+            vip_vrf = client.store.get(kind="InfraVRF", key=vip_label, raise_when_missing=False)
+
+            vip_hostname = f"vip{j}.{vip_label.lower()}.{site_name.lower()}.{EXTERNAL_DOMAIN}"
+            vip_data = {
+                "hostname": vip_hostname,
+                "mode": "http",
+                "balance": "roundrobin",
+                "status": "active",
+                "vrf": {"id": vip_vrf.id},
+            }
+            frontend_servers_for_vip = [
+                f"frontend{k}.{vip_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}" for k in frontend_servers_for_vip_range
+            ]
+            vip_ip_addresses = {}
+            vip_dependencies = list(frontend_servers_for_vip)
+
+            existing_vip_ip = existing_peer_id(sync=sync, kind_name="InfraVIP", object_name=vip_hostname, relationship="ip_address")
+            if existing_vip_ip:
+                vip_data["ip_address"] = {"id": existing_vip_ip}
+
+            vip_ip_pool = prefix_index.pool(location=site_name, role="public", vrf="Internet")
+            if vip_ip_pool and not existing_vip_ip:
+                step_key, vip_ip_addresses["ip_address"] = request_allocation(
+                    graph=graph, allocator=allocator, log=log, resource_pool=vip_ip_pool, identifier=vip_hostname
+                )
+                vip_dependencies.append(step_key)
+
+            graph.add(
+                key=vip_hostname,
+                phase="vip",
+                task=create_with_relationships,
+                depends_on=vip_dependencies,
+                client=client,
+                log=log,
+                branch=branch,
+                object_name=vip_hostname,
+                kind_name="InfraVIP",
+                data=vip_data,
+                ip_addresses=vip_ip_addresses,
+                related_nodes={"frontend_servers": frontend_servers_for_vip},
+                sync=sync,
+            )
+
+        # 1 Load Balancer per site with a private (DMZ) and a public (technical) IP address
+        lb_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
+        lb_hostname = f"lb.dmz.{site_name.lower()}.{INTERNAL_DOMAIN}"
+        load_balancer_data = {
+            "hostname": lb_hostname,
+            "environment": "production",
+            "status": "active",
+            "organization": {"id": duff_org_obj.id},
+            "vrf": {"id": lb_vrf.id},
+        }
+        lb_ip_addresses = {}
+        lb_dependencies = []
+
+        for attribute, role, vrf_label in (
+            ("ip_address", "dmz", "DMZ"),
+            ("public_ip_address", "technical", "Internet"),
+        ):
+            existing_lb_ip = existing_peer_id(sync=sync, kind_name="ServerLoadBalancer", object_name=lb_hostname, relationship=attribute)
+            if existing_lb_ip:
+                load_balancer_data[attribute] = {"id": existing_lb_ip}
+                continue
+            lb_ip_pool = prefix_index.pool(location=site_name, role=role, vrf=vrf_label)
+            if not lb_ip_pool:
+                continue
+            step_key, lb_ip_addresses[attribute] = request_allocation(
+                graph=graph,
+                allocator=allocator,
+                log=log,
+                resource_pool=lb_ip_pool,
+                identifier=lb_hostname,
+                data={"description": lb_hostname},
+            )
+            lb_dependencies.append(step_key)
+
+        graph.add(
+            key=lb_hostname,
+            phase="load_balancer",
+            task=create_with_relationships,
+            depends_on=lb_dependencies,
+            client=client,
+            log=log,
+            branch=branch,
+            object_name=lb_hostname,
+            kind_name="ServerLoadBalancer",
+            data=load_balancer_data,
+            ip_addresses=lb_ip_addresses,
+            sync=sync,
+        )
+        all_load_balancers.append(lb_hostname)
+
+    for group_name, members in (("web_servers", all_frontends), ("load_balancers", all_load_balancers)):
+        graph.add(
+            key=f"group:{group_name}",
+            phase="group_membership",
+            task=add_group_members,
+            depends_on=members,
+            client=client,
+            log=log,
+            group_name=group_name,
+            members=members,
+        )
+
+    start = time.perf_counter()
+    await graph.execute(log=log)
+    log.info(f"Provisioned {len(graph.steps)} steps in {time.perf_counter() - start:.2f}s")
+
+
+def plan_site_allocations(planner: AllocationPlanner, prefix_index: PrefixIndex) -> None:
+    """Registers the IP addresses the servers, VIPs and load balancers of each site are allocated, from the same pools."""
+    for site in SITES:
+        site_name = site[0]
+        requests = []
+        for i in range(1, 5):
+            vrf_label = "Production" if i < 4 else "Development"
+            hostname = f"frontend{i}.{vrf_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}"
+            requests.append(("ServerFrontend", hostname, "ip_address", ("server", vrf_label)))
+        for j in range(1, 4):
+            vip_label = "Production" if j < 3 else "Development"
+            vip_hostname = f"vip{j}.{vip_label.lower()}.{site_name.lower()}.{EXTERNAL_DOMAIN}"
+            requests.append(("InfraVIP", vip_hostname, "ip_address", ("public", "Internet")))
+        lb_hostname = f"lb.dmz.{site_name.lower()}.{INTERNAL_DOMAIN}"
+        requests.append(("ServerLoadBalancer", lb_hostname, "ip_address", ("dmz", "DMZ")))
+        requests.append(("ServerLoadBalancer", lb_hostname, "public_ip_address", ("technical", "Internet")))
+
+        for kind_name, identifier, relationship, (role, vrf_label) in requests:
+            entry = prefix_index.get(location=site_name, role=role, vrf=vrf_label)
+            if entry:
+                planner.add(pool_name=entry.pool_name, kind=kind_name, identifier=identifier, relationship=relationship)
+
+
 # --- RUN
-async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs) -> None:
+async def load(client: InfrahubClient, log: logging.Logger, branch: str, metrics: LoaderMetrics, **kwargs) -> None:
+    sync = None
+    if str(kwargs.get("incremental", "")).lower() in ("1", "true", "yes"):
+        metrics.start_phase("prefetch")
+        log.info("Prefetching existing objects")
+        sync = IncrementalSync(client=client, branch=branch, log=log)
+        await sync.prefetch_all(kinds=INCREMENTAL_KINDS)
+    prefix_index = PrefixIndex(prefixes=PREFIXES)
+    gateways = prefix_index.gateways(roles=("technical", "dmz", "server"))
+    source = kwargs.get("source")
+    concurrency = int(kwargs.get("concurrency", 0))
+    loader = None
+    if source:
+        loader = TopologyLoader(
+            client=client,
+            log=log,
+            branch=branch,
+            chunk_size=int(kwargs.get("chunk_size", DEFAULT_CHUNK_SIZE)),
+            concurrency=concurrency or DEFAULT_CONCURRENCY,
+        )
+
+    # ---- Check that the pools can allocate every address before writing anything
+    if str(kwargs.get("plan", "true")).lower() not in ("0", "false", "no"):
+        metrics.start_phase("planning")
+        log.info("Planning the IP address allocations")
+        planner = AllocationPlanner(client=client, log=log, branch=branch, prefix_index=prefix_index, reserved=gateways)
+        if loader:
+            planner.add_many(loader.pool_requests(path=Path(source)))
+        else:
+            plan_site_allocations(planner=planner, prefix_index=prefix_index)
+        await planner.check()
+
+    metrics.start_phase("organizations")
     log.info("Creating Organizations and ASNs")
     batch = await client.create_batch()
     # ---- Organization
@@ -236,17 +792,18 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         org_data = {
             "name": {"value": org[0], "is_protected": True},
         }
-        org_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind=f"Organization{org[1].title()}",
+            object_name=org[0],
+            kind_name=f"Organization{org[1].title()}",
             data=org_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=org_obj.save, allow_upsert=True, node=org_obj)
-        client.store.set(key=org[0], node=org_obj)
 
-    async for node, _ in batch.execute():
-        accessor = node._schema.human_friendly_id[0].split("__")[0]
-        log.debug(f"- Created {node._schema.kind} - {getattr(node, accessor).value}")
+    await execute_batch(batch=batch, log=log)
 
     duff_org_obj = client.store.get(kind="OrganizationTenant", key="Duff")
 
@@ -264,16 +821,20 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         if organization_type:
             data_asn["organization"] = {"id": client.store.get(kind=f"Organization{organization_type.title()}", key=asn[2]).id}
 
-        asn_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="InfraAutonomousSystem",
+            object_name=asn_name,
+            kind_name="InfraAutonomousSystem",
             data=data_asn,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=asn_obj.save, allow_upsert=True, node=asn_obj)
-        client.store.set(key=asn[0], node=asn_obj)
 
     await execute_batch(batch=batch, log=log)
 
+    metrics.start_phase("platforms")
     log.info("Creating Device Types and Platforms")
     # ---- Platforms
     batch = await client.create_batch()
@@ -290,16 +851,20 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         if manufacturer:
             platform_data["manufacturer"] = {"id": manufacturer.id}
 
-        platform_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="InfraPlatform",
+            object_name=platform[0],
+            kind_name="InfraPlatform",
             data=platform_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=platform_obj.save, allow_upsert=True, node=platform_obj)
-        client.store.set(key=platform[0], node=platform_obj)
 
     await execute_batch(batch=batch, log=log)
 
+    metrics.start_phase("groups")
     log.info("Creating standard groups")
     batch = await client.create_batch()
     for group in GROUPS:
@@ -307,16 +872,20 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
             "name": group[0],
             "label": group[1],
         }
-        group_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="CoreStandardGroup",
+            object_name=group[0],
+            kind_name="CoreStandardGroup",
             data=group_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=group_obj.save, allow_upsert=True, node=group_obj)
-        client.store.set(key=group[0], node=group_obj)
 
     await execute_batch(batch=batch, log=log)
 
+    metrics.start_phase("locations")
     log.info("Creating Locations")
     # ---- Countries
     batch = await client.create_batch()
@@ -326,13 +895,16 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
             "shortname": country[1],
         }
 
-        country_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="LocationCountry",
+            object_name=country[0],
+            kind_name="LocationCountry",
             data=country_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=country_obj.save, allow_upsert=True, node=country_obj)
-        client.store.set(key=country[0], node=country_obj)
 
     await execute_batch(batch=batch, log=log)
 
@@ -349,17 +921,18 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
             "parent": {"id": metro_area_parent_id},
         }
 
-        metro_area_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="LocationMetro",
+            object_name=metro_area[0],
+            kind_name="LocationMetro",
             data=metro_area_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=metro_area_obj.save, allow_upsert=True, node=metro_area_obj)
 
-    async for node, _ in batch.execute():
-        accessor = node._schema.default_filter.split("__")[0]
-        client.store.set(key=node.name.value, node=node)
-        log.debug(f"- Created [{node._schema.kind}] '{getattr(node, accessor).value}'")
+    await execute_batch(batch=batch, log=log)
 
     # ---- Sites
     batch = await client.create_batch()
@@ -382,16 +955,20 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         if site[4]:
             site_data["gps_coordinates"] = site[4]
 
-        site_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="LocationSite",
+            object_name=site[0],
+            kind_name="LocationSite",
             data=site_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=site_obj.save, allow_upsert=True, node=site_obj)
-        client.store.set(key=site[0], node=site_obj)
 
     await execute_batch(batch=batch, log=log)
 
+    metrics.start_phase("vrfs")
     log.info("Creating VRFs")
     batch = await client.create_batch()
     for vrf in VRFS:
@@ -406,18 +983,22 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         vrf_data["name"] = {"value": vrf_name}
         vrf_data["description"] = {"value": vrf_description}
 
-        vrf_obj = await client.create(
+        await create_and_add_to_batch(
+            client=client,
+            log=log,
             branch=branch,
-            kind="InfraVRF",
+            object_name=vrf_name,
+            kind_name="InfraVRF",
             data=vrf_data,
+            batch=batch,
+            sync=sync,
         )
-        batch.add(task=vrf_obj.save, allow_upsert=True, node=vrf_obj)
-        client.store.set(key=vrf_name, node=vrf_obj)
 
     await execute_batch(batch=batch, log=log)
 
     # ---- Prefixes
     default_ip_namespace_obj = await client.get(kind="IpamNamespace", name__value="default")
+    metrics.start_phase("prefixes")
     log.info("Creating Prefixes")
     batch = await client.create_batch()
     for prefix in PREFIXES:
@@ -457,32 +1038,31 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
             kind_name="IpamIPPrefix",
             data=pfx_data,
             batch=batch,
+            sync=sync,
         )
 
     await execute_batch(batch=batch, log=log)
 
-    for prefix in PREFIXES:
-        pfx = prefix["prefix"]
-        pfx_role = prefix["role"]
-        if pfx_role in ("technical", "dmz", "server"):
-            gw_addr = f"{str(ipaddress.ip_network(pfx, strict=False)[-2])}/{pfx.split('/')[1]}"
-            gw_data = {
-                "address": gw_addr
-            }
-            gw_obj = await create_and_save(
-                client=client,
-                log=log,
-                branch=branch,
-                object_name=gw_addr,
-                kind_name="IpamIPAddress",
-                data=gw_data,
-            )
-            pfx_obj = client.store.get(kind="IpamIPPrefix", key=pfx, raise_when_missing=False)
-            if pfx_obj:
-                pfx_obj.gateway= gw_obj
-                await pfx_obj.save()
+    for pfx, gw_addr in gateways.items():
+        gw_data = {
+            "address": gw_addr
+        }
+        gw_obj = await create_and_save(
+            client=client,
+            log=log,
+            branch=branch,
+            object_name=gw_addr,
+            kind_name="IpamIPAddress",
+            data=gw_data,
+            sync=sync,
+        )
+        pfx_obj = client.store.get(kind="IpamIPPrefix", key=pfx, raise_when_missing=False)
+        if pfx_obj and related_id(node=pfx_obj, relationship="gateway") != gw_obj.id:
+            pfx_obj.gateway= gw_obj
+            await pfx_obj.save()
 
     # ---- Resource Pools
+    metrics.start_phase("pools")
     log.info("Creating Resource Pools")
     asn_pool_data = {
         "name": "loadbalancer-private-asn",
@@ -499,23 +1079,15 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         object_name="loadbalancer-private-asn",
         kind_name="CoreNumberPool",
         data=asn_pool_data,
-        allow_upsert=False
+        allow_upsert=False,
+        sync=sync,
     )
 
     batch = await client.create_batch()
-    for prefix in PREFIXES:
-        pfx = prefix["prefix"]
-        pfx_location = prefix["location"]
-        pfx_role = prefix["role"]
-        pfx_vrf = prefix["vrf"]
-        pfx_descr = f"{pfx_role}"
-        if pfx_vrf and pfx_vrf != "DMZ":
-            pfx_descr += f".{pfx_vrf.lower()}"
-        if pfx_location:
-            pfx_descr += f".{pfx_location.lower()}"
-
-        pool_name = f"{pfx_descr}-{extract_common_prefix(prefix=pfx)}"
-        pool_desc = f"Pool for {pfx_descr}"
+    for entry in prefix_index:
+        pfx = entry.prefix
+        pool_name = entry.pool_name
+        pool_desc = f"Pool for {entry.description}"
         pool_data = {
             "name": pool_name ,
             "description": pool_desc,
@@ -527,7 +1099,7 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
         if prefix_obj:
             pool_data["resources"] = [prefix_obj]
 
-        if prefix["role"] == "supernet":
+        if entry.role == "supernet":
             pool_data["default_prefix_type"] = {"value": "IpamIPPrefix" }
             pool_data["default_member_type"] = {"value": "address" }
             kind = "CoreIPPrefixPool"
@@ -535,10 +1107,10 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
             pool_data["default_address_type"] = {"value": "IpamIPAddress" }
             kind = "CoreIPAddressPool"
 
-        if prefix["role"] == "public":
+        if entry.role == "public":
             pool_data["default_prefix_length"] = 32
 
-        await create_and_add_to_batch(
+        pool_obj = await create_and_add_to_batch(
             client=client,
             log=log,
             branch=branch,
@@ -546,191 +1118,44 @@ async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs
             kind_name=kind,
             data=pool_data,
             batch=batch,
+            sync=sync,
         )
+        prefix_index.set_pool(prefix=pfx, pool=pool_obj)
     await execute_batch(batch=batch, log=log)
 
 
     # ---- Frontend Servers and VIPs
-    web_srv_grp = client.store.get(kind="CoreStandardGroup", key="web_servers")
-    lb_grp = client.store.get(kind="CoreStandardGroup", key="load_balancers")
-    all_frontends = []
-    all_load_balancers = []
-    for site in SITES:
-        site_name = site[0]
-
-        # Create 4 Frontend Servers per site
-        for i in range(1, 5):
-            # Set VRF for server (Production VRF for the first 3, Development VRF for the 4th)
-            if i < 4:
-                site_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
-                vrf_label = "Production"
-            else:
-                site_vrf = client.store.get(kind="InfraVRF", key="Development", raise_when_missing=False)
-                vrf_label = "Development"
-
-            # Create frontend server data
-            hostname = f"frontend{i}.{vrf_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}"
-            frontend_server_data = {
-                "hostname": hostname,
-                "environment": "production" if vrf_label == "Production" else "development",
-                "status": "active",
-                "organization": {"id": duff_org_obj.id},
-                "vrf": {"id": site_vrf.id},
-            }
-
-            # Create frontend server object
-            frontend_server_obj = await create_and_save(
-                client=client,
-                log=log,
-                branch=branch,
-                object_name=hostname,
-                kind_name="ServerFrontend",
-                data=frontend_server_data,
-            )
-            all_frontends.append(frontend_server_obj.id)
-            # Get prefix for the site from the PREFIXES data
-            frontend_prefix = next((pfx["prefix"] for pfx in PREFIXES if pfx["location"] == site_name and pfx["role"] == "server" and pfx["vrf"] == vrf_label), None)
-
-            if frontend_prefix:
-                # Generate the frontend IP pool name using the new naming convention
-                frontend_ip_pool_name = generate_pool_name(vrf_label, site_name, frontend_prefix, "server")
-                frontend_ip_pool = client.store.get(kind="CoreIPAddressPool", key=frontend_ip_pool_name, raise_when_missing=False)
-
-                # Allocate IP for the frontend server from the correct pool
-                if frontend_ip_pool:
-                    frontend_ip_obj = await client.allocate_next_ip_address(
-                        resource_pool=frontend_ip_pool,
-                        identifier=hostname,
-                        data={"server": frontend_server_obj.id}
-                    )
-
-        # Create 3 VIPs per site (2 for production, 1 for development)
-        for j in range(1, 4):
-            # Set VRF for VIP (Production VRF for the first 2, Development VRF for the 3rd)
-            if j < 3:
-                vip_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
-                vip_label = "Production"
-                frontend_servers_for_vip_range = range(1, 4)
-            else:
-                vip_vrf = client.store.get(kind="InfraVRF", key="Development", raise_when_missing=False)
-                vip_label = "Development"
-                frontend_servers_for_vip_range = range(4, 5)
-
-            # Create VIP hostname and data
-            vip_hostname = f"vip{j}.{vip_label.lower()}.{site_name.lower()}.{EXTERNAL_DOMAIN}"
-            vip_data = {
-                "hostname": vip_hostname,
-                "mode": "http",  # Assuming HTTP for the VIP
-                "balance": "roundrobin",  # Assuming roundrobin for load balancing
-                "status": "active",
-                "vrf": {"id": vip_vrf.id},
-            }
-
-            # Get prefix for the site from the PREFIXES data (public internet)
-            vip_prefix = next((pfx["prefix"] for pfx in PREFIXES if pfx["location"] == site_name and pfx["role"] == "public" and pfx["vrf"] == "Internet"), None)
-
-            if vip_prefix:
-                # Generate the VIP IP pool name using the new naming convention
-                vip_ip_pool_name = generate_pool_name("internet", site_name, vip_prefix, "public")
-                vip_ip_pool = client.store.get(kind="CoreIPAddressPool", key=vip_ip_pool_name, raise_when_missing=False)
-
-                # Allocate VIP IP address from the correct pool
-                if vip_ip_pool:
-                    vip_ip_obj = await client.allocate_next_ip_address(
-                        resource_pool=vip_ip_pool,
-                        identifier=vip_hostname,
-                    )
-                    vip_data["ip_address"] = {"id": vip_ip_obj.id}
-
-            # Create VIP object
-            vip_obj = await create_and_save(
-                    client=client,
-                    log=log,
-                    branch=branch,
-                    object_name=vip_hostname,
-                    kind_name="InfraVIP",
-                    data=vip_data,
-                )
-
-            # Associate the frontend servers created above with the VIP
-            frontend_servers_for_vip = [
-                client.store.get(kind="ServerFrontend", key=f"frontend{k}.{vip_label.lower()}.{site_name.lower()}.{INTERNAL_DOMAIN}") for k in frontend_servers_for_vip_range
-            ]
-            # vip_obj.frontend_servers.fetch()
-            frontend_servers = [server.id for server in frontend_servers_for_vip]
-            await vip_obj.add_relationships(relation_to_update="frontend_servers", related_nodes=frontend_servers)
-            await vip_obj.save()
-
-        lb_vrf = client.store.get(kind="InfraVRF", key="Production", raise_when_missing=False)
-        vrf_label = "Production"
-
-        # Create Load Balancer hostname
-        lb_hostname = f"lb.dmz.{site_name.lower()}.{INTERNAL_DOMAIN}"
-
-        # Create Load Balancer data
-        load_balancer_data = {
-            "hostname": lb_hostname,
-            "environment": "production",
-            "status": "active",
-            "organization": {"id": duff_org_obj.id},
-            "vrf": {"id": lb_vrf.id},
-        }
-
-        # Create the Load Balancer object
-        load_balancer_obj = await create_and_save(
-            client=client,
-            log=log,
-            branch=branch,
-            object_name=lb_hostname,
-            kind_name="ServerLoadBalancer",
-            data=load_balancer_data,
+    metrics.start_phase("servers")
+    if loader:
+        log.info(f"Loading Servers, VIPs and Load Balancers from {source}")
+        await loader.load(path=Path(source))
+    elif concurrency:
+        log.info(f"Creating Servers, VIPs and Load Balancers (concurrency: {concurrency})")
+        await provision_servers_concurrently(
+            client=client, log=log, branch=branch, duff_org_obj=duff_org_obj, prefix_index=prefix_index, concurrency=concurrency, sync=sync
+        )
+    else:
+        await provision_servers_sequentially(
+            client=client, log=log, branch=branch, duff_org_obj=duff_org_obj, prefix_index=prefix_index, sync=sync
         )
 
-        all_load_balancers.append(load_balancer_obj.id)
-
-        # --- Allocate Private IP Address ---
-        # Get private prefix for the site from the PREFIXES data
-        private_prefix = next((pfx["prefix"] for pfx in PREFIXES if pfx["location"] == site_name and pfx["role"] == "dmz" and pfx["vrf"] == "DMZ"), None)
-
-        if private_prefix:
-            # Generate the Load Balancer private IP pool name using the new naming convention
-            private_ip_pool_name = generate_pool_name(None, site_name, private_prefix, "dmz")
-            private_ip_pool = client.store.get(kind="CoreIPAddressPool", key=private_ip_pool_name, raise_when_missing=False)
-
-            # Allocate private IP for the Load Balancer from the correct pool
-            if private_ip_pool:
-                private_ip_obj = await client.allocate_next_ip_address(
-                    resource_pool=private_ip_pool,
-                    identifier=lb_hostname,
-                    data={"description": load_balancer_obj.hostname.value}
-                )
-
-                # Assign the allocated private IP to the Load Balancer
-                if private_ip_obj:
-                    load_balancer_obj.ip_address = {"id": private_ip_obj.id}
-
-        # --- Allocate Public IP Address ---
-        # Get public prefix for the site from the PREFIXES data
-        tech_prefix = next((pfx["prefix"] for pfx in PREFIXES if pfx["location"] == site_name and pfx["role"] == "technical" and pfx["vrf"] == "Internet"), None)
-
-        if tech_prefix:
-            # Generate the Load Balancer public IP pool name using the new naming convention
-            tech_ip_pool_name = generate_pool_name("internet", site_name, tech_prefix, "technical")
-            tech_ip_pool = client.store.get(kind="CoreIPAddressPool", key=tech_ip_pool_name, raise_when_missing=False)
-
-            # Allocate public IP for the Load Balancer from the correct pool
-            if tech_ip_pool:
-                tech_ip_obj = await client.allocate_next_ip_address(
-                    resource_pool=tech_ip_pool,
-                    identifier=lb_hostname,
-                    data={"description": load_balancer_obj.hostname.value}
-                )
-                # Assign the allocated public IP to the Load Balancer
-                if tech_ip_obj:
-                    load_balancer_obj.public_ip_address = {"id": tech_ip_obj.id}
+    metrics.end_phase()
+    if sync:
+        sync.log_summary()
 
-        # Save the Load Balancer object with the assigned private and public IPs
-        await load_balancer_obj.save()
 
-    await web_srv_grp.add_relationships(relation_to_update="members", related_nodes=all_frontends)
-    await lb_grp.add_relationships(relation_to_update="members", related_nodes=all_load_balancers)
+async def run(client: InfrahubClient, log: logging.Logger, branch: str, **kwargs) -> None:
+    """Load the data, `metrics=<path>` (or LB_VIP_LOADER_METRICS) records the requests of each phase to a JSON or
+    .prom file and LB_VIP_LOADER_PROFILE=cprofile|pyinstrument profiles the whole load."""
+    metrics = LoaderMetrics()
+    metrics_path = kwargs.pop("metrics", None) or os.environ.get(METRICS_ENV)
+    if metrics_path:
+        metrics.instrument(client)
+
+    with profiled(mode=kwargs.pop("profile", None), log=log):
+        await load(client=client, log=log, branch=branch, metrics=metrics, **kwargs)
+
+    if metrics_path:
+        metrics.log_summary(log)
+        metrics.export(path=Path(metrics_path))
+        log.info(f"Wrote the metrics of the loader to {metrics_path}")
@@ -1,6 +1,10 @@
+import asyncio
+import json
+import logging
 import os
 
 from pathlib import Path
+from typing import List, Optional
 
 from invoke import task, Context  # type: ignore
 
@@ -17,13 +21,254 @@ def start(context: Context) -> None:
     context.run(f"{COMPOSE_COMMAND} up -d")
 
 @task
-def load_schema(context: Context, schema: Path=Path("./models/**/*.yml")) -> None:
-    context.run(f"infrahubctl schema load {schema}")
+def load_schema(context: Context, schema: Path=Path("./models/**/*.yml"), branch: str="", force: bool=False) -> None:
+    """Load the schema files, skipped when neither the files nor the schema of the branch changed since the last load."""
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.schema_sync import SchemaSync, schema_paths
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sync = SchemaSync(
+        client=InfrahubClient(),
+        log=logging.getLogger("load-schema"),
+        paths=schema_paths(pattern=str(schema)),
+        branch=branch or None,
+    )
+    asyncio.run(sync.sync(force=force))
 
 @task
-def load_data(context: Context) -> None:
+def load_data(
+    context: Context,
+    concurrency: int=0,
+    incremental: bool=False,
+    source: str="",
+    metrics: str="",
+    profile: str="",
+    plan: bool=True,
+) -> None:
+    variables = ""
+    if source:
+        variables += f" source={Path(source).resolve()}"
+    if concurrency:
+        variables += f" concurrency={concurrency}"
+    if incremental:
+        variables += " incremental=true"
+    if metrics:
+        variables += f" metrics={Path(metrics).resolve()}"
+    if profile:
+        variables += f" profile={profile}"
+    if not plan:
+        variables += " plan=false"
     for generator in DATA_GENERATORS:
-        context.run(f"infrahubctl run scripts/{generator}")
+        context.run(f"infrahubctl run scripts/{generator}{variables}")
+
+@task
+def sync_queries(context: Context, check: bool=False) -> None:
+    """Copy the fragments of transforms/fragments.gql into the stored queries using them."""
+    from lbvip.queries import QUERY_FILES, load_fragments, sync_query_file
+
+    fragments = load_fragments()
+    outdated = [path for path in QUERY_FILES if sync_query_file(path=path, fragments=fragments, check=check)]
+    for path in outdated:
+        print(f"{'Outdated' if check else 'Updated'} {path.relative_to(Path.cwd())}")
+    if check and outdated:
+        raise SystemExit(1)
+
+@task
+def render_all(
+    context: Context, output: str="artifacts", branch: str="", concurrency: int=10, workers: int=0, force: bool=False
+) -> None:
+    """Render the haproxy, bird and nginx artifacts of all the Load Balancers and Frontend Servers."""
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.artifacts import FleetRenderer
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    renderer = FleetRenderer(
+        client=InfrahubClient(),
+        log=logging.getLogger("render-all"),
+        output=Path(output),
+        branch=branch or None,
+        concurrency=concurrency,
+        workers=workers or None,
+        force=force,
+    )
+    asyncio.run(renderer.run())
+    renderer.report()
+
+@task
+def bird_routes(context: Context, hostname: str="", branch: str="", concurrency: int=10) -> None:
+    """Report the prefixes each Load Balancer announces over BGP for its VIPs, --hostname takes a comma separated list."""
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.aggregation import route_report
+
+    announcements = asyncio.run(
+        route_report(
+            client=InfrahubClient(),
+            branch=branch or None,
+            hostnames=[name for name in hostname.split(",") if name],
+            concurrency=concurrency,
+        )
+    )
+    report = {
+        "vips": sum(announcement.vips for announcement in announcements),
+        "routes": sum(announcement.routes for announcement in announcements),
+        "load_balancers": [announcement.to_json() for announcement in announcements],
+    }
+    print(json.dumps(report, indent=2))
+
+@task
+def build_dependencies(context: Context, branch: str="", index: str="artifacts/.dependencies.json") -> None:
+    """Build the reverse-dependency index from the objects to the artifacts using them."""
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.dependencies import DependencyIndex
+
+    dependencies = DependencyIndex()
+    asyncio.run(dependencies.build(client=InfrahubClient(), branch=branch or None))
+    dependencies.save(path=Path(index))
+    print(f"Indexed the dependencies of {len(dependencies)} artifact targets in {index}")
+
+@task(iterable=["refresh"])
+def affected(
+    context: Context, objects: str, branch: str="", index: str="artifacts/.dependencies.json", refresh: Optional[List[str]]=None
+) -> None:
+    """List the artifacts affected by a change to some objects (comma separated ids, hostnames or addresses).
+
+    The objects given with --refresh KIND:ID are fetched again and the index is updated before answering.
+    """
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.dependencies import DependencyIndex
+
+    dependencies = DependencyIndex.load(path=Path(index))
+    if refresh:
+        client = InfrahubClient()
+        for kind_id in refresh:
+            kind, node_id = kind_id.split(":", 1)
+            asyncio.run(dependencies.refresh(client=client, kind=kind, ids=[node_id], branch=branch or None))
+        dependencies.save(path=Path(index))
+    print(json.dumps(dependencies.affected(objects.split(",")), indent=2))
+
+@task
+def benchmark(
+    context: Context,
+    sites: int=3,
+    frontends: int=4,
+    vips: int=3,
+    members: int=3,
+    iterations: int=5,
+    only: str="",
+    output: str="",
+) -> None:
+    """Time the check, the transforms and the loader on a synthetic topology, the results are printed as JSON.
+
+    --only takes a comma separated list of benchmarks, --output writes the results to a file instead.
+    """
+    from lbvip.benchmark import BenchmarkSuite, SyntheticTopology
+
+    suite = BenchmarkSuite(
+        topology=SyntheticTopology(sites=sites, frontends=frontends, vips=vips, members=members), iterations=iterations
+    )
+    suite.run(selected=only.split(",") if only else None)
+    report = json.dumps(suite.report(), indent=2)
+    if output:
+        Path(output).write_text(report + "\n")
+        print(f"Wrote the results of {len(suite.results)} benchmarks to {output}")
+    else:
+        print(report)
+
+@task
+def offline(context: Context, concurrency: int=0, source: str="", output: str="") -> None:
+    """Load the data, run the check and render the artifacts against an in-memory Infrahub, without the containers.
+
+    The timings of each step are printed as JSON, --output writes the rendered artifacts to a directory.
+    """
+    from lbvip.offline import OfflineInfrahub, offline_client, run_demo
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    backend = OfflineInfrahub()
+    options = {"concurrency": concurrency} if concurrency else {}
+    if source:
+        options["source"] = str(Path(source).resolve())
+    report = asyncio.run(
+        run_demo(
+            client=offline_client(backend=backend),
+            log=logging.getLogger("offline"),
+            output=Path(output) if output else None,
+            **options,
+        )
+    )
+    report["nodes"] = len(backend.nodes)
+    report["operations"] = dict(backend.stats)
+    print(json.dumps(report, indent=2))
+
+@task
+def deploy(
+    context: Context,
+    artifacts: str="artifacts",
+    target: str="deployed",
+    branch: str="",
+    workers: int=10,
+    max_unavailable: int=50,
+) -> None:
+    """Push the artifacts rendered by render-all to the Load Balancers and Frontend Servers in rolling batches.
+
+    --target is a directory standing in for the hosts (one sub-directory per host), or ssh://<user> to deploy over SSH.
+    --max-unavailable is the percentage of the hosts of a location and group deployed at the same time.
+    """
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.deploy import LocalTarget, RollingDeployment, SSHTarget
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    deployment = RollingDeployment(
+        client=InfrahubClient(),
+        log=logging.getLogger("deploy"),
+        target=SSHTarget(username=target[len("ssh://") :] or None) if target.startswith("ssh://") else LocalTarget(root=Path(target)),
+        artifacts=Path(artifacts),
+        branch=branch or None,
+        workers=workers,
+        max_unavailable=max_unavailable / 100,
+    )
+    report = asyncio.run(deployment.run())
+    print(json.dumps(report.to_json(), indent=2))
+    if report.failed:
+        raise SystemExit(1)
+
+@task
+def haproxy_sync(
+    context: Context,
+    hostname: str,
+    socket: str="/run/haproxy/admin.sock",
+    config: str="",
+    reload_command: str="systemctl reload haproxy",
+    state: str=".haproxy-runtime",
+    branch: str="",
+    force_reload: bool=False,
+) -> None:
+    """Apply the changes of the frontends of a Load Balancer through the HAProxy runtime API, reload only when needed.
+
+    --socket is the admin socket of HAProxy, a unix socket path or host:port.
+    --config is where the rendered configuration is written when it changes.
+    """
+    from infrahub_sdk import InfrahubClient
+
+    from lbvip.haproxy_runtime import RuntimeSocket, RuntimeSync
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    runtime_sync = RuntimeSync(
+        client=InfrahubClient(),
+        log=logging.getLogger("haproxy"),
+        socket=RuntimeSocket(address=socket),
+        reload=lambda: context.run(reload_command),
+        config=Path(config) if config else None,
+        branch=branch or None,
+        state_directory=Path(state),
+    )
+    plan = asyncio.run(runtime_sync.sync(hostname=hostname, force_reload=force_reload))
+    print(json.dumps(plan.to_json(), indent=2))
 
 @task
 def destroy(context: Context) -> None:
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+import pytest
+
+from infrahub_sdk import InfrahubClient
+
+from lbvip.offline import OfflineInfrahub, init_data_module, offline_client
+
+LOG = logging.getLogger("tests")
+
+
+@pytest.fixture
+def log() -> logging.Logger:
+    return LOG
+
+
+@pytest.fixture
+def backend() -> OfflineInfrahub:
+    return OfflineInfrahub()
+
+
+@pytest.fixture
+def client(backend: OfflineInfrahub) -> InfrahubClient:
+    return offline_client(backend=backend)
+
+
+@pytest.fixture
+def demo_client(client: InfrahubClient) -> InfrahubClient:
+    """Offline client holding the data of scripts/init_data.py."""
+    asyncio.run(init_data_module().run(client=client, log=LOG, branch="main"))
+    return client
@@ -0,0 +1,42 @@
+import asyncio
+
+from lbvip.artifact_sync import CHANGED, FAILED, MISSING, UNCHANGED, ArtifactSync, checksum
+
+
+# Artifact whose object was lost by the object store, the download returns an error instead
+LOST = "lost"
+
+
+async def publish(client, contents):
+    """Artifacts of the haproxy_config definition for the load balancers, the ones without content are still pending."""
+    definition = await client.create(
+        kind="CoreArtifactDefinition", name="haproxy_config", artifact_name="haproxy_config", content_type="text/plain"
+    )
+    await definition.save()
+    lbs = sorted(await client.all(kind="ServerLoadBalancer"), key=lambda lb: lb.hostname.value)
+    for lb, content in zip(lbs, contents):
+        data = {"name": "haproxy_config", "status": "Pending", "object": lb.id, "definition": definition.id}
+        if content is not None:
+            stored = {"identifier": "unknown"} if content is LOST else await client.object_store.upload(content=content)
+            data.update(status="Ready", checksum=checksum(content), storage_id=stored["identifier"])
+        artifact = await client.create(kind="CoreArtifact", data=data)
+        await artifact.save()
+    return [lb.display_label for lb in lbs]
+
+
+def test_sync_reports_missing_and_failed_artifacts(demo_client, tmp_path):
+    targets = asyncio.run(publish(demo_client, ["global\n", None, LOST]))
+    sync = ArtifactSync(client=demo_client, artifact_name="haproxy_config", destination=tmp_path)
+
+    synced = {artifact.target: artifact for artifact in asyncio.run(sync.run())}
+    assert synced[targets[0]].status == CHANGED
+    assert (tmp_path / targets[0]).read_text() == "global\n"
+    assert synced[targets[1]].status == MISSING
+    assert not (tmp_path / targets[1]).exists()
+    # The object of the third artifact can't be downloaded, the others are still synchronized
+    assert synced[targets[2]].status == FAILED
+    assert "doesn't match the checksum" in synced[targets[2]].error
+    assert not (tmp_path / targets[2]).exists()
+
+    synced = {artifact.target: artifact for artifact in asyncio.run(sync.run())}
+    assert synced[targets[0]].status == UNCHANGED
@@ -0,0 +1,96 @@
+import asyncio
+
+from typing import List
+
+import pytest
+
+from checks.validate_lb_and_vip import InfrahubCheckLBVIPBackendLocationEnvironment
+from lbvip.consistency import resolve_location
+from lbvip.ipam import PrefixIndex
+from lbvip.offline import REPOSITORY_ROOT
+
+PREFIXES = [
+    {"prefix": "10.0.0.0/8", "location": None, "role": "supernet", "vrf": None},
+    {"prefix": "10.1.0.0/16", "location": "FRA", "role": "supernet", "vrf": None},
+    {"prefix": "10.1.2.0/24", "location": "FRA", "role": "server", "vrf": "Production"},
+    {"prefix": "2001:db8::/32", "location": "PAR", "role": "public", "vrf": "Internet"},
+]
+
+# The location of the VIPs as Infrahub resolves it, from the prefix of their IP address
+VIP_LOCATIONS_QUERY = """
+query {
+  InfraVIP {
+    edges {
+      node {
+        hostname { value }
+        ip_address {
+          node {
+            ip_prefix {
+              node {
+                ... on IpamIPPrefix {
+                  location { node { id name { value } } }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+@pytest.mark.parametrize(
+    "address,prefix",
+    [
+        ("10.1.2.3", "10.1.2.0/24"),
+        ("10.1.2.3/24", "10.1.2.0/24"),
+        ("10.1.3.1", "10.1.0.0/16"),
+        ("10.200.0.1", "10.0.0.0/8"),
+        ("2001:db8::1", "2001:db8::/32"),
+        ("192.0.2.1", None),
+    ],
+)
+def test_prefix_lookup(address, prefix):
+    entry = PrefixIndex(prefixes=PREFIXES).lookup(address)
+    assert (entry.prefix if entry else None) == prefix
+
+
+async def attach_vips(client) -> List[str]:
+    """Attach every VIP to the first load balancer, the VIPs of the other locations don't match it."""
+    lb = (await client.all(kind="ServerLoadBalancer"))[0]
+    for vip in await client.all(kind="InfraVIP"):
+        await vip.load_balancers.fetch()
+        vip.load_balancers.add(lb)
+        await vip.save()
+
+    lbs = (await client.execute_graphql(query=VIP_LOCATIONS_QUERY.replace("InfraVIP", "ServerLoadBalancer")))
+    lb_location = next(
+        resolve_location(edge["node"])
+        for edge in lbs["ServerLoadBalancer"]["edges"]
+        if edge["node"]["hostname"]["value"] == lb.hostname.value
+    )
+    vips = (await client.execute_graphql(query=VIP_LOCATIONS_QUERY))["InfraVIP"]["edges"]
+    return sorted(edge["node"]["hostname"]["value"] for edge in vips if resolve_location(edge["node"]) != lb_location)
+
+
+def mismatched_vips(check: InfrahubCheckLBVIPBackendLocationEnvironment) -> List[str]:
+    messages = [error["message"] for error in check.errors if error["message"].startswith("VIP ")]
+    return sorted(message.split()[1] for message in messages)
+
+
+@pytest.mark.parametrize("page_size", [0, 2])
+def test_check_locations(demo_client, page_size):
+    async def main() -> None:
+        expected = await attach_vips(demo_client)
+        assert expected
+
+        check = InfrahubCheckLBVIPBackendLocationEnvironment(
+            branch="main", client=demo_client, root_directory=str(REPOSITORY_ROOT)
+        )
+        check.page_size = page_size
+        assert not await check.run()
+        assert mismatched_vips(check) == expected
+
+    asyncio.run(main())
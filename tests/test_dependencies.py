@@ -0,0 +1,64 @@
+from typing import Dict, List
+
+from lbvip.dependencies import DependencyIndex
+
+LB1_ARTIFACTS = {"bird_config": ["lb1.example"], "haproxy_config": ["lb1.example"]}
+
+# node id -> (kind, label, relationships)
+OBJECTS: Dict[str, tuple] = {
+    "lb1": ("ServerLoadBalancer", "lb1.example", {"ip_address": ["ip-lb1"], "virtual_ips": ["vip1"]}),
+    "vip1": ("InfraVIP", "vip1.example", {"ip_address": ["ip-vip1"], "frontend_servers": ["fe1"]}),
+    "fe1": ("ServerFrontend", "fe1.example", {"ip_address": ["ip-fe1"]}),
+    "fe2": ("ServerFrontend", "fe2.example", {"ip_address": ["ip-fe2"]}),
+}
+
+
+def build(objects: Dict[str, tuple]) -> DependencyIndex:
+    index = DependencyIndex()
+    for node_id, (kind, label, relationships) in objects.items():
+        index.update(node_id=node_id, kind=kind, relationships=relationships, label=label)
+    return index
+
+
+def frontends(index: DependencyIndex, vip_id: str) -> List[str]:
+    return index.edges[vip_id].get("frontend_servers", [])
+
+
+def test_set_relationship_updates_both_sides():
+    index = DependencyIndex()
+    index.register("lb1", kind="ServerLoadBalancer")
+
+    changed = index.set_relationship("lb1", "virtual_ips", ["vip1", "vip2"])
+    assert changed == {"lb1", "vip1", "vip2"}
+    assert index.kinds["vip1"] == "InfraVIP"
+    assert index.edges["vip1"]["load_balancers"] == ["lb1"]
+
+    changed = index.set_relationship("vip1", "load_balancers", [])
+    assert changed == {"vip1", "lb1"}
+    assert index.edges["lb1"]["virtual_ips"] == ["vip2"]
+
+    # Relationships without another side are left alone
+    assert index.set_relationship("lb1", "ip_address", ["ip-lb1"]) == {"lb1"}
+    assert "ip-lb1" not in index.edges
+
+
+def test_update_matches_a_full_build():
+    index = build(OBJECTS)
+    assert index.affected(["ip-fe1"]) == {**LB1_ARTIFACTS, "ngninx_config": ["fe1.example"]}
+    assert index.affected(["ip-fe2"]) == {"ngninx_config": ["fe2.example"]}
+
+    # fe2 replaces fe1 behind vip1, from the side of the frontends
+    targets = index.update(node_id="fe1", kind="ServerFrontend", relationships={"virtual_ips": []})
+    targets |= index.update(node_id="fe2", kind="ServerFrontend", relationships={"virtual_ips": ["vip1"]})
+    assert targets == {"lb1", "fe1", "fe2"}
+    assert frontends(index, "vip1") == ["fe2"]
+    assert index.affected(["ip-fe1"]) == {"ngninx_config": ["fe1.example"]}
+    assert index.affected(["fe2.example"]) == {**LB1_ARTIFACTS, "ngninx_config": ["fe2.example"]}
+
+    objects = dict(OBJECTS)
+    objects["vip1"] = ("InfraVIP", "vip1.example", {"ip_address": ["ip-vip1"], "frontend_servers": ["fe2"]})
+    rebuilt = build(objects)
+    assert index.dependencies == rebuilt.dependencies
+    assert {node: targets for node, targets in index.dependents.items() if targets} == {
+        node: targets for node, targets in rebuilt.dependents.items() if targets
+    }
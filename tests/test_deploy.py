@@ -0,0 +1,105 @@
+import asyncio
+
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from lbvip.artifacts import FleetRenderer
+from nornir.core.inventory import Host
+
+from lbvip.deploy import SERVICES, DeploymentReport, LocalTarget, RollingDeployment, rolling_batches
+
+
+@pytest.fixture
+def artifacts(demo_client, log, tmp_path) -> Path:
+    output = tmp_path / "artifacts"
+    asyncio.run(FleetRenderer(client=demo_client, log=log, output=output, workers=1).run())
+    return output
+
+
+def deploy(client, log, target: LocalTarget, artifacts: Path) -> DeploymentReport:
+    return asyncio.run(RollingDeployment(client=client, log=log, target=target, artifacts=artifacts, workers=4).run())
+
+
+def rendered(artifacts: Path) -> Dict[str, List[str]]:
+    """Definitions rendered for each host."""
+    return {host.name: sorted(path.stem for path in host.glob("*.conf")) for host in artifacts.iterdir() if host.is_dir()}
+
+
+def running(root: Path, host: str, definition: str) -> Path:
+    return root / host / SERVICES[definition].path.lstrip("/")
+
+
+def test_deploy(demo_client, log, artifacts, tmp_path):
+    root = tmp_path / "hosts"
+    hosts = rendered(artifacts)
+
+    report = deploy(demo_client, log, LocalTarget(root=root), artifacts)
+    assert report.failed == {}
+    assert report.skipped == []
+    assert sorted(report.deployed) == sorted(hosts)
+    for host, definitions in hosts.items():
+        assert sorted(report.deployed[host]) == sorted(SERVICES[definition].name for definition in definitions)
+        for definition in definitions:
+            assert running(root, host, definition).read_text() == (artifacts / host / f"{definition}.conf").read_text()
+        commands = (root / host / "commands.log").read_text().splitlines()
+        for definition in definitions:
+            service = SERVICES[definition]
+            assert service.validate.format(path=f"{service.path}.new") in commands
+            assert service.reload in commands
+
+    # The configurations are already running, nothing is uploaded again
+    report = deploy(demo_client, log, LocalTarget(root=root), artifacts)
+    assert report.deployed == {}
+    assert sorted(report.unchanged) == sorted(hosts)
+
+
+def test_deploy_rejected(demo_client, log, artifacts, tmp_path):
+    root = tmp_path / "hosts"
+    deploy(demo_client, log, LocalTarget(root=root), artifacts)
+    frontend = sorted(host for host, definitions in rendered(artifacts).items() if definitions == ["ngninx_config"])[0]
+    previous = running(root, frontend, "ngninx_config").read_text()
+    (artifacts / frontend / "ngninx_config.conf").write_text(previous + "# changed\n")
+
+    report = deploy(demo_client, log, LocalTarget(root=root, reject=["nginx"]), artifacts)
+    assert report.deployed == {}
+    assert list(report.failed) == [frontend]
+    assert "nginx rejected by the target" in report.failed[frontend]
+    assert frontend not in report.skipped + report.unchanged
+    # The running configuration is kept and the rejected one discarded, without reloading the service
+    assert running(root, frontend, "ngninx_config").read_text() == previous
+    assert not running(root, frontend, "ngninx_config").with_suffix(".conf.new").exists()
+    commands = (root / frontend / "commands.log").read_text().splitlines()
+    assert commands[-1] == "rm -f /etc/nginx/nginx.conf.new"
+    assert commands.count(SERVICES["ngninx_config"].reload) == 1
+
+
+def hosts(location: str, group: str, count: int) -> List[Host]:
+    return [
+        Host(name=f"{location}-{group}{index}", data={"location": location, "deploy_groups": [group]})
+        for index in range(1, count + 1)
+    ]
+
+
+@pytest.mark.parametrize(
+    "count,max_unavailable,expected",
+    [
+        # A single host can only be updated in place
+        (1, 0.5, [["fra-lb1"]]),
+        (2, 1.0, [["fra-lb1"], ["fra-lb2"]]),
+        (3, 0.5, [["fra-lb1", "fra-lb2"], ["fra-lb3"]]),
+        (4, 0.5, [["fra-lb1", "fra-lb2"], ["fra-lb3", "fra-lb4"]]),
+        (4, 0.1, [["fra-lb1"], ["fra-lb2"], ["fra-lb3"], ["fra-lb4"]]),
+    ],
+)
+def test_rolling_batches(count, max_unavailable, expected):
+    assert rolling_batches(hosts("fra", "lb", count), max_unavailable=max_unavailable) == expected
+
+
+def test_rolling_batches_per_location_and_group():
+    both = Host(name="fra-both", data={"location": "fra", "deploy_groups": ["lb", "web"]})
+    batches = rolling_batches(hosts("fra", "lb", 2) + hosts("fra", "web", 1) + hosts("par", "lb", 2) + [both])
+
+    # Each (location, group) keeps a host serving in every batch, a host in two groups is deployed once
+    assert batches == [["fra-both", "fra-lb1", "par-lb1"], ["fra-lb2", "fra-web1", "par-lb2"]]
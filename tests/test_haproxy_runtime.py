@@ -0,0 +1,256 @@
+import asyncio
+import json
+
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+import pytest
+
+from lbvip.haproxy_runtime import FakeRuntimeServer, RuntimePlan, RuntimeSocket, RuntimeSync, backend_name, failed
+from lbvip.models import LoadBalancer, load_balancers
+
+
+class Harness:
+    """A load balancer of the offline demo synchronized with RuntimeSync against a FakeRuntimeServer."""
+
+    def __init__(self, client, log, directory: Path) -> None:
+        self.client = client
+        self.server = FakeRuntimeServer(str(directory / "admin.sock"))
+        self.reloads = 0
+        self.config = directory / "haproxy.cfg"
+        self.sync = RuntimeSync(
+            client=client,
+            log=log,
+            socket=RuntimeSocket(self.server.path),
+            reload=self.reload,
+            config=self.config,
+            state_directory=directory / "state",
+        )
+        self.hostname = ""
+        self.backend = ""
+        self.frontend = ""
+
+    def reload(self) -> None:
+        self.reloads += 1
+
+    @property
+    def servers(self) -> Dict[str, Dict[str, Any]]:
+        return self.server.backends[self.backend]
+
+    def state(self) -> LoadBalancer:
+        return load_balancers(json.loads(self.sync.state_path(self.hostname).read_text()))[0]
+
+    async def setup(self) -> None:
+        """Attach a VIP with frontends to a load balancer and render its configuration once."""
+        lb = (await self.client.all(kind="ServerLoadBalancer"))[0]
+        vips = await self.client.all(kind="InfraVIP", prefetch_relationships=True)
+        vip = next(vip for vip in vips if vip.frontend_servers.peers)
+        await vip.load_balancers.fetch()
+        vip.load_balancers.add(lb)
+        await vip.save()
+
+        self.hostname = lb.hostname.value
+        await self.server.start()
+        await self.run()
+        current = next(current for current in self.state().vips if current.hostname == vip.hostname.value)
+        self.backend = backend_name(current)
+        self.frontend = next(member.hostname for member in current.members if member.active)
+
+    async def run(self, force_reload: bool = False) -> RuntimePlan:
+        self.server.commands.clear()
+        plan = await self.sync.sync(hostname=self.hostname, force_reload=force_reload)
+        if plan.reload:
+            # The reloaded HAProxy starts the servers of the new configuration
+            self.server.load(self.state())
+        return plan
+
+    async def update(self, kind: str, hostname: str, **values: Any) -> None:
+        node = await self.client.get(kind=kind, hostname__value=hostname)
+        for name, value in values.items():
+            if hasattr(getattr(node, name), "value"):
+                getattr(node, name).value = value
+            else:
+                setattr(node, name, value)
+        await node.save()
+
+
+@pytest.fixture
+def scenario(demo_client, log, tmp_path) -> Callable[[Callable[[Harness], Awaitable[None]]], None]:
+    def run(steps: Callable[[Harness], Awaitable[None]]) -> None:
+        async def main() -> None:
+            harness = Harness(client=demo_client, log=log, directory=tmp_path)
+            try:
+                await harness.setup()
+                await steps(harness)
+            finally:
+                await harness.server.stop()
+
+        asyncio.run(main())
+
+    return run
+
+
+def actions(plan: RuntimePlan) -> List[str]:
+    return [change.action for change in plan.changes]
+
+
+def test_first_sync_reloads(scenario):
+    async def steps(harness: Harness) -> None:
+        assert harness.reloads == 1
+        assert f"backend {harness.backend}" in harness.config.read_text()
+        assert harness.servers[harness.frontend]["state"] == "ready"
+
+        plan = await harness.run()
+        assert not plan.reload
+        assert plan.changes == []
+        assert harness.server.commands == []
+        assert harness.reloads == 1
+
+    scenario(steps)
+
+
+def test_drain_and_restore(scenario):
+    async def steps(harness: Harness) -> None:
+        target = f"{harness.backend}/{harness.frontend}"
+
+        await harness.update("ServerFrontend", harness.frontend, status="maintenance")
+        plan = await harness.run()
+        assert not plan.reload
+        assert actions(plan) == ["drained"]
+        assert harness.server.commands == [f"set server {target} state drain"]
+        assert harness.servers[harness.frontend]["state"] == "drain"
+
+        await harness.update("ServerFrontend", harness.frontend, status="active")
+        plan = await harness.run()
+        assert actions(plan) == ["status"]
+        assert harness.server.commands == [f"set server {target} state ready"]
+        assert harness.servers[harness.frontend]["state"] == "ready"
+        assert harness.reloads == 1
+
+    scenario(steps)
+
+
+def test_restore_after_reload(scenario):
+    async def steps(harness: Harness) -> None:
+        await harness.update("ServerFrontend", harness.frontend, status="maintenance")
+        await harness.run()
+        # A frontend in maintenance isn't rendered, it's gone after a reload
+        await harness.run(force_reload=True)
+        assert harness.frontend not in harness.servers
+
+        await harness.update("ServerFrontend", harness.frontend, status="active")
+        plan = await harness.run()
+        assert not plan.reload
+        assert actions(plan) == ["status"]
+        assert harness.server.commands[1].startswith(f"add server {harness.backend}/{harness.frontend} ")
+        assert harness.servers[harness.frontend]["state"] == "ready"
+        assert harness.reloads == 2
+
+    scenario(steps)
+
+
+def test_remove_and_add(scenario):
+    async def steps(harness: Harness) -> None:
+        target = f"{harness.backend}/{harness.frontend}"
+        address = harness.servers[harness.frontend]["address"]
+
+        await harness.update("ServerFrontend", harness.frontend, status="provisioning")
+        plan = await harness.run()
+        assert actions(plan) == ["removed"]
+        assert harness.server.commands == [
+            f"set server {target} state maint",
+            f"shutdown sessions server {target}",
+            f"del server {target}",
+        ]
+        assert harness.frontend not in harness.servers
+
+        await harness.update("ServerFrontend", harness.frontend, status="active")
+        plan = await harness.run()
+        assert actions(plan) == ["added"]
+        assert harness.server.commands[0] == f"add server {target} {address}:80 check"
+        assert harness.servers[harness.frontend] == {"address": address, "state": "ready"}
+        assert harness.reloads == 1
+
+    scenario(steps)
+
+
+def test_address_change(scenario):
+    async def steps(harness: Harness) -> None:
+        frontend = await harness.client.get(kind="ServerFrontend", hostname__value=harness.frontend, include=["ip_address"])
+        await frontend.ip_address.fetch()
+        current = str(frontend.ip_address.peer.address.value)
+        network = current.split("/")[1]
+        address = f"{current.rsplit('.', 1)[0]}.250"
+        new_address = await harness.client.create(kind="IpamIPAddress", address=f"{address}/{network}")
+        await new_address.save()
+
+        await harness.update("ServerFrontend", harness.frontend, ip_address=new_address)
+        plan = await harness.run()
+        assert not plan.reload
+        assert actions(plan) == ["address"]
+        assert harness.server.commands == [f"set server {harness.backend}/{harness.frontend} addr {address} port 80"]
+        assert harness.servers[harness.frontend]["address"] == address
+
+    scenario(steps)
+
+
+def test_reload_when_the_backend_changes(scenario):
+    async def steps(harness: Harness) -> None:
+        vip = next(vip for vip in harness.state().vips if backend_name(vip) == harness.backend)
+        await harness.update("InfraVIP", vip.hostname, balance="leastconn" if vip.balance != "leastconn" else "roundrobin")
+        plan = await harness.run()
+        assert plan.reload
+        assert plan.reasons == [f"{harness.backend} changed (balance)"]
+        assert harness.server.commands == []
+        assert harness.reloads == 2
+
+    scenario(steps)
+
+
+def test_reload_when_a_change_is_refused(scenario):
+    async def steps(harness: Harness) -> None:
+        # The backend is missing from the running process, neither the change nor its fallback can be applied
+        del harness.server.backends[harness.backend]
+        await harness.update("ServerFrontend", harness.frontend, status="maintenance")
+        plan = await harness.run()
+        assert plan.reload
+        assert plan.reasons == ["runtime API refused a change"]
+        assert harness.reloads == 2
+        # The next synchronization starts from the data of the reloaded configuration
+        vip = next(vip for vip in harness.state().vips if backend_name(vip) == harness.backend)
+        assert {member.hostname: member.status for member in vip.members}[harness.frontend] == "maintenance"
+
+    scenario(steps)
+
+
+def test_reload_when_the_removal_is_refused(scenario):
+    async def steps(harness: Harness) -> None:
+        target = f"{harness.backend}/{harness.frontend}"
+        # The sessions were shut down but connections are still attached, HAProxy keeps the server
+        harness.server.attached.add(target)
+        await harness.update("ServerFrontend", harness.frontend, status="provisioning")
+        plan = await harness.run()
+        assert harness.server.commands[-1] == f"del server {target}"
+        assert plan.reload
+        assert plan.reasons == ["runtime API refused a change"]
+        assert harness.reloads == 2
+        # The reloaded configuration doesn't hold the frontend anymore
+        assert harness.frontend not in harness.servers
+
+    scenario(steps)
+
+
+@pytest.mark.parametrize(
+    "command,reply,refused",
+    [
+        ("del server b/s", "Server deleted.\n", False),
+        ("del server b/s", "Only servers in maintenance mode can be deleted.\n", True),
+        ("del server b/s", "Server still has connections attached to it, cannot remove it.\n", True),
+        ("add server b/s 10.0.0.1:80 check", "New server registered.\n", False),
+        ("add server b/s 10.0.0.1:80 check", "Already exists a server with the same name in backend.\n", True),
+        ("set server b/s state drain", "\n", False),
+        ("set server b/s state drain", "No such server.\n", True),
+    ],
+)
+def test_failed(command, reply, refused):
+    assert failed(command, reply) is refused
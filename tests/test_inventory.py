@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from lbvip.inventory import FileInventoryCache, InventorySnapshot, cached_snapshot
+
+NODES = {"ServerFrontend": {"include": ["hostname", "status"]}, "ServerLoadBalancer": {"include": ["hostname"]}}
+
+
+def test_cached_snapshot(demo_client, tmp_path):
+    cache = FileInventoryCache(path=tmp_path)
+
+    async def cached(ttl: int = 3600):
+        snapshot, _, _ = await cached_snapshot(client=demo_client, cache=cache, key="inventory", kinds=NODES, ttl=ttl)
+        return snapshot
+
+    async def store() -> None:
+        _, commit, signal = await cached_snapshot(client=demo_client, cache=cache, key="inventory", kinds=NODES)
+        cache.set("inventory", InventorySnapshot(commit=commit, created=time.time(), signal=signal))
+
+    async def main() -> None:
+        assert await cached() is None
+        await store()
+        assert await cached() is not None
+        assert await cached(ttl=-1) is None
+
+        # A host updated or removed invalidates the snapshot before its ttl
+        frontend = (await demo_client.all(kind="ServerFrontend"))[0]
+        frontend.status.value = "maintenance"
+        await frontend.save()
+        assert await cached() is None
+
+        await store()
+        await frontend.delete()
+        assert await cached() is None
+
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+import asyncio
+
+from pathlib import Path
+from typing import Dict
+
+from lbvip.allocation import ALLOCATION_MUTATION
+from lbvip.offline import offline_client, run_demo
+
+LOAD_BALANCERS = 3
+FRONTENDS = 12
+
+
+def read_artifacts(directory: Path) -> Dict[str, str]:
+    return {str(path.relative_to(directory)): path.read_text() for path in sorted(directory.rglob("*.conf"))}
+
+
+def test_run_demo(client, backend, log, tmp_path):
+    result = asyncio.run(run_demo(client=client, log=log, output=tmp_path))
+
+    assert result["check"] == {"passed": True, "errors": 0}
+    assert result["artifacts"] == 2 * LOAD_BALANCERS + FRONTENDS
+    artifacts = read_artifacts(tmp_path)
+    assert len(artifacts) == result["artifacts"]
+    assert len([name for name in artifacts if name.endswith("/haproxy.conf")]) == LOAD_BALANCERS
+    assert len([name for name in artifacts if name.endswith("/bird.conf")]) == LOAD_BALANCERS
+    assert len([name for name in artifacts if name.endswith("/nginx.conf")]) == FRONTENDS
+    assert backend.stats[f"mutation:{ALLOCATION_MUTATION}"] > 0
+
+
+def test_run_demo_concurrency(client, log, tmp_path):
+    asyncio.run(run_demo(client=client, log=log, output=tmp_path / "sequential"))
+    asyncio.run(run_demo(client=offline_client(), log=log, output=tmp_path / "concurrent", concurrency=8))
+
+    assert read_artifacts(tmp_path / "concurrent") == read_artifacts(tmp_path / "sequential")
+
+
+def test_run_demo_incremental(client, backend, log, tmp_path):
+    asyncio.run(run_demo(client=client, log=log, output=tmp_path / "first"))
+    allocations = backend.stats[f"mutation:{ALLOCATION_MUTATION}"]
+    asyncio.run(run_demo(client=client, log=log, output=tmp_path / "second", incremental=True))
+
+    # The objects are unchanged, they keep their addresses
+    assert backend.stats[f"mutation:{ALLOCATION_MUTATION}"] == allocations
+    assert read_artifacts(tmp_path / "second") == read_artifacts(tmp_path / "first")
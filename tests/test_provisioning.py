@@ -0,0 +1,77 @@
+import asyncio
+
+from typing import List
+
+import pytest
+
+from lbvip.provisioning import ProvisioningGraph
+
+
+def test_steps_only_wait_for_their_dependencies(log):
+    events: List[str] = []
+
+    async def step(name: str, delay: float = 0.0) -> str:
+        events.append(f"start {name}")
+        await asyncio.sleep(delay)
+        events.append(f"end {name}")
+        return name
+
+    graph = ProvisioningGraph(concurrency=4)
+    graph.add(key="slow", phase="object", task=step, name="slow", delay=0.2)
+    graph.add(key="fast", phase="object", task=step, name="fast")
+    graph.add(key="fast:ip", phase="ip_allocation", task=step, depends_on=["fast"], name="fast:ip")
+    graph.add(key="slow:ip", phase="ip_allocation", task=step, depends_on=["slow"], name="slow:ip")
+    asyncio.run(graph.execute(log=log))
+
+    # The allocation of the fast object doesn't wait for the slow object of the same level
+    assert events.index("end fast:ip") < events.index("end slow")
+    assert events.index("start slow:ip") > events.index("end slow")
+    assert graph.results == {key: key for key in graph.steps}
+    timings = {timing.phase: timing for timing in graph.timings.values()}
+    assert timings["object"].tasks == 2
+    assert timings["ip_allocation"].tasks == 2
+    assert graph.phase_durations()["object"] >= 0.2
+
+
+def test_concurrency(log):
+    running: List[int] = [0, 0]
+
+    async def step() -> None:
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    graph = ProvisioningGraph(concurrency=3)
+    for index in range(10):
+        graph.add(key=str(index), phase="object", task=step)
+    asyncio.run(graph.execute(log=log))
+    assert running[1] == 3
+
+
+def test_failure_stops_the_dependents(log):
+    done: List[str] = []
+
+    async def step(name: str) -> None:
+        done.append(name)
+
+    async def fail() -> None:
+        raise RuntimeError("allocation failed")
+
+    graph = ProvisioningGraph()
+    graph.add(key="object", phase="object", task=step, name="object")
+    graph.add(key="ip", phase="ip_allocation", task=fail, depends_on=["object"])
+    graph.add(key="relationship", phase="relationship", task=step, depends_on=["ip"], name="relationship")
+    with pytest.raises(RuntimeError, match="allocation failed"):
+        asyncio.run(graph.execute(log=log))
+    assert done == ["object"]
+
+
+def test_unknown_dependency(log):
+    async def step() -> None:
+        return None
+
+    graph = ProvisioningGraph()
+    graph.add(key="vip", phase="object", task=step, depends_on=["pool"])
+    with pytest.raises(ValueError, match="Unknown provisioning dependencies: pool"):
+        asyncio.run(graph.execute(log=log))
@@ -0,0 +1,20 @@
+import asyncio
+
+import httpx
+
+from lbvip.schema_sync import SchemaSync
+
+
+def test_server_hash_encodes_the_branch(client, log, tmp_path, monkeypatch):
+    sync = SchemaSync(client=client, log=log, paths=[], branch="feature/a&b c", state_path=tmp_path / "state.json")
+    urls = []
+    get = client._get
+
+    async def recording_get(url, **kwargs):
+        urls.append(url)
+        return await get(url=url, **kwargs)
+
+    monkeypatch.setattr(client, "_get", recording_get)
+    assert asyncio.run(sync.server_hash())
+    assert httpx.URL(urls[0]).path == "/api/schema/summary"
+    assert httpx.URL(urls[0]).params["branch"] == "feature/a&b c"
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+import pytest
+
+from lbvip.topology import TopologyLoader, TopologyValidationError
+
+FRONTEND = {
+    "kind": "ServerFrontend",
+    "hostname": "frontend9.production.eqx2.fra.de.duff.ninja",
+    "environment": "production",
+    "status": "active",
+}
+
+
+def test_pool_without_name(client, log, tmp_path):
+    path = tmp_path / "topology.jsonl"
+    records = [
+        {**FRONTEND, "ip_address": {"pool": "server.production.eqx2.fra.de-10.101.1/24"}},
+        {**FRONTEND, "ip_address": {"name": "x"}},
+    ]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    loader = TopologyLoader(client=client, log=log, branch="main")
+    with pytest.raises(TopologyValidationError) as exc_info:
+        asyncio.run(loader.load(path=path))
+    assert exc_info.value.location == f"{path}:2"
+    assert exc_info.value.errors == ["ip_address expects a reference or {\"pool\": <name>}, got {'name': 'x'}"]
@@ -0,0 +1,39 @@
+import asyncio
+
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from lbvip.benchmark import jinja2_transform
+from lbvip.rendering import render_haproxy, render_nginx
+
+
+async def query_results(client, kind: str, query: str) -> List[Dict[str, Any]]:
+    """Result of a transform query for every object of a kind, with the VIPs attached to the first LB."""
+    lb = (await client.all(kind="ServerLoadBalancer"))[0]
+    for vip in await client.all(kind="InfraVIP"):
+        await vip.load_balancers.fetch()
+        vip.load_balancers.add(lb)
+        await vip.save()
+
+    results = []
+    for node in await client.all(kind=kind):
+        response = await client.query_gql_query(name=query, branch_name="main", variables={"hostname": node.hostname.value})
+        results.append(response.get("data") or response)
+    return results
+
+
+@pytest.mark.parametrize(
+    "kind,query,template,render",
+    [
+        ("ServerLoadBalancer", "lb_vip", "haproxy.conf.j2", render_haproxy),
+        ("ServerFrontend", "frontend_vip", "nginx.conf.j2", render_nginx),
+    ],
+)
+def test_jinja2_and_python_transforms_match(
+    demo_client, kind: str, query: str, template: str, render: Callable[[Dict[str, Any]], str]
+):
+    results = asyncio.run(query_results(demo_client, kind=kind, query=query))
+    assert results
+    for data in results:
+        assert jinja2_transform(template).render(data=data) == render(data)
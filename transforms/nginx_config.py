@@ -0,0 +1,19 @@
+import sys
+
+from pathlib import Path
+
+from infrahub_sdk.transforms import InfrahubTransform
+
+# The transforms are loaded from their file by Infrahub, the shared helpers live at the root of the repository
+REPOSITORY_ROOT = str(Path(__file__).resolve().parent.parent)
+if REPOSITORY_ROOT not in sys.path:
+    sys.path.append(REPOSITORY_ROOT)
+
+from lbvip.rendering import render_nginx  # noqa: E402
+
+
+class NginxConfig(InfrahubTransform):
+    query = "frontend_vip"
+
+    def transform(self, data):
+        return render_nginx(data)